@@ -1,95 +1,175 @@
 from flask import Flask, render_template, jsonify
-import pandas as pd
-import joblib
-import numpy as np
 import matplotlib.pyplot as plt
 import seaborn as sns
 import io, base64
+import joblib
 import shap
 import xgboost as xgb
 import matplotlib.dates as mdates
 import matplotlib
+import os
+import sys
 matplotlib.use('Agg')  # <-- Add this before pyplot
 
+# Shared pipeline modules live in scripts/
+BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(BASE_DIR, "scripts"))
+from feature_defs import FEATURES  # noqa: E402
+from feature_transform import model_input  # noqa: E402
+from feature_io import load_features  # noqa: E402
+from online_features import OnlineFeatureCache  # noqa: E402
+from model_registry import ModelRegistry  # noqa: E402
+import onnx_backend  # noqa: E402
+import shared_store  # noqa: E402
+import intervals  # noqa: E402
+from shadow import ShadowEvaluator  # noqa: E402
+import request_metrics  # noqa: E402
+from request_metrics import phase  # noqa: E402
+
 app = Flask(__name__)
+# Per-route / per-phase timings on /metrics; opt-in profiling via PROFILE_TOKEN
+request_metrics.init_app(app)
 
-# Load model
+# Load model (hot-reloaded in the background when a new version appears).
+# MODEL_BACKEND=onnx serves models/aqi_rf_model.onnx through onnxruntime and
+# falls back to the sklearn pickle if the runtime or the export is missing.
 model_path = "models/aqi_rf_model.pkl"
-model = joblib.load(model_path)
+onnx_model_path = "models/aqi_rf_model.onnx"
+MODEL_BACKEND = os.getenv("MODEL_BACKEND", "sklearn")
+# SERVING_MEMORY=shared: with several worker processes (gunicorn -w N) the
+# feature CSV and the forest are published once and memory-mapped by every
+# worker instead of loaded into each (scripts/shared_store.py)
+SERVING_MEMORY = os.getenv("SERVING_MEMORY", "private")
+model_loader = shared_store.load_model if SERVING_MEMORY == "shared" else joblib.load
+models = None
+if MODEL_BACKEND == "onnx":
+    if onnx_backend.available():
+        try:
+            models = ModelRegistry(onnx_model_path, registry_uri=None, loader=onnx_backend.load).start()
+        except RuntimeError as e:
+            print("⚠️ ONNX model not loadable, serving the sklearn pickle:", e)
+    else:
+        print("⚠️ onnxruntime not installed, serving the sklearn pickle")
+if models is None:
+    MODEL_BACKEND = "sklearn"
+    models = ModelRegistry(model_path, loader=model_loader).start()
+
+# Shadow models (SHADOW_MODEL_PATHS) score every forecast off the request path;
+# CANARY_PERCENT of requests can be answered by CANARY_MODEL instead
+shadow = ShadowEvaluator(models, loader=model_loader)
+
+# Forecast inputs come from the Feast online store (same features as training);
+# set FORECAST_FEATURE_SOURCE=csv to read the latest CSV row instead
+FORECAST_FEATURE_SOURCE = os.getenv("FORECAST_FEATURE_SOURCE", "online")
+online_features = OnlineFeatureCache()
+
+# Typed, column-projected reads (scripts/feature_io.py); with
+# SERVING_MEMORY=shared, views of the published copy instead
+FEATURE_CSV = "data/aqi_feature_set_v1.csv"
+feature_store = shared_store.FeatureStore(FEATURE_CSV) if SERVING_MEMORY == "shared" else None
+
+
+def read_features(columns=None):
+    if feature_store is not None:
+        return feature_store.frame(columns=columns, lowercase=True)
+    return load_features(FEATURE_CSV, columns=columns, lowercase=True)
+
+
+# Recent AQI for the model's lag features, re-read only when the CSV changes
+LAG_HISTORY_ROWS = 24 * 7
+_lag_history = {"mtime": None, "frame": None}
+
+
+def lag_history():
+    if not os.path.exists(FEATURE_CSV):
+        return None
+    mtime = os.path.getmtime(FEATURE_CSV)
+    if _lag_history["mtime"] != mtime:
+        df = read_features(columns=["time", "aqi"])
+        _lag_history.update(mtime=mtime, frame=df.tail(LAG_HISTORY_ROWS).reset_index(drop=True))
+    return _lag_history["frame"]
 
 # Utility: get latest row
 def get_latest():
-    df = pd.read_csv("data/aqi_feature_set_v1.csv")
-    df.columns = [c.lower() for c in df.columns]
+    df = read_features()
     return df.iloc[-1]
 
 @app.route('/')
 def home():
-    latest = get_latest()
-
-    # --- EDA plot ---
-    df = pd.read_csv("data/aqi_feature_set_v1.csv")
-    df.columns = [c.lower() for c in df.columns]
-
-    plt.figure(figsize=(12,6))
-    sns.lineplot(x='time', y='aqi', data=df.tail(50), marker='o', color='green')
-    sns.scatterplot(x='time', y='aqi', data=df.tail(50), color='red', s=50)
-    plt.title('AQI Trend (Last 50 Records)')
-    plt.xlabel('Time')
-    plt.ylabel('AQI')
-    plt.xticks(rotation=45)
-    plt.tight_layout()
-    plt.show()
-    
-    img = io.BytesIO()
-    plt.savefig(img, format='png')
-    img.seek(0)
-    eda_plot_url = base64.b64encode(img.getvalue()).decode()
-    plt.close()
+    with phase("data_load"):
+        latest = get_latest()
+
+        # --- EDA plot ---
+        df = read_features(columns=[
+            'time', 'aqi', 'pm10', 'pm2_5', 'temperature_2m', 'relative_humidity_2m', 'wind_speed_10m'
+        ])
+
+    with phase("plot_trend"):
+        plt.figure(figsize=(12,6))
+        sns.lineplot(x='time', y='aqi', data=df.tail(50), marker='o', color='green')
+        sns.scatterplot(x='time', y='aqi', data=df.tail(50), color='red', s=50)
+        plt.title('AQI Trend (Last 50 Records)')
+        plt.xlabel('Time')
+        plt.ylabel('AQI')
+        plt.xticks(rotation=45)
+        plt.tight_layout()
+        plt.show()
+
+        img = io.BytesIO()
+        plt.savefig(img, format='png')
+        img.seek(0)
+        eda_plot_url = base64.b64encode(img.getvalue()).decode()
+        plt.close()
 
     # --- Feature importance (optional) ---
-    X = df[['pm10', 'pm2_5', 'temperature_2m', 'relative_humidity_2m', 'wind_speed_10m']].dropna()
-    y = df['aqi'].iloc[:len(X)]
-    model_xgb = xgb.XGBRegressor().fit(X, y)
-    explainer = shap.Explainer(model_xgb, X)
-    shap_values = explainer(X)
-    shap.summary_plot(shap_values, X, show=False)
-    img2 = io.BytesIO()
-    plt.savefig(img2, format='png', bbox_inches='tight')
-    img2.seek(0)
-    fi_plot_url = base64.b64encode(img2.getvalue()).decode()
-    plt.close()
-
-    return render_template(
-        'index.html',
-        latest=latest,
-        eda_plot_url=eda_plot_url,
-        fi_plot_url=fi_plot_url
-    )
+    with phase("xgb_fit"):
+        X = df[['pm10', 'pm2_5', 'temperature_2m', 'relative_humidity_2m', 'wind_speed_10m']].dropna()
+        y = df['aqi'].iloc[:len(X)]
+        model_xgb = xgb.XGBRegressor().fit(X, y)
+    with phase("shap"):
+        explainer = shap.Explainer(model_xgb, X)
+        shap_values = explainer(X)
+    with phase("plot_shap"):
+        shap.summary_plot(shap_values, X, show=False)
+        img2 = io.BytesIO()
+        plt.savefig(img2, format='png', bbox_inches='tight')
+        img2.seek(0)
+        fi_plot_url = base64.b64encode(img2.getvalue()).decode()
+        plt.close()
+
+    with phase("render"):
+        return render_template(
+            'index.html',
+            latest=latest,
+            eda_plot_url=eda_plot_url,
+            fi_plot_url=fi_plot_url
+        )
 
 
 # Past 24-hour AQI for chart
 @app.route('/past24')
 def past24():
-    df = pd.read_csv("data/aqi_feature_set_v1.csv")
-    df.columns = [c.lower() for c in df.columns]
+    with phase("data_load"):
+        df = read_features(columns=["time", "aqi"])
     last24 = df.tail(24)
     data = {
-        "time": last24["time"].tolist(),
+        "time": last24["time"].dt.strftime("%Y-%m-%d %H:%M:%S").tolist(),
         "aqi": last24["aqi"].astype(float).tolist()
     }
     return jsonify(data)
 
 @app.route('/latest')
 def latest_basic():
-    latest_row = get_latest()
+    with phase("data_load"):
+        latest_row = get_latest()
+    # Readings are float32; round so JSON shows 74.8, not 74.80000305
     data = {
         "aqi": float(latest_row["aqi"]),
-        "pm10": float(latest_row["pm10"]),
-        "pm25": float(latest_row["pm2_5"]),
-        "temp": float(latest_row["temperature_2m"]),
-        "humidity": float(latest_row["relative_humidity_2m"]),
-        "wind": float(latest_row["wind_speed_10m"])
+        "pm10": round(float(latest_row["pm10"]), 2),
+        "pm25": round(float(latest_row["pm2_5"]), 2),
+        "temp": round(float(latest_row["temperature_2m"]), 2),
+        "humidity": round(float(latest_row["relative_humidity_2m"]), 2),
+        "wind": round(float(latest_row["wind_speed_10m"]), 2)
     }
     return jsonify(data)
 
@@ -98,8 +178,8 @@ def latest_basic():
 @app.route('/stations')
 def stations():
     # Read CSV (make sure it has 'station', 'lat', 'lon', 'aqi' columns)
-    df = pd.read_csv("data/aqi_feature_set_v1.csv")
-    df.columns = [c.lower() for c in df.columns]
+    with phase("data_load"):
+        df = read_features()
     
     # Filter only Islamabad stations (assuming a 'city' column)
     if 'city' in df.columns:
@@ -136,78 +216,108 @@ def stations():
 def forecast():
     print("🚀 /forecast route called!")
 
-    df = pd.read_csv("data/aqi_feature_set_v1.csv")
-    df.columns = [c.lower() for c in df.columns]
-
-    
-    model_features = getattr(model, "feature_names_in_", None)
-    if model_features is not None:
-        features = [f.lower() for f in model_features]
-    else:
-        features = ['pm10', 'pm2_5', 'temperature_2m', 'relative_humidity_2m', 'wind_speed_10m']
-
-   
-    df = df.dropna(subset=features)
-    if df.empty:
-        return jsonify({"error": "No valid rows for prediction"})
-
-    
-    latest = df.iloc[-1]
-    X_latest = latest[features].values.reshape(1, -1)
+    with phase("data_load"):
+        latest_df = None
+        if FORECAST_FEATURE_SOURCE == "online":
+            try:
+                latest_df = online_features.latest()
+            except Exception as e:
+                print("⚠️ Online feature lookup failed, falling back to CSV:", e)
+
+        if latest_df is None:
+            df = read_features(columns=FEATURES + ["time"])
+            df = df.dropna(subset=FEATURES)
+            if df.empty:
+                return jsonify({"error": "No valid rows for prediction"})
+            latest_df = df.tail(1)
+
+    latest = latest_df.iloc[0]
+    # One model reference for the whole request, even if a reload lands mid-way
+    served_name, registry = shadow.choose()
+    served = registry.current_version()
+    model = served.model
+    with phase("feature_assembly"):
+        # The model's fitted feature transformer (scripts/feature_transform.py)
+        history = lag_history()
+        X_latest = model_input(model, latest_df, history, default_columns=[
+            'pm10', 'pm2_5', 'temperature_2m', 'relative_humidity_2m', 'wind_speed_10m'])
     print("🧾 Model input:", X_latest)
 
-    # Predict AQI for 3 future days using Random Forest
-    preds = []
-    for _ in range(3):
-        val = model.predict(X_latest)[0]  # ✅ Random Forest model
-        preds.append(round(float(val), 2))
-        X_latest = X_latest + np.random.normal(0, 0.02, size=X_latest.shape)
+    # p10/p50/p90 AQI for the next 3 days (+24h/+48h/+72h) from one prediction
+    # plus the model's held-out residual quantiles (scripts/intervals.py)
+    with phase("predict"):
+        interval_method, point, quantiles = intervals.forecast(model, X_latest)
+    preds = quantiles["p50"]
 
-    print("✅ Forecast AQI:", preds)
+    print(f"✅ Forecast AQI ({interval_method}):", preds)
+    shadow.submit(latest_df, served_name, served.version, point, history)
 
    
     return jsonify({
         "aqi": preds,
+        "aqi_p10": quantiles["p10"],
+        "aqi_p90": quantiles["p90"],
+        "interval_method": interval_method,
+        "model": served_name,
         "pm25": [
-            round(latest['pm2_5'] * 1.02, 2),
-            round(latest['pm2_5'] * 1.04, 2),
-            round(latest['pm2_5'] * 1.06, 2)
+            round(float(latest['pm2_5']) * 1.02, 2),
+            round(float(latest['pm2_5']) * 1.04, 2),
+            round(float(latest['pm2_5']) * 1.06, 2)
         ],
         "pm10": [
-            round(latest['pm10'] * 1.01, 2),
-            round(latest['pm10'] * 1.02, 2),
-            round(latest['pm10'] * 1.03, 2)
+            round(float(latest['pm10']) * 1.01, 2),
+            round(float(latest['pm10']) * 1.02, 2),
+            round(float(latest['pm10']) * 1.03, 2)
         ]
     })
 
 
 
 
+@app.route('/model')
+def model_info():
+    return jsonify({
+        "backend": MODEL_BACKEND,
+        "current": models.current_version().describe(),
+        "versions": models.versions()
+    })
+
+
+@app.route('/shadow')
+def shadow_report():
+    return jsonify({
+        "config": shadow.describe(),
+        "errors": shadow.rolling_errors()
+    })
+
+
 # EDA route
 @app.route('/eda')
 def eda():
     # Read data
-    df = pd.read_csv("data/aqi_feature_set_v1.csv")
-    df.columns = [c.lower() for c in df.columns]
+    with phase("data_load"):
+        df = read_features(columns=["time", "aqi"])
 
     # Plot AQI trend for last 100 records
-    plt.figure(figsize=(10, 5))
-    sns.lineplot(x='time', y='aqi', data=df.tail(100))
-    plt.title('AQI Trend Over Time (Last 50 Records)')
-    plt.xlabel('Time')
-    plt.ylabel('AQI')
-    plt.xticks(rotation=45)
-    plt.tight_layout()
-
-    # Save plot to PNG in memory
-    img = io.BytesIO()
-    plt.savefig(img, format='png')
-    img.seek(0)
-    plot_url = base64.b64encode(img.getvalue()).decode()
-    plt.close()
+    with phase("plot_trend"):
+        plt.figure(figsize=(10, 5))
+        sns.lineplot(x='time', y='aqi', data=df.tail(100))
+        plt.title('AQI Trend Over Time (Last 50 Records)')
+        plt.xlabel('Time')
+        plt.ylabel('AQI')
+        plt.xticks(rotation=45)
+        plt.tight_layout()
+
+        # Save plot to PNG in memory
+        img = io.BytesIO()
+        plt.savefig(img, format='png')
+        img.seek(0)
+        plot_url = base64.b64encode(img.getvalue()).decode()
+        plt.close()
 
     # Render in HTML template
-    return render_template('eda.html', plot_url=plot_url)
+    with phase("render"):
+        return render_template('eda.html', plot_url=plot_url)
 
 
 # 
@@ -1,30 +1,24 @@
 # aqi_features.py (Feast + PostgreSQL offline + online for Neon)
 
 import os
+import sys
 from datetime import datetime, timezone
 from feast import Entity, FeatureView, Field, FeatureStore, ValueType
 from feast.types import Float32, Int64, String
 from feast.infra.offline_stores.contrib.postgres_offline_store.postgres import PostgreSQLSource
-import psycopg2
+
+# Shared helpers live in scripts/
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+sys.path.insert(0, os.path.join(BASE_DIR, "scripts"))
+import feature_schema  # noqa: E402
+import materialize  # noqa: E402
+import pipeline_metrics  # noqa: E402
 
 
 # -----------------------------
-# 1️⃣ Connect to PostgreSQL to read table columns
+# 1️⃣ Read table columns from the persisted schema (aqi_schema.json, no DB access)
 # -----------------------------
-conn = psycopg2.connect(
-    dbname="aqi_feature_store",
-    user="postgres",
-    password="123",      # change to your password or use environment variables
-    host="localhost",
-    port="5432"
-)
-
-cur = conn.cursor()
-cur.execute(
-    "SELECT column_name, data_type FROM information_schema.columns WHERE table_name='aqi_data'"
-)
-columns = cur.fetchall()
-conn.close()
+columns = feature_schema.load_columns()
 
 # -----------------------------
 # 2️⃣ Define entity and timestamp
@@ -80,23 +74,30 @@ aqi_features = FeatureView(
 # 7️⃣ Register and materialize features
 # -----------------------------
 if __name__ == "__main__":
-    # ✅ Corrected indentation + safe absolute path detection
-    repo_path = os.path.abspath(os.path.join(os.path.dirname(__file__), "."))
-    print(f"📁 Using Feast repo path: {repo_path}")
-
-    # Verify feature_store.yaml exists
-    config_path = os.path.join(repo_path, "feature_store.yaml")
-    if not os.path.exists(config_path):
-        raise FileNotFoundError(f"⚠️ feature_store.yaml not found at {config_path}")
-
-    # Initialize the FeatureStore
-    store = FeatureStore(repo_path=repo_path)
-
-    # Register Entity & FeatureView
-    store.apply([location, aqi_features])
-    print("✅ Feast FeatureView and Entity registered successfully!")
-
-    # Materialize features for the last 1 day
-    utc_now = datetime.now(timezone.utc)
-    store.materialize_incremental(end_date=utc_now)
-    print(f"✅ Materialization completed at UTC time: {utc_now}")
+    with pipeline_metrics.start("feast_materialize") as metrics:
+
+        # ✅ Corrected indentation + safe absolute path detection
+        repo_path = os.path.abspath(os.path.join(os.path.dirname(__file__), "."))
+        print(f"📁 Using Feast repo path: {repo_path}")
+
+        # Verify feature_store.yaml exists
+        config_path = os.path.join(repo_path, "feature_store.yaml")
+        if not os.path.exists(config_path):
+            raise FileNotFoundError(f"⚠️ feature_store.yaml not found at {config_path}")
+
+        # Fail loudly if aqi_data changed since aqi_schema.json was generated
+        feature_schema.check()
+
+        # Initialize the FeatureStore
+        store = FeatureStore(repo_path=repo_path)
+
+        # Register Entity & FeatureView
+        store.apply([location, aqi_features])
+        print("✅ Feast FeatureView and Entity registered successfully!")
+
+        # Materialize only the slice after the stored watermark
+        utc_now = datetime.now(timezone.utc)
+        materialized = materialize.materialize_incremental("aqi_features", repo_path=repo_path, end_date=utc_now)
+        print(f"✅ Materialization completed at UTC time: {utc_now}")
+        metrics.rows_out = materialized
+        metrics.finish()
@@ -1,35 +1,31 @@
 # view_features_auto.py
-import pandas as pd
+import os
+import sys
 from feast import FeatureStore
 from datetime import datetime, timezone
-import psycopg2
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+sys.path.insert(0, os.path.join(BASE_DIR, "scripts"))
+import db  # noqa: E402
+import materialize  # noqa: E402
 
 # Initialize Feast FeatureStore
 store = FeatureStore(repo_path=".")
 
 # -----------------------------
-# 1️⃣ Materialize all existing data to online store
+# 1️⃣ Materialize new data (since the stored watermark) to online store
 # -----------------------------
-start_date = datetime(2025, 10, 1, tzinfo=timezone.utc)  # earliest date in your table
 end_date = datetime.now(timezone.utc)
 
 print("---- MATERIALIZING FEATURES TO ONLINE STORE ----")
-store.materialize(start_date=start_date, end_date=end_date)
-print(f"✅ Materialization completed from {start_date} to {end_date}")
+repo_path = os.path.dirname(os.path.abspath(__file__))
+rows = materialize.materialize_incremental("aqi_features", repo_path=repo_path, end_date=end_date)
+print(f"✅ Materialization completed up to {end_date} ({rows} new rows)")
 
 # -----------------------------
 # 2️⃣ Fetch last N rows (id + timestamp) from PostgreSQL for offline features
 # -----------------------------
-conn = psycopg2.connect(
-    dbname="aqi_feature_store",
-    user="postgres",
-    password="123",
-    host="localhost",
-    port="5432"
-)
-query = "SELECT id, time FROM aqi_data ORDER BY time DESC LIMIT 5;"  # last 5 rows
-ids_df = pd.read_sql(query, conn)
-conn.close()
+ids_df = db.latest_rows(5)  # last 5 rows (prepared statement on a pooled connection)
 
 # Rename timestamp column for Feast
 ids_df = ids_df.rename(columns={"time": "event_timestamp"})
@@ -0,0 +1,87 @@
+# bench_align.py
+# AQI x weather time alignment: pd.merge(how="outer") + sort_values (the old
+# merge_weather_pollutant_full.py path) vs align.outer_join (sorted merge of
+# two time-ordered inputs) on synthetic hourly series of growing length, with
+# duplicate timestamps and gaps on both sides. Checks both give the same frame.
+#
+# Usage: python benchmarks/bench_align.py [--years 1 5 20]
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.join(BASE_DIR, "scripts"))
+
+import align  # noqa: E402
+
+RESULTS_PATH = os.path.join(BASE_DIR, "benchmarks", "results", "align.json")
+REPEATS = 5
+SEED = 42
+
+
+def series(years, columns, rng, gap_share=0.01, dup_share=0.002):
+    hours = pd.date_range("2000-01-01", periods=int(years * 365 * 24), freq="h")
+    keep = rng.random(len(hours)) >= gap_share
+    keys = hours[keep]
+    dups = keys[rng.random(len(keys)) < dup_share]
+    keys = keys.append(dups).sort_values()
+    df = pd.DataFrame({"time": keys})
+    for col in columns:
+        df[col] = rng.random(len(df)) * 100
+    return df
+
+
+def pandas_merge(aqi, weather):
+    return pd.merge(aqi, weather, on="time", how="outer").sort_values("time", kind="stable").reset_index(drop=True)
+
+
+def sorted_merge(aqi, weather):
+    return align.outer_join(aqi, weather)[0]
+
+
+def best_of(fn, *args):
+    timings = []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        fn(*args)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--years", type=float, nargs="+", default=[1, 5, 20])
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(SEED)
+    results = {"runs": []}
+    for years in args.years:
+        aqi = series(years, ["pm10", "pm2_5", "carbon_monoxide", "nitrogen_dioxide", "sulphur_dioxide", "ozone"], rng)
+        weather = series(years, ["temperature_2m", "relative_humidity_2m", "wind_speed_10m",
+                                 "pressure_msl", "precipitation", "cloudcover"], rng)
+
+        expected, got = pandas_merge(aqi, weather), sorted_merge(aqi, weather)
+        pd.testing.assert_frame_equal(expected, got)
+
+        run = {
+            "years": years,
+            "aqi_rows": len(aqi),
+            "weather_rows": len(weather),
+            "pandas_merge_s": best_of(pandas_merge, aqi, weather),
+            "sorted_merge_s": best_of(sorted_merge, aqi, weather),
+        }
+        run["speedup"] = run["pandas_merge_s"] / run["sorted_merge_s"]
+        results["runs"].append(run)
+        print(f"🔗 {years:>5g} years ({len(aqi):>8} x {len(weather):>8} rows)   "
+              f"merge+sort {run['pandas_merge_s'] * 1000:8.1f} ms   sorted {run['sorted_merge_s'] * 1000:8.1f} ms   "
+              f"{run['speedup']:.1f}x")
+
+    os.makedirs(os.path.dirname(RESULTS_PATH), exist_ok=True)
+    with open(RESULTS_PATH, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"💾 Results saved to {RESULTS_PATH}")
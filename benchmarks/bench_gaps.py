@@ -0,0 +1,118 @@
+# bench_gaps.py
+# Missing-reading handling on synthetic hourly raw data (12 columns, missing
+# hours, scattered and multi-hour gaps): the GAP_FILL=interpolate path
+# (column-by-column interpolate plus median fills) vs scripts/gaps.py (grid,
+# all columns at once), whole and pushed in chunks as the streaming mode does.
+# Both are checked to give the same frame chunked as whole, including with a
+# pollutant that stays NaN to the end of the file (the interpolator must not
+# hold more than INTERPOLATE_MAX_GAP_ROWS rows back).
+#
+# Usage: python benchmarks/bench_gaps.py [--rows 10000 100000 1000000]
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.join(BASE_DIR, "scripts"))
+
+import chunked  # noqa: E402
+import gaps  # noqa: E402
+from data_clean_feature import (  # noqa: E402
+    INTERPOLATE_MAX_GAP_ROWS, cols_medium_missing, cols_numeric_min_missing, numeric_cols,
+)
+
+RESULTS_PATH = os.path.join(BASE_DIR, "benchmarks", "results", "gaps.json")
+REPEATS = 3
+CHUNK_ROWS = 100_000
+SEED = 42
+
+
+def raw(rows, rng):
+    hours = pd.date_range("2020-01-01", periods=int(rows * 1.02), freq="h")
+    df = pd.DataFrame({"time": hours[np.sort(rng.choice(len(hours), rows, replace=False))]})
+    for col in numeric_cols:
+        values = rng.random(rows) * 100
+        values[rng.random(rows) < 0.03] = np.nan
+        starts = rng.choice(rows, rows // 500)
+        for s in starts:  # multi-hour outages
+            values[s: s + rng.integers(2, 24)] = np.nan
+        df[col] = values
+    return df
+
+
+def legacy(df):
+    df = df.copy()
+    for col in cols_medium_missing:
+        df[col] = df[col].interpolate(method="linear")
+    for col in cols_medium_missing:
+        if pd.isna(df[col].iloc[0]):
+            df.loc[df.index[0], col] = df[col].median()
+    for col in cols_numeric_min_missing:
+        df[col] = df[col].fillna(df[col].median())
+    return df
+
+
+def interpolated(df, chunk_rows=None):
+    # data_clean_feature.interpolated(); returns (frame, most rows held back)
+    interpolator = chunked.Interpolator(cols_medium_missing, max_gap=INTERPOLATE_MAX_GAP_ROWS)
+    step = chunk_rows or len(df)
+    parts, held = [], 0
+    for i in range(0, len(df), step):
+        parts.append(interpolator.push(df.iloc[i: i + step]))
+        held = max(held, len(interpolator.held))
+    tail = interpolator.flush()
+    return pd.concat(parts + ([tail] if tail is not None else []), ignore_index=True), held
+
+
+def grid(df, chunk_rows=None):
+    profile = gaps.Profile.fit([df], numeric_cols)
+    filler = gaps.GapFiller(numeric_cols, profile)
+    step = chunk_rows or len(df)
+    chunks = (df.iloc[i: i + step] for i in range(0, len(df), step))
+    return pd.concat(list(gaps.filled(chunks, filler)), ignore_index=True)
+
+
+def best_of(fn, *args):
+    timings = []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        fn(*args)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(SEED)
+    results = {"runs": []}
+    for rows in args.rows:
+        df = raw(rows, rng)
+        pd.testing.assert_frame_equal(grid(df), grid(df, CHUNK_ROWS // 7))
+        dead = df.copy()
+        dead.loc[len(dead) // 3:, cols_medium_missing[0]] = np.nan  # sensor down to the end
+        whole, _ = interpolated(dead)
+        streamed, held = interpolated(dead, CHUNK_ROWS // 7)
+        pd.testing.assert_frame_equal(whole, streamed)
+        assert held <= INTERPOLATE_MAX_GAP_ROWS, f"interpolator held {held} rows"
+        run = {
+            "rows": rows,
+            "interpolate_s": best_of(legacy, df),
+            "grid_s": best_of(grid, df),
+            "grid_chunked_s": best_of(grid, df, CHUNK_ROWS),
+        }
+        results["runs"].append(run)
+        print(f"🩹 {rows:>8} rows   interpolate {run['interpolate_s'] * 1000:8.1f} ms   "
+              f"grid {run['grid_s'] * 1000:8.1f} ms   grid/chunked {run['grid_chunked_s'] * 1000:8.1f} ms")
+
+    os.makedirs(os.path.dirname(RESULTS_PATH), exist_ok=True)
+    with open(RESULTS_PATH, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"💾 Results saved to {RESULTS_PATH}")
@@ -0,0 +1,161 @@
+# bench_historical_retrieval.py
+# Historical-feature retrieval time vs table size: old heap layout (FLOAT columns,
+# UNIQUE btree on time) against the monthly-partitioned REAL/SMALLINT layout with
+# a BRIN index that scripts/data_to_postgres.py now manages.
+#
+# Usage: python benchmarks/bench_historical_retrieval.py [rows ...]
+import io
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.join(BASE_DIR, "scripts"))
+
+import data_to_postgres as loader  # noqa: E402
+import db  # noqa: E402
+
+SIZES = [int(n) for n in sys.argv[1:]] or [10_000, 100_000, 1_000_000]
+REPEATS = 5
+ENTITY_HOURS = 24 * 30  # training window: last 30 days of rows
+RESULTS_PATH = os.path.join(BASE_DIR, "benchmarks", "results", "historical_retrieval.json")
+
+FEATURES = [c for c in loader.CSV_COLUMNS if c != "time"]
+
+
+# -----------------------------
+# Synthetic data
+# -----------------------------
+def synthetic_rows(n):
+    rng = np.random.default_rng(42)
+    times = pd.date_range("2020-01-01", periods=n, freq="h")
+    df = pd.DataFrame({"time": times})
+    for col in loader.REAL_COLS:
+        df[col] = rng.gamma(2.0, 20.0, n).round(3)
+    df["hour"] = times.hour
+    df["day"] = times.day
+    df["month"] = times.month
+    df["day_of_week"] = times.day_name()
+    return df[loader.CSV_COLUMNS]
+
+
+def legacy_create_sql(table):
+    cols = ",\n    ".join(
+        f"{c} {'VARCHAR(15)' if c == 'day_of_week' else 'INT' if c in loader.SMALLINT_COLS else 'FLOAT'}"
+        for c in loader.CSV_COLUMNS if c != "time"
+    )
+    return f"""
+CREATE TABLE {table} (
+    id SERIAL PRIMARY KEY,
+    time TIMESTAMP UNIQUE,
+    {cols}
+);
+"""
+
+
+def copy_rows(cur, table, df):
+    buf = io.StringIO()
+    df.to_csv(buf, index=False, header=False)
+    with cur.copy(f"COPY {table} ({', '.join(loader.CSV_COLUMNS)}) FROM STDIN WITH (FORMAT csv)") as copy:
+        copy.write(buf.getvalue())
+
+
+def build_tables(cur, n, df):
+    heap, part = f"bench_heap_{n}", f"bench_part_{n}"
+    cur.execute(f"DROP TABLE IF EXISTS {heap}, {part} CASCADE;")
+
+    cur.execute(legacy_create_sql(heap))
+    copy_rows(cur, heap, df)
+
+    cur.execute(loader.create_table_sql(part))
+    loader.ensure_partitions(cur, part, df["time"].min(), df["time"].max())
+    loader.ensure_indexes(cur, part)
+    copy_rows(cur, part, df)
+
+    cur.execute(f"ANALYZE {heap};")
+    cur.execute(f"ANALYZE {part};")
+    return heap, part
+
+
+# -----------------------------
+# Feast-shaped point-in-time join
+# -----------------------------
+# Mirrors the Postgres offline store's template: restrict the source to the
+# entity time range, join on the entity key with source time <= event time and
+# keep the latest row per entity.
+def pit_query(table):
+    feature_cols = ", ".join(f"s.{c}" for c in FEATURES)
+    return f"""
+WITH entity AS (
+    SELECT * FROM unnest(%(ids)s::int[], %(ts)s::timestamp[]) AS e(id, event_timestamp)
+),
+src AS (
+    SELECT id, time, {", ".join(FEATURES)} FROM {table}
+    WHERE time BETWEEN %(lo)s AND %(hi)s
+),
+joined AS (
+    SELECT e.id, e.event_timestamp, {feature_cols},
+           ROW_NUMBER() OVER (PARTITION BY e.id, e.event_timestamp ORDER BY s.time DESC) AS rn
+    FROM entity e LEFT JOIN src s ON s.id = e.id AND s.time <= e.event_timestamp
+)
+SELECT * FROM joined WHERE rn = 1;
+"""
+
+
+def time_query(cur, sql, params):
+    timings = []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        cur.execute(sql, params)
+        cur.fetchall()
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings))
+
+
+def table_bytes(cur, table):
+    # pg_total_relation_size on a partitioned parent is 0, so sum its partitions
+    cur.execute(
+        "SELECT COALESCE(sum(pg_total_relation_size(relid)), 0) FROM pg_partition_tree(%s)",
+        (table,),
+    )
+    return int(cur.fetchone()[0])
+
+
+def run(cur, results):
+    for n in SIZES:
+        print(f"📦 Building {n:,}-row tables...")
+        df = synthetic_rows(n)
+        heap, part = build_tables(cur, n, df)
+
+        window = df.tail(min(ENTITY_HOURS, n))
+        params = {
+            "ids": list(range(n - len(window) + 1, n + 1)),
+            "ts": window["time"].dt.to_pydatetime().tolist(),
+            "lo": window["time"].min().to_pydatetime(),
+            "hi": window["time"].max().to_pydatetime(),
+        }
+
+        for layout, table in (("heap", heap), ("partitioned_brin", part)):
+            seconds = time_query(cur, pit_query(table), params)
+            size = table_bytes(cur, table)
+            results.append({"rows": n, "layout": layout, "seconds": seconds, "bytes": size})
+            print(f"  {layout:<17} {seconds * 1000:9.1f} ms   {size / 1e6:8.1f} MB")
+
+        cur.execute(f"DROP TABLE IF EXISTS {heap}, {part} CASCADE;")
+
+
+if __name__ == "__main__":
+    results = []
+    with db.connection() as conn:
+        conn.autocommit = True
+        with conn.cursor() as cur:
+            run(cur, results)
+
+    os.makedirs(os.path.dirname(RESULTS_PATH), exist_ok=True)
+    with open(RESULTS_PATH, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"✅ Results saved at: {RESULTS_PATH}")
@@ -0,0 +1,123 @@
+# bench_loader.py
+# Feature CSV load: plain pd.read_csv (dtype inference, every column) vs the
+# typed loader in scripts/feature_io.py, in full and with the column
+# projections app.py and train.py use. Reports parse time (best of REPEATS),
+# peak RSS growth during one load and the resident size of the frame.
+#
+# Every variant runs in a fresh interpreter so peak RSS is not inherited from
+# an earlier load.
+#
+# Usage: python benchmarks/bench_loader.py [--rows 1000000]
+#   --rows  use the bench_suite synthetic feature set of that size instead of
+#           data/aqi_feature_set_v1.csv
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.join(BASE_DIR, "scripts"))
+
+CSV_PATH = os.path.join(BASE_DIR, "data", "aqi_feature_set_v1.csv")
+RESULTS_PATH = os.path.join(BASE_DIR, "benchmarks", "results", "loader.json")
+REPEATS = 5
+
+VARIANTS = {
+    "read_csv": None,
+    "typed_full": None,
+    "typed_train": ["time", "AQI"],
+    "typed_forecast": "FEATURES",
+    "typed_past24": ["time", "aqi"],
+}
+
+
+def load(variant, path):
+    import pandas as pd
+
+    if variant == "read_csv":
+        return pd.read_csv(path)
+    from feature_defs import FEATURES
+    from feature_io import load_features
+
+    columns = VARIANTS[variant]
+    if columns == "FEATURES":
+        columns = FEATURES + ["time"]
+    return load_features(path, columns=columns, lowercase=True)
+
+
+def peak_rss_kb():
+    # High-water mark of this process' resident set (Linux)
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1])
+    return 0
+
+
+def child(variant, path):
+    # Runs in its own process: one load for peak RSS, then timed repeats
+    import pandas as pd  # noqa: F401  (import cost stays out of the RSS delta)
+    import pyarrow.csv  # noqa: F401
+
+    import feature_io  # noqa: F401
+
+    before = peak_rss_kb()
+    df = load(variant, path)
+    peak_kb = peak_rss_kb() - before
+    frame_bytes = int(df.memory_usage(deep=True).sum())
+    del df
+
+    timings = []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        load(variant, path)
+        timings.append(time.perf_counter() - start)
+    print(json.dumps({"seconds": min(timings), "peak_rss_mb": peak_kb / 1024, "frame_mb": frame_bytes / 1e6}))
+
+
+def run_variant(variant, path):
+    out = subprocess.run(
+        [sys.executable, __file__, "--child", variant, "--path", path],
+        check=True, capture_output=True, text=True,
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=None)
+    parser.add_argument("--child", default=None)
+    parser.add_argument("--path", default=CSV_PATH)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child, args.path)
+        sys.exit(0)
+
+    path = args.path
+    if args.rows:
+        import bench_suite
+
+        path = os.path.join(bench_suite.dataset(args.rows), "data", "aqi_feature_set_v1.csv")
+
+    results = {"path": path, "size_mb": os.path.getsize(path) / 1e6, "variants": {}}
+    for variant in VARIANTS:
+        r = run_variant(variant, path)
+        results["variants"][variant] = r
+        print(f"📄 {variant:<15} {r['seconds'] * 1000:9.1f} ms   peak +{r['peak_rss_mb']:7.1f} MB   "
+              f"frame {r['frame_mb']:7.1f} MB")
+
+    base = results["variants"]["read_csv"]
+    typed = results["variants"]["typed_full"]
+    results["speedup"] = base["seconds"] / typed["seconds"]
+    results["frame_reduction"] = base["frame_mb"] / typed["frame_mb"]
+    results["peak_reduction"] = base["peak_rss_mb"] / max(typed["peak_rss_mb"], 1e-9)
+    print(f"✅ Typed full load: {results['speedup']:.1f}x faster, frame {results['frame_reduction']:.1f}x smaller, "
+          f"peak {results['peak_reduction']:.1f}x lower")
+
+    os.makedirs(os.path.dirname(RESULTS_PATH), exist_ok=True)
+    with open(RESULTS_PATH, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"💾 Results saved to {RESULTS_PATH}")
@@ -0,0 +1,103 @@
+# bench_onnx.py
+# sklearn pickle vs onnxruntime inference for the AQI model: parity of the
+# exported graph against sklearn predictions on every row of the feature set,
+# then median predict latency at batch sizes 1 (one /forecast), 72 (three days
+# of hourly rows) and 10k (bulk scoring).
+#
+# Uses models/aqi_rf_model.pkl when present, otherwise fits a forest on the
+# feature set the way train.py does. Inputs come from the model's own feature
+# transformer (feature_transform.model_input), as /forecast builds them.
+#
+# Usage: python benchmarks/bench_onnx.py
+import json
+import os
+import sys
+import tempfile
+import time
+import warnings
+
+import joblib
+import numpy as np
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.join(BASE_DIR, "scripts"))
+
+import onnx_backend  # noqa: E402
+import train_engine  # noqa: E402
+from feature_defs import FEATURES  # noqa: E402
+from feature_io import load_features  # noqa: E402
+from feature_transform import LAG_SOURCE, TIME_KEY, model_input  # noqa: E402
+
+BATCH_SIZES = [1, 72, 10_000]
+REPEATS = {1: 200, 72: 100, 10_000: 10}
+MODEL_PATH = os.path.join(BASE_DIR, "models", "aqi_rf_model.pkl")
+DATA_PATH = os.path.join(BASE_DIR, "data", "aqi_feature_set_v1.csv")
+RESULTS_PATH = os.path.join(BASE_DIR, "benchmarks", "results", "onnx_inference.json")
+
+
+def feature_frame():
+    df = load_features(DATA_PATH, lowercase=True)
+    return df.dropna(subset=FEATURES + [LAG_SOURCE]).reset_index(drop=True)
+
+
+def median_ms(fn, repeats):
+    fn()  # warm-up
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings) * 1000)
+
+
+if __name__ == "__main__":
+    # Serving hands both backends plain arrays, as model_input() returns them
+    warnings.filterwarnings("ignore", message="X does not have valid feature names")
+    df = feature_frame()
+    if os.path.exists(MODEL_PATH):
+        model = joblib.load(MODEL_PATH)
+        source = MODEL_PATH
+    else:
+        model = train_engine.reference_model(df)
+        source = "fitted on the feature set"
+    X = model_input(model, df, df[[TIME_KEY, LAG_SOURCE]])
+    print(f"🌲 Model: {type(model).__name__} ({source}), {model.n_features_in_} features, {len(X):,} rows")
+
+    fd, onnx_path = tempfile.mkstemp(suffix=".onnx")
+    os.close(fd)
+    try:
+        onnx_backend.export(model, onnx_path)
+        onnx_model = onnx_backend.OnnxModel(onnx_path)
+        onnx_size_mb = os.path.getsize(onnx_path) / 1e6
+    finally:
+        os.remove(onnx_path)
+
+    max_diff = onnx_backend.parity(model, onnx_model, X)
+    parity_ok = max_diff <= onnx_backend.PARITY_RTOL
+    print(f"{'✅' if parity_ok else '❌'} Parity: max relative |Δ| = {max_diff:.2e} (tolerance {onnx_backend.PARITY_RTOL})")
+
+    results = {
+        "model": type(model).__name__,
+        "n_estimators": int(getattr(model, "n_estimators", 0)),
+        "rows": len(X),
+        "onnx_size_mb": onnx_size_mb,
+        "intra_op_threads": onnx_backend.INTRA_OP_THREADS or onnx_backend.container_cpus(),
+        "parity_max_rel_diff": max_diff,
+        "parity_ok": parity_ok,
+        "latency_ms": {},
+    }
+    print(f"{'batch':>7} {'sklearn ms':>11} {'onnx ms':>9} {'speedup':>8}")
+    for n in BATCH_SIZES:
+        batch = X[np.arange(n) % len(X)]
+        batch_np = batch.astype(np.float32)
+        sk = median_ms(lambda: model.predict(batch), REPEATS[n])
+        ox = median_ms(lambda: onnx_model.predict(batch_np), REPEATS[n])
+        results["latency_ms"][str(n)] = {"sklearn": sk, "onnx": ox}
+        print(f"{n:>7} {sk:>11.3f} {ox:>9.3f} {sk / ox:>7.1f}x")
+
+    os.makedirs(os.path.dirname(RESULTS_PATH), exist_ok=True)
+    with open(RESULTS_PATH, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"✅ Results saved at: {RESULTS_PATH}")
+    if not parity_ok:
+        sys.exit(1)
@@ -0,0 +1,66 @@
+# bench_pit_join.py
+# Training-set assembly time: local asof point-in-time join (scripts/pit_join.py)
+# vs Feast get_historical_features against Postgres, plus the parity check of
+# scripts/check_pit_join.py on the full history (CI runs the full check).
+#
+# Usage: python benchmarks/bench_pit_join.py [--no-feast]
+import json
+import os
+import sys
+import time
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.join(BASE_DIR, "scripts"))
+
+import pit_join  # noqa: E402
+from check_pit_join import check_parity, entity_frame  # noqa: E402
+from feature_defs import FEATURES, feature_refs  # noqa: E402
+
+REPEATS = 5
+RESULTS_PATH = os.path.join(BASE_DIR, "benchmarks", "results", "pit_join.json")
+FEATURE_REPO_PATH = os.path.join(BASE_DIR, "aqi_feature_store", "feature_repo")
+
+
+def best_of(fn):
+    timings, result = [], None
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+if __name__ == "__main__":
+    entity_df = entity_frame()
+    print(f"🧮 Entity rows: {len(entity_df):,}")
+
+    pit_join.build_source()
+    local_s, local_df = best_of(
+        lambda: pit_join.get_historical_features(entity_df, FEATURES, source=pit_join.load_source())
+    )
+    results = {"rows": len(entity_df), "local_seconds": local_s}
+    print(f"  local asof join   {local_s * 1000:9.1f} ms (incl. Parquet read)")
+
+    if "--no-feast" not in sys.argv:
+        from feast import FeatureStore
+
+        store = FeatureStore(repo_path=FEATURE_REPO_PATH)
+        feast_s, feast_df = best_of(
+            lambda: store.get_historical_features(entity_df=entity_df, features=feature_refs()).to_df()
+        )
+        results["feast_seconds"] = feast_s
+        print(f"  feast historical  {feast_s * 1000:9.1f} ms")
+
+        mismatched = check_parity(local_df, feast_df)
+        results["parity_mismatched_columns"] = mismatched
+        if mismatched:
+            print(f"❌ Parity failed for: {', '.join(mismatched)}")
+        else:
+            print("✅ Local join matches Feast for every feature")
+
+    os.makedirs(os.path.dirname(RESULTS_PATH), exist_ok=True)
+    with open(RESULTS_PATH, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"✅ Results saved at: {RESULTS_PATH}")
+    if results.get("parity_mismatched_columns"):
+        sys.exit(1)
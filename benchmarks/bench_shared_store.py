@@ -0,0 +1,181 @@
+# bench_shared_store.py
+# Memory of N serving workers with their own copy of the feature frame and
+# the forest (SERVING_MEMORY=private) vs attached to one shared copy
+# (scripts/shared_store.py, SERVING_MEMORY=shared). Each worker is a separate
+# process that loads the way app.py does, reads the frame and makes one
+# forecast-style prediction; once all are up, each reports its proportional
+# set size (PSS: shared pages split between the processes mapping them) and
+# private memory from /proc/self/smaps_rollup, so Linux only. In shared mode
+# the store is published first by the benchmark itself, as
+# `python scripts/shared_store.py` does before the workers start; its size
+# (tmpfs pages, held once) is reported next to the workers' PSS.
+#
+# The frame is the feature CSV tiled to --rows rows; the model is
+# models/aqi_rf_model.pkl when present, otherwise a forest fitted on the
+# feature set the way train.py does (with its feature transformer). Also checks that the shared frame
+# equals feature_io.load_features and that SharedForest predicts what the
+# forest does.
+#
+# Usage: python benchmarks/bench_shared_store.py [--rows 1000000] [--workers 1 2 4]
+import argparse
+import json
+import multiprocessing as mp
+import os
+import shutil
+import sys
+import tempfile
+import time
+import warnings
+
+import joblib
+import numpy as np
+import pandas as pd
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.join(BASE_DIR, "scripts"))
+
+import shared_store  # noqa: E402
+import train_engine  # noqa: E402
+from feature_defs import FEATURES  # noqa: E402
+from feature_io import load_features  # noqa: E402
+from feature_transform import LAG_SOURCE, TIME_KEY, model_input  # noqa: E402
+
+MODEL_PATH = os.path.join(BASE_DIR, "models", "aqi_rf_model.pkl")
+DATA_PATH = os.path.join(BASE_DIR, "data", "aqi_feature_set_v1.csv")
+RESULTS_PATH = os.path.join(BASE_DIR, "benchmarks", "results", "shared_store.json")
+
+
+def tiled_csv(rows, path):
+    df = pd.read_csv(DATA_PATH)
+    df = pd.concat([df] * -(-rows // len(df)), ignore_index=True).head(rows)
+    df["time"] = pd.date_range("2000-01-01", periods=rows, freq="h").strftime("%Y-%m-%d %H:%M:%S")
+    df.to_csv(path, index=False)
+
+
+def forest(path):
+    if os.path.exists(MODEL_PATH):
+        shutil.copy(MODEL_PATH, path)
+        return MODEL_PATH
+    model = train_engine.reference_model(load_features(DATA_PATH, lowercase=True))
+    joblib.dump(model, path)
+    return "fitted on the feature set"
+
+
+def memory_mb():
+    fields = {}
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                fields[parts[0].rstrip(":")] = int(parts[1]) / 1024
+    return {
+        "rss_mb": fields["Rss"],
+        "pss_mb": fields["Pss"],
+        "private_mb": fields["Private_Clean"] + fields["Private_Dirty"],
+    }
+
+
+def store_mb(store_dir):
+    return sum(
+        os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(store_dir) for name in names
+    ) / 2**20
+
+
+def worker(mode, csv_path, model_path, store_dir, ready, done, out):
+    # app.py hands the forest plain arrays, as model_input() does
+    warnings.filterwarnings("ignore", message="X does not have valid feature names")
+    start = time.perf_counter()
+    if mode == "shared":
+        df = shared_store.FeatureStore(csv_path, store_dir).frame(lowercase=True)
+        model = shared_store.load_model(model_path, store_dir)
+    else:
+        df = load_features(csv_path, lowercase=True)
+        model = joblib.load(model_path)
+    load_s = time.perf_counter() - start
+    latest = df.dropna(subset=FEATURES).tail(1)
+    prediction = float(model.predict(model_input(model, latest, df[[TIME_KEY, LAG_SOURCE]].tail(24 * 7)))[0])
+    float(df["aqi"].mean())  # a full pass over one column, as /eda-style routes do
+    ready.wait()  # everyone loaded: measure with all workers alive
+    out.put({"load_s": load_s, "prediction": prediction, **memory_mb()})
+    done.wait()
+
+
+def run(mode, workers, csv_path, model_path, store_dir):
+    ctx = mp.get_context("spawn")  # fresh interpreters, like separate gunicorn workers
+    ready, done, out = ctx.Barrier(workers), ctx.Barrier(workers + 1), ctx.Queue()
+    procs = [ctx.Process(target=worker, args=(mode, csv_path, model_path, store_dir, ready, done, out))
+             for _ in range(workers)]
+    for p in procs:
+        p.start()
+    reports = [out.get() for _ in procs]
+    done.wait()
+    for p in procs:
+        p.join()
+    return reports
+
+
+def check(csv_path, model_path, store_dir):
+    pd.testing.assert_frame_equal(
+        shared_store.FeatureStore(csv_path, store_dir).frame(lowercase=True), load_features(csv_path, lowercase=True)
+    )
+    model, shared = joblib.load(model_path), shared_store.load_model(model_path, store_dir)
+    df = load_features(DATA_PATH, lowercase=True).dropna(subset=FEATURES)
+    X = model_input(model, df, df[[TIME_KEY, LAG_SOURCE]])
+    # Same trees summed in order; the forest's threads may add them in another
+    np.testing.assert_allclose(shared.predict(X), model.predict(X), rtol=1e-9)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="bench_shared_store_")
+    store_dir = os.path.join(work_dir, "store")
+    if os.path.isdir("/dev/shm"):
+        store_dir = tempfile.mkdtemp(prefix="bench_shared_store_", dir="/dev/shm")
+    csv_path, model_path = os.path.join(work_dir, "features.csv"), os.path.join(work_dir, "model.pkl")
+    try:
+        tiled_csv(args.rows, csv_path)
+        source = forest(model_path)
+        check(csv_path, model_path, store_dir)
+        model = joblib.load(model_path)
+        print(f"🌲 Model: {type(model).__name__} ({source}), {len(model.estimators_)} trees, "
+              f"{os.path.getsize(model_path) / 1e6:.0f} MB pickled; frame: {args.rows:,} rows")
+        del model
+
+        results = {"rows": args.rows, "model_source": source, "runs": []}
+        for workers in args.workers:
+            run_result = {"workers": workers}
+            for mode in ("private", "shared"):
+                shutil.rmtree(store_dir, ignore_errors=True)  # each shared run publishes afresh
+                if mode == "shared":
+                    start = time.perf_counter()
+                    shared_store.FeatureStore(csv_path, store_dir).publish()
+                    shared_store.load_model(model_path, store_dir)
+                    run_result["publish_s"] = time.perf_counter() - start
+                    run_result["store_mb"] = store_mb(store_dir)
+                reports = run(mode, workers, csv_path, model_path, store_dir)
+                run_result[mode] = {
+                    "total_pss_mb": sum(r["pss_mb"] for r in reports),
+                    "private_mb_per_worker": float(np.mean([r["private_mb"] for r in reports])),
+                    "max_load_s": max(r["load_s"] for r in reports),
+                    "prediction": reports[0]["prediction"],
+                }
+            assert np.isclose(run_result["private"]["prediction"], run_result["shared"]["prediction"], rtol=1e-9)
+            results["runs"].append(run_result)
+            print(f"🧠 {workers} worker(s)   private: {run_result['private']['total_pss_mb']:7.0f} MB PSS "
+                  f"({run_result['private']['private_mb_per_worker']:6.0f} MB own each, "
+                  f"load {run_result['private']['max_load_s']:5.2f} s)   shared: "
+                  f"{run_result['shared']['total_pss_mb']:7.0f} MB PSS "
+                  f"({run_result['shared']['private_mb_per_worker']:6.0f} MB own each, "
+                  f"load {run_result['shared']['max_load_s']:5.2f} s) + {run_result['store_mb']:.0f} MB store")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+        shutil.rmtree(store_dir, ignore_errors=True)
+
+    os.makedirs(os.path.dirname(RESULTS_PATH), exist_ok=True)
+    with open(RESULTS_PATH, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"💾 Results saved to {RESULTS_PATH}")
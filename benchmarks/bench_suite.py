@@ -0,0 +1,355 @@
+# bench_suite.py
+# Serving/pipeline benchmark suite: model load, single and batch predict,
+# feature assembly (point-in-time join + the model's feature transformer), AQI computation, CSV and
+# Parquet load, and every Flask route through the test client. Inputs are
+# fixed synthetic feature sets (seeded, same columns as
+# data/aqi_feature_set_v1.csv) at 10k / 1M / 10M rows, generated once into
+# .cache/bench/.
+#
+# Each run is saved as benchmarks/results/suite/<UTC time>_<git sha>.json and
+# compared with the previous run; benchmarks more than REGRESSION_RATIO slower
+# are flagged (exit 1 with --fail-on-regression).
+#
+# Usage: python benchmarks/bench_suite.py [--sizes 10000,1000000,10000000]
+#                                         [--only predict,csv] [--fail-on-regression]
+import argparse
+import glob
+import json
+import os
+import subprocess
+import sys
+import time
+import warnings
+from datetime import datetime, timezone
+
+import joblib
+import numpy as np
+import pandas as pd
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.join(BASE_DIR, "scripts"))
+
+import pit_join  # noqa: E402
+import train_engine  # noqa: E402
+from aqi import calculate_aqi  # noqa: E402
+from feature_defs import FEATURES  # noqa: E402
+from feature_io import load_features  # noqa: E402
+from feature_transform import LAG_SOURCE, TIME_KEY, model_input  # noqa: E402
+
+SIZES = [10_000, 1_000_000, 10_000_000]
+DATA_DIR = os.path.join(BASE_DIR, ".cache", "bench")
+RESULTS_DIR = os.path.join(BASE_DIR, "benchmarks", "results", "suite")
+REGRESSION_RATIO = float(os.getenv("BENCH_REGRESSION_RATIO", 1.2))
+MIN_SECONDS = 1.0  # keep repeating a benchmark until this much time is spent...
+MAX_REPEATS = 50   # ...or this many runs
+MODEL_TRAIN_ROWS = 10_000
+SEED = 42
+
+# Same column order and case as data/aqi_feature_set_v1.csv
+CSV_COLUMNS = [
+    "time", "pm10", "pm2_5", "carbon_monoxide", "nitrogen_dioxide", "sulphur_dioxide", "ozone",
+    "temperature_2m", "relative_humidity_2m", "wind_speed_10m", "pressure_msl", "precipitation",
+    "cloudcover", "day_of_week", "month", "log_pm10", "log_pm2_5", "log_carbon_monoxide",
+    "log_nitrogen_dioxide", "log_sulphur_dioxide", "log_wind_speed_10m", "log_cloudcover", "AQI",
+    "hour", "day", "AQI_change_rate", "AQI_rolling_mean_3hr", "AQI_rolling_mean_6hr",
+    "PM2_5_rolling_mean_3hr", "PM10_rolling_mean_3hr", "temp_wind", "humidity_pressure",
+]
+
+
+# -----------------------------
+# Synthetic data (fixed seed, cached per size)
+# -----------------------------
+def synthetic_frame(rows, seed=SEED):
+    rng = np.random.default_rng(seed)
+    # Minute spacing: 10M hourly rows would run past pandas' datetime range
+    time_index = pd.date_range("2000-01-01", periods=rows, freq="min")
+    df = pd.DataFrame({"time": time_index})
+    df["pm10"] = rng.gamma(2.0, 60.0, rows).round(2)
+    df["pm2_5"] = (df["pm10"] * rng.uniform(0.4, 0.9, rows)).round(2)
+    df["carbon_monoxide"] = rng.gamma(3.0, 600.0, rows).round(2)
+    df["nitrogen_dioxide"] = rng.gamma(2.0, 25.0, rows).round(2)
+    df["sulphur_dioxide"] = rng.gamma(1.5, 5.0, rows).round(2)
+    df["ozone"] = rng.gamma(1.2, 30.0, rows).round(2)
+    df["temperature_2m"] = rng.normal(22, 8, rows).round(1)
+    df["relative_humidity_2m"] = rng.uniform(10, 100, rows).round(1)
+    df["wind_speed_10m"] = rng.gamma(2.0, 4.0, rows).round(1)
+    df["pressure_msl"] = rng.normal(1010, 6, rows).round(1)
+    df["precipitation"] = np.where(rng.random(rows) < 0.1, rng.gamma(1.0, 2.0, rows), 0.0).round(1)
+    df["cloudcover"] = rng.uniform(0, 100, rows).round(1)
+    df["day_of_week"] = time_index.day_name()
+    df["month"] = time_index.month
+    for col in ["pm10", "pm2_5", "carbon_monoxide", "nitrogen_dioxide", "sulphur_dioxide",
+                "wind_speed_10m", "cloudcover"]:
+        df["log_" + col] = np.log1p(df[col]).round(2)
+    # Cheap AQI stand-in (the real formula is benchmarked separately)
+    df["AQI"] = np.maximum(df["pm2_5"] * 1.6, df["pm10"] * 0.9).clip(0, 500).round(3)
+    df["hour"] = time_index.hour
+    df["day"] = time_index.day
+    df["AQI_change_rate"] = df["AQI"].diff().fillna(0).round(3)
+    df["AQI_rolling_mean_3hr"] = df["AQI"].rolling(3, min_periods=1).mean().round(3)
+    df["AQI_rolling_mean_6hr"] = df["AQI"].rolling(6, min_periods=1).mean().round(3)
+    df["PM2_5_rolling_mean_3hr"] = df["pm2_5"].rolling(3, min_periods=1).mean().round(3)
+    df["PM10_rolling_mean_3hr"] = df["pm10"].rolling(3, min_periods=1).mean().round(3)
+    df["temp_wind"] = (df["temperature_2m"] * df["wind_speed_10m"]).round(3)
+    df["humidity_pressure"] = (df["relative_humidity_2m"] / df["pressure_msl"]).round(3)
+    return df[CSV_COLUMNS]
+
+
+def dataset(rows):
+    # Returns the workdir for this size: data/aqi_feature_set_v1.{csv,parquet}
+    # plus models/aqi_rf_model.pkl, laid out like the repo so app.py's relative
+    # paths resolve when it runs from there
+    workdir = os.path.join(DATA_DIR, str(rows))
+    csv_path = os.path.join(workdir, "data", "aqi_feature_set_v1.csv")
+    if not os.path.exists(csv_path):
+        print(f"🧪 Generating {rows:,} synthetic rows...")
+        os.makedirs(os.path.dirname(csv_path), exist_ok=True)
+        synthetic_frame(rows).to_csv(csv_path + ".tmp", index=False)
+        os.replace(csv_path + ".tmp", csv_path)
+    pit_join.build_source(csv_path, os.path.join(workdir, "data", "aqi_feature_set_v1.parquet"))
+    model_path = os.path.join(workdir, "models", "aqi_rf_model.pkl")
+    if not os.path.exists(model_path) or not hasattr(joblib.load(model_path), "feature_transformer_"):
+        os.makedirs(os.path.dirname(model_path), exist_ok=True)
+        joblib.dump(reference_model(), model_path)
+    return workdir
+
+
+_model = None
+
+
+def reference_model():
+    # One model for every size, trained on the first 10k synthetic rows the
+    # way train.py trains (with its feature transformer), so predict/load
+    # numbers only change when the code does
+    global _model
+    if _model is None:
+        df = synthetic_frame(MODEL_TRAIN_ROWS)
+        df.columns = [c.lower() for c in df.columns]
+        _model = train_engine.reference_model(df)
+    return _model
+
+
+# -----------------------------
+# Timing
+# -----------------------------
+def measure(fn, setup=None):
+    # Median seconds per call; `setup` runs before every call, untimed
+    timings = []
+    while len(timings) < MAX_REPEATS and (not timings or sum(timings) < MIN_SECONDS):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return {"median_s": float(np.median(timings)), "min_s": float(np.min(timings)), "repeats": len(timings)}
+
+
+# -----------------------------
+# Benchmarks: name -> (max rows or None for size-independent, fn(workdir, rows) -> timing)
+# -----------------------------
+def bench_model_load(workdir, rows):
+    path = os.path.join(workdir, "models", "aqi_rf_model.pkl")
+    return measure(lambda: joblib.load(path))
+
+
+def _design(workdir):
+    # The float matrix /forecast hands the model (feature_transform.model_input)
+    df = pd.read_parquet(os.path.join(workdir, "data", "aqi_feature_set_v1.parquet"))
+    model = reference_model()
+    return model, model_input(model, df, df[[TIME_KEY, LAG_SOURCE]])
+
+
+def bench_predict_1(workdir, rows):
+    model, X = _design(workdir)
+    row = X[-1:]
+    return measure(lambda: model.predict(row))
+
+
+def bench_predict_batch(workdir, rows):
+    model, X = _design(workdir)
+    return measure(lambda: model.predict(X))
+
+
+def bench_feature_assembly(workdir, rows):
+    # Point-in-time join, then the model's transformer (lags from the AQI history)
+    source = pit_join.load_source(FEATURES + [LAG_SOURCE], os.path.join(workdir, "data", "aqi_feature_set_v1.parquet"))
+    history = source[[TIME_KEY, LAG_SOURCE]]
+    entity_df = pd.DataFrame({
+        "event_timestamp": pd.to_datetime(source[pit_join.TIMESTAMP]).to_numpy(),
+        "id": source["id"].to_numpy(),
+    })
+    model = reference_model()
+
+    def assemble():
+        joined = pit_join.get_historical_features(entity_df, FEATURES, source=source)
+        return model_input(model, joined.rename(columns={"event_timestamp": TIME_KEY}), history)
+    return measure(assemble)
+
+
+def bench_aqi_compute(workdir, rows):
+    df = pd.read_parquet(os.path.join(workdir, "data", "aqi_feature_set_v1.parquet"), columns=["pm2_5", "pm10"])
+    return measure(lambda: df.apply(lambda row: calculate_aqi(row["pm2_5"], row["pm10"]), axis=1))
+
+
+def bench_csv_load(workdir, rows):
+    return measure(lambda: pd.read_csv(os.path.join(workdir, "data", "aqi_feature_set_v1.csv")))
+
+
+def bench_csv_load_typed(workdir, rows):
+    return measure(lambda: load_features(os.path.join(workdir, "data", "aqi_feature_set_v1.csv")))
+
+
+def bench_parquet_load(workdir, rows):
+    return measure(lambda: pd.read_parquet(os.path.join(workdir, "data", "aqi_feature_set_v1.parquet")))
+
+
+def route_bench(route):
+    def bench(workdir, rows):
+        client = flask_client(workdir)
+        if client is None:
+            return None
+
+        def call():
+            response = client.get(route)
+            if response.status_code != 200:
+                raise RuntimeError(f"{route} returned {response.status_code}")
+        return measure(call)
+    return bench
+
+
+_clients = {}
+
+
+def flask_client(workdir):
+    # app.py reads data/ and models/ relative to the working directory, so it
+    # is imported from the synthetic workdir. A module object is kept per size.
+    if workdir in _clients:
+        os.chdir(workdir)
+        return _clients[workdir]
+    import importlib.util
+
+    os.environ.setdefault("FORECAST_FEATURE_SOURCE", "csv")
+    os.chdir(workdir)
+    try:
+        spec = importlib.util.spec_from_file_location(f"app_{os.path.basename(workdir)}", os.path.join(BASE_DIR, "app.py"))
+        app_module = importlib.util.module_from_spec(spec)
+        sys.modules[spec.name] = app_module  # Flask resolves templates/ from the module's file
+        spec.loader.exec_module(app_module)
+    except ImportError as e:
+        print(f"⚠️ Flask routes skipped: {e}")
+        _clients[workdir] = None
+        return None
+    _clients[workdir] = app_module.app.test_client()
+    return _clients[workdir]
+
+
+BENCHMARKS = {
+    "model_load": (None, bench_model_load),
+    "predict_1": (None, bench_predict_1),
+    "predict_batch": (1_000_000, bench_predict_batch),
+    "feature_assembly": (None, bench_feature_assembly),
+    "aqi_compute": (1_000_000, bench_aqi_compute),  # row-wise apply; 10M takes minutes per call
+    "csv_load": (None, bench_csv_load),
+    "csv_load_typed": (None, bench_csv_load_typed),
+    "parquet_load": (None, bench_parquet_load),
+    "route_forecast": (None, route_bench("/forecast")),
+    "route_latest": (None, route_bench("/latest")),
+    "route_past24": (None, route_bench("/past24")),
+    "route_stations": (None, route_bench("/stations")),
+    "route_eda": (None, route_bench("/eda")),
+    "route_model": (None, route_bench("/model")),
+    "route_home": (10_000, route_bench("/")),  # fits XGBoost + SHAP on every row
+}
+# Benchmarks whose cost does not depend on the dataset size run at the smallest size only
+SIZE_INDEPENDENT = {"model_load", "predict_1", "route_model"}
+
+
+# -----------------------------
+# Results
+# -----------------------------
+def git_sha():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BASE_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return "unknown"
+
+
+def previous_results(exclude):
+    paths = sorted(p for p in glob.glob(os.path.join(RESULTS_DIR, "*.json")) if p != exclude)
+    if not paths:
+        return None
+    with open(paths[-1]) as f:
+        return json.load(f)
+
+
+def compare(current, previous):
+    # [(key, previous_s, current_s, ratio)] for benchmarks present in both runs
+    rows = []
+    for key, result in current["results"].items():
+        before = previous["results"].get(key)
+        if before and result and before.get("median_s") and result.get("median_s"):
+            rows.append((key, before["median_s"], result["median_s"], result["median_s"] / before["median_s"]))
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default=",".join(map(str, SIZES)))
+    parser.add_argument("--only", default="", help="comma-separated benchmark name prefixes")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    args = parser.parse_args()
+    sizes = sorted(int(s) for s in args.sizes.split(","))
+    only = [p for p in args.only.split(",") if p]
+
+    # model_input() hands the forest plain arrays, as /forecast does
+    warnings.filterwarnings("ignore", message="X does not have valid feature names")
+    cwd = os.getcwd()
+    results = {}
+    try:
+        for rows in sizes:
+            workdir = dataset(rows)
+            for name, (max_rows, fn) in BENCHMARKS.items():
+                if only and not any(name.startswith(p) for p in only):
+                    continue
+                if (max_rows and rows > max_rows) or (name in SIZE_INDEPENDENT and rows != sizes[0]):
+                    continue
+                key = name if name in SIZE_INDEPENDENT else f"{name}@{rows}"
+                try:
+                    results[key] = fn(workdir, rows)
+                except Exception as e:
+                    # e.g. /eda renders a template the repo does not ship; record and move on
+                    results[key] = {"error": f"{type(e).__name__}: {e}"}
+                    print(f"❌ {key:<28} {results[key]['error']}")
+                    continue
+                if results[key]:
+                    print(f"  {key:<28} {results[key]['median_s'] * 1000:12.2f} ms  (x{results[key]['repeats']})")
+    finally:
+        os.chdir(cwd)
+
+    sha = git_sha()
+    run = {
+        "git_sha": sha,
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "pandas": pd.__version__,
+        "cpus": os.cpu_count(),
+        "results": results,
+    }
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    path = os.path.join(RESULTS_DIR, f"{datetime.now(timezone.utc):%Y%m%dT%H%M%SZ}_{sha}.json")
+    with open(path, "w") as f:
+        json.dump(run, f, indent=2)
+    print(f"✅ Results saved at: {path}")
+
+    previous = previous_results(exclude=path)
+    regressions = []
+    if previous:
+        print(f"📊 Compared with {previous['git_sha']} ({previous['timestamp']}):")
+        for key, before, after, ratio in compare(run, previous):
+            flag = "❌" if ratio > REGRESSION_RATIO else ("✅" if ratio < 1 / REGRESSION_RATIO else "  ")
+            print(f"{flag} {key:<28} {before * 1000:10.2f} → {after * 1000:10.2f} ms  ({ratio:.2f}x)")
+            if ratio > REGRESSION_RATIO:
+                regressions.append(key)
+    if regressions and args.fail_on_regression:
+        sys.exit(1)
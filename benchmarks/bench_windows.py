@@ -0,0 +1,135 @@
+# bench_windows.py
+# Rolling features through scripts/windows.py vs pandas .rolling()/.ewm()
+# recomputed over the whole frame, on synthetic hourly AQI / PM series:
+#
+#   batch   - the feature set's five windows, and the same plus longer ones
+#             (24h / 7d means, 24h max, 24h EWMA), over the whole frame
+#   live    - one new hour: pandas recomputes over the history,
+#             FeatureSet.update() advances the windows by one row
+#
+# Checks that batch, chunked batch and row-by-row updates give identical
+# values and that they match pandas.
+#
+# Usage: python benchmarks/bench_windows.py [--rows 10000 100000 1000000]
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.join(BASE_DIR, "scripts"))
+
+import windows  # noqa: E402
+
+RESULTS_PATH = os.path.join(BASE_DIR, "benchmarks", "results", "windows.json")
+REPEATS = 3
+LIVE_ROWS = 200
+CHECK_ROWS = 20_000
+SEED = 42
+
+EXTENDED = windows.FEATURES + [
+    windows.Window("AQI_rolling_mean_24hr", "AQI", "mean", 24),
+    windows.Window("AQI_rolling_mean_7d", "AQI", "mean", 168),
+    windows.Window("AQI_rolling_max_24hr", "AQI", "max", 24),
+    windows.Window("AQI_ewm_24hr", "AQI", "ewm", span=24),
+]
+
+
+def series(rows, rng):
+    df = pd.DataFrame({
+        "AQI": rng.gamma(4, 30, rows),
+        "pm2_5": rng.gamma(3, 20, rows),
+        "pm10": rng.gamma(3, 35, rows),
+    })
+    for col in df.columns:
+        df.loc[rng.random(rows) < 0.02, col] = np.nan
+    return df
+
+
+def with_pandas(df, specs):
+    out = {}
+    for spec in specs:
+        s = df[spec.source]
+        if spec.kind == "diff":
+            out[spec.name] = s.diff()
+        elif spec.kind == "ewm":
+            out[spec.name] = s.ewm(alpha=spec.alpha, adjust=False, ignore_na=True).mean()
+        else:
+            out[spec.name] = getattr(s.rolling(spec.size, min_periods=1), spec.kind)()
+        if not np.isnan(spec.fill):
+            out[spec.name] = out[spec.name].fillna(spec.fill)
+    return out
+
+
+def with_windows(df, specs):
+    return windows.FeatureSet(specs).batch(df)
+
+
+def check(df, specs):
+    whole = with_windows(df, specs)
+    chunked = windows.FeatureSet(specs)
+    parts = [chunked.batch(df.iloc[i: i + 997]) for i in range(0, len(df), 997)]
+    rows = windows.FeatureSet(specs)
+    by_row = [rows.update(row) for row in df.head(CHECK_ROWS).to_dict("records")]
+    expected = with_pandas(df, specs)
+    for spec in specs:
+        name = spec.name
+        np.testing.assert_array_equal(whole[name], np.concatenate([p[name] for p in parts]))
+        np.testing.assert_array_equal(whole[name][:CHECK_ROWS], [r[name] for r in by_row])
+        np.testing.assert_allclose(whole[name], expected[name].to_numpy(), rtol=1e-9, atol=1e-9)
+
+
+def live(df, specs):
+    # Seconds per new row: recompute the frame vs one update
+    history, new = df.iloc[:-LIVE_ROWS], df.iloc[-LIVE_ROWS:]
+    start = time.perf_counter()
+    for i in range(1, 6):
+        with_pandas(df.iloc[: len(history) + i], specs)
+    recompute = (time.perf_counter() - start) / 5
+
+    features = windows.FeatureSet(specs)
+    features.batch(history)
+    records = new.to_dict("records")
+    start = time.perf_counter()
+    for row in records:
+        features.update(row)
+    return recompute, (time.perf_counter() - start) / len(records)
+
+
+def best_of(fn, *args):
+    timings = []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        fn(*args)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(SEED)
+    results = {"runs": []}
+    for rows in args.rows:
+        df = series(rows, rng)
+        check(df, EXTENDED)
+        run = {"rows": rows}
+        for label, specs in (("current", windows.FEATURES), ("extended", EXTENDED)):
+            run[f"{label}_pandas_s"] = best_of(with_pandas, df, specs)
+            run[f"{label}_windows_s"] = best_of(with_windows, df, specs)
+            run[f"{label}_recompute_row_s"], run[f"{label}_update_row_s"] = live(df, specs)
+            print(f"📈 {rows:>8} rows, {label:<8}  batch: pandas {run[f'{label}_pandas_s'] * 1000:7.1f} ms  "
+                  f"windows {run[f'{label}_windows_s'] * 1000:7.1f} ms   new row: recompute "
+                  f"{run[f'{label}_recompute_row_s'] * 1000:7.1f} ms  update {run[f'{label}_update_row_s'] * 1e6:6.1f} µs")
+        results["runs"].append(run)
+
+    os.makedirs(os.path.dirname(RESULTS_PATH), exist_ok=True)
+    with open(RESULTS_PATH, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"💾 Results saved to {RESULTS_PATH}")
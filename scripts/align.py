@@ -0,0 +1,175 @@
+# align.py
+# Time alignment of the AQI and weather series. Both sides arrive in time
+# order (API responses, the historical files), so they are outer-joined with
+# a sorted merge - linear passes over the two key arrays, duplicates included -
+# instead of pd.merge's hash join followed by a full sort.
+# Rows, column order and duplicate handling match
+# pd.merge(how="outer").sort_values(key).
+#
+# Every join also returns a report of what it saw: rows on one side only,
+# duplicate timestamps per side, and gaps in the hourly sequence.
+#
+#   merged, report = align.outer_join(aqi, weather)
+#   align.log_report(report, "historical merge")
+import logging
+
+import numpy as np
+import pandas as pd
+
+KEY = "time"
+FREQ = "1h"
+
+
+def _in_order(df, key, name):
+    if not df[key].is_monotonic_increasing:
+        logging.warning(f"⚠️ {name} is not in time order; sorting it before the join")
+        df = df.sort_values(key, kind="stable")
+    return df.reset_index(drop=True)
+
+
+def duplicate_count(keys):
+    # keys are sorted, so duplicates are adjacent
+    keys = np.asarray(keys)
+    return int((keys[1:] == keys[:-1]).sum()) if len(keys) > 1 else 0
+
+
+def gap_report(keys, freq=FREQ):
+    # Gaps in the sequence of distinct keys, in units of `freq`
+    step = pd.Timedelta(freq).to_timedelta64()
+    keys = np.asarray(keys, dtype="datetime64[ns]")
+    steps = np.diff(keys)
+    missing = steps[steps > step] // step - 1  # sorted keys: duplicates give 0-length steps
+    return {
+        "gaps": int(len(missing)),
+        "missing_steps": int(missing.sum()),
+        "largest_gap_steps": int(missing.max()) if len(missing) else 0,
+    }
+
+
+def combine(reports):
+    # Report of several consecutive joins (e.g. chunk by chunk); gap counts
+    # across chunk boundaries are added by the caller via gap_report()
+    out = {}
+    for report in reports:
+        for k, v in report.items():
+            out[k] = max(out.get(k, 0), v) if k == "largest_gap_steps" else out.get(k, 0) + v
+    return out
+
+
+def _runs(keys):
+    # Runs of equal keys in a sorted array: key, first position, length
+    if not len(keys):
+        return keys, np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    first = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    return keys[first], first, np.diff(np.r_[first, len(keys)])
+
+
+def sorted_join_indexers(left_keys, right_keys):
+    # Outer join of two sorted key arrays in linear passes. Returns the output
+    # keys and, per output row, the row position on each side (-1 if none).
+    # A key with n rows on the left and m on the right gives n*m rows, left
+    # major - the order of pd.merge(how="outer") followed by a stable sort.
+    dtype = np.result_type(left_keys, right_keys)
+    if dtype.kind == "M":
+        # datetimes compare and move faster as their int64 ticks
+        left_keys, right_keys = left_keys.astype(dtype).view("i8"), right_keys.astype(dtype).view("i8")
+    runs = [_runs(left_keys), _runs(right_keys)]  # (distinct keys, first row, count) per side
+    both = np.concatenate([runs[0][0], runs[1][0]])
+    order = np.argsort(both, kind="stable")  # two sorted runs: a single merge pass
+    both = both[order]
+    new_key = np.r_[True, both[1:] != both[:-1]] if len(both) else np.empty(0, dtype=bool)
+    group = np.cumsum(new_key) - 1
+    distinct = both[new_key].view(dtype) if dtype.kind == "M" else both[new_key]
+
+    # Each side's distinct keys land on distinct output keys: scatter their runs
+    slot = np.empty(len(both), dtype=np.int64)
+    slot[order] = group  # output key of every entry of the concatenation
+    split = len(runs[0][0])
+    left_lo, left_n, right_lo, right_n = (np.zeros(len(distinct), dtype=np.int64) for _ in range(4))
+    left_lo[slot[:split]], left_n[slot[:split]] = runs[0][1], runs[0][2]
+    right_lo[slot[split:]], right_n[slot[split:]] = runs[1][1], runs[1][2]
+
+    rows = np.where((left_n > 0) & (right_n > 0), left_n * right_n, np.maximum(left_n, right_n))
+    left_at = np.where(left_n > 0, left_lo, -1)
+    right_at = np.where(right_n > 0, right_lo, -1)
+    multi = np.flatnonzero(rows > 1)
+    if not len(multi):
+        # No key repeated on either side: one output row per key
+        return distinct, left_at, right_at
+
+    # Start every block at each side's first row, then step through the n x m
+    # pairs of the (few) repeated keys
+    out = (np.cumsum(rows) - rows)[multi]
+    keys, left_at, right_at = np.repeat(distinct, rows), np.repeat(left_at, rows), np.repeat(right_at, rows)
+    block = rows[multi]
+    within = np.arange(block.sum()) - np.repeat(np.cumsum(block) - block, block)
+    at = np.repeat(out, block) + within
+    per_left = np.repeat(np.maximum(right_n[multi], 1), block)
+    left_at[at] = np.where(np.repeat(left_n[multi], block) > 0, left_at[at] + within // per_left, -1)
+    right_at[at] = np.where(np.repeat(right_n[multi], block) > 0, right_at[at] + within % per_left, -1)
+    return keys, left_at, right_at
+
+
+def _take(series, positions, fill):
+    # Values at `positions`; with fill, position -1 gives a missing value (ints
+    # are upcast to float, as in pd.merge)
+    if isinstance(series.dtype, np.dtype):
+        return pd.api.extensions.take(series.to_numpy(), positions, allow_fill=fill)
+    return series.array.take(positions, allow_fill=fill)
+
+
+def outer_join(left, right, key=KEY, keep=None, suffixes=("_x", "_y"), freq=FREQ):
+    # keep=None keeps every duplicate (one output row per left x right pair,
+    # like pd.merge); keep="first"/"last" collapses duplicate keys per side
+    left, right = _in_order(left, key, "left"), _in_order(right, key, "right")
+    report = {
+        "left_duplicates": duplicate_count(left[key]),
+        "right_duplicates": duplicate_count(right[key]),
+    }
+    if keep is not None:
+        left = left.drop_duplicates(key, keep=keep, ignore_index=True)
+        right = right.drop_duplicates(key, keep=keep, ignore_index=True)
+
+    keys, left_at, right_at = sorted_join_indexers(left[key].to_numpy(), right[key].to_numpy())
+
+    # Output columns: key, left columns, right columns (suffixed where shared)
+    overlap = (set(left.columns) & set(right.columns)) - {key}
+    columns = {key: keys}
+    for side, at, suffix in ((left, left_at, suffixes[0]), (right, right_at, suffixes[1])):
+        fill = bool(len(at)) and at.min() < 0
+        for name, series in side.items():
+            if name != key:
+                columns[name + suffix if name in overlap else name] = _take(series, at, fill)
+    merged = pd.DataFrame(columns)
+
+    report.update({
+        "rows": len(merged),
+        "both": int(((left_at >= 0) & (right_at >= 0)).sum()),
+        "left_only": int((right_at < 0).sum()),
+        "right_only": int((left_at < 0).sum()),
+        **gap_report(keys, freq),
+    })
+    return merged, report
+
+
+def to_grid(df, start, end, key=KEY, freq=FREQ):
+    # One row per step in [start, end]; steps with no data become NaN rows
+    grid = pd.date_range(start, end, freq=freq, name=key)
+    df = df.drop_duplicates(key, keep="last").set_index(key)
+    return df.reindex(grid).reset_index()
+
+
+def log_report(report, label):
+    logging.info(
+        f"🔗 {label}: {report['rows']} rows ({report['both']} matched, "
+        f"{report['left_only']} left only, {report['right_only']} right only)"
+    )
+    if report["left_duplicates"] or report["right_duplicates"]:
+        logging.warning(
+            f"⚠️ {label}: duplicate timestamps (left {report['left_duplicates']}, right {report['right_duplicates']})"
+        )
+    if report["gaps"]:
+        logging.warning(
+            f"⚠️ {label}: {report['gaps']} gaps, {report['missing_steps']} missing steps "
+            f"(largest {report['largest_gap_steps']})"
+        )
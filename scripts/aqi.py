@@ -0,0 +1,33 @@
+# aqi.py
+# US EPA AQI from PM2.5 / PM10 concentrations (max of the two sub-indices).
+# Shared by data_clean_feature.py and the benchmarks.
+
+
+def calculate_aqi(pm25, pm10):
+    def aqi_subindex(Cp, Bp_lo, Bp_hi, I_lo, I_hi):
+        return ((I_hi - I_lo) / (Bp_hi - Bp_lo)) * (Cp - Bp_lo) + I_lo
+
+    pm25_breakpoints = [
+        (0.0, 12.0, 0, 50), (12.1, 35.4, 51, 100), (35.5, 55.4, 101, 150),
+        (55.5, 150.4, 151, 200), (150.5, 250.4, 201, 300), (250.5, 500.4, 301, 500)
+    ]
+    pm10_breakpoints = [
+        (0, 54, 0, 50), (55, 154, 51, 100), (155, 254, 101, 150),
+        (255, 354, 151, 200), (355, 424, 201, 300), (425, 604, 301, 500)
+    ]
+
+    aqi_pm25 = next((aqi_subindex(pm25, Bp_lo, Bp_hi, I_lo, I_hi)
+                     for Bp_lo, Bp_hi, I_lo, I_hi in pm25_breakpoints
+                     if Bp_lo <= pm25 <= Bp_hi), None)
+    aqi_pm10 = next((aqi_subindex(pm10, Bp_lo, Bp_hi, I_lo, I_hi)
+                     for Bp_lo, Bp_hi, I_lo, I_hi in pm10_breakpoints
+                     if Bp_lo <= pm10 <= Bp_hi), None)
+
+    if aqi_pm25 is not None and aqi_pm10 is not None:
+        return max(aqi_pm25, aqi_pm10)
+    elif aqi_pm25 is not None:
+        return aqi_pm25
+    elif aqi_pm10 is not None:
+        return aqi_pm10
+    else:
+        return None
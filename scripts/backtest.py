@@ -0,0 +1,212 @@
+# backtest.py
+# Rolling-origin backtest of the AQI model. History is replayed one origin
+# at a time (every BACKTEST_STEP_HOURS over the last BACKTEST_DAYS). At each
+# origin, one model per horizon is trained on rows whose target was already
+# observed, then scored on the following step.
+#
+#   expanding - train on all history before the origin
+#   sliding   - train on the last BACKTEST_WINDOW_DAYS before the origin
+#
+# The encoded feature matrix and the multi-horizon target matrix are built
+# once, cached as .npy and memory-mapped by the worker processes. Rows are in
+# time order, so every train/test window is a contiguous slice (a view,
+# copied only when it has missing lags to fill with the fold's training
+# median). Skill is reported per horizon against a persistence baseline
+# (forecast = AQI now).
+#
+# Usage: python scripts/backtest.py
+import hashlib
+import json
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import mlflow
+import numpy as np
+import pandas as pd
+
+import train_engine
+from feature_transform import fill_lags, lag_median
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(message)s")
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+CACHE_DIR = os.path.join(BASE_DIR, ".cache", "backtest")
+METRICS_PATH = os.path.join(BASE_DIR, "models", "backtest_metrics.json")
+
+MODE = os.getenv("BACKTEST_MODE", "expanding")  # expanding | sliding
+DAYS = int(os.getenv("BACKTEST_DAYS", 365))
+STEP_HOURS = int(os.getenv("BACKTEST_STEP_HOURS", 168))
+WINDOW_DAYS = int(os.getenv("BACKTEST_WINDOW_DAYS", train_engine.SLIDING_WINDOW_DAYS))
+HORIZONS = [int(h) for h in os.getenv("BACKTEST_HORIZONS", "0,24,48,72").split(",")]
+N_ESTIMATORS = int(os.getenv("BACKTEST_N_ESTIMATORS", 50))
+WORKERS = int(os.getenv("BACKTEST_WORKERS", os.cpu_count() or 1))
+MIN_TRAIN_ROWS = 24 * 14
+
+
+# -----------------------------
+# Cached matrices
+# -----------------------------
+def horizon_targets(timestamps, y, horizons=HORIZONS):
+    # (rows, horizons): AQI at t + h, NaN where that hour is missing
+    actual_at = pd.Series(np.asarray(y, dtype=float), index=pd.DatetimeIndex(timestamps))
+    actual_at = actual_at[~actual_at.index.duplicated(keep="last")]
+    index = pd.DatetimeIndex(timestamps)
+    return np.column_stack([actual_at.reindex(index + pd.Timedelta(hours=h)).to_numpy() for h in horizons])
+
+
+def prepare_matrices(cache_dir=CACHE_DIR, horizons=HORIZONS):
+    X, y, timestamps = train_engine.build_design_matrix()
+    order = np.argsort(timestamps.to_numpy(), kind="stable")
+    X, y, timestamps = X.iloc[order], y.iloc[order], timestamps.iloc[order]
+    key = hashlib.sha256(
+        pd.util.hash_pandas_object(pd.concat([X, y], axis=1), index=False).values.tobytes()
+        + json.dumps(horizons).encode()
+    ).hexdigest()[:16]
+    path = os.path.join(cache_dir, key)
+    if not os.path.exists(os.path.join(path, "meta.json")):
+        os.makedirs(path, exist_ok=True)
+        np.save(os.path.join(path, "X.npy"), X.to_numpy(dtype=np.float32))
+        np.save(os.path.join(path, "Y.npy"), horizon_targets(timestamps, y, horizons))
+        np.save(os.path.join(path, "now.npy"), y.to_numpy(dtype=np.float64))
+        np.save(os.path.join(path, "t.npy"), timestamps.to_numpy(dtype="datetime64[ns]"))
+        with open(os.path.join(path, "meta.json"), "w") as f:
+            json.dump({"columns": list(X.columns), "horizons": horizons}, f)
+        logging.info(f"🗃️ Cached backtest matrices at {path}")
+    else:
+        logging.info(f"🗃️ Reusing cached backtest matrices at {path}")
+    return path
+
+
+def origins(timestamps, days=DAYS, step_hours=STEP_HOURS):
+    end = timestamps[-1]
+    start = max(timestamps[0], end - np.timedelta64(days * 24, "h"))
+    return np.arange(start, end, np.timedelta64(step_hours, "h"))
+
+
+# -----------------------------
+# Fold (runs in a worker process)
+# -----------------------------
+def run_fold(matrix_path, origin, mode=MODE):
+    X = np.load(os.path.join(matrix_path, "X.npy"), mmap_mode="r")
+    Y = np.load(os.path.join(matrix_path, "Y.npy"), mmap_mode="r")
+    now = np.load(os.path.join(matrix_path, "now.npy"), mmap_mode="r")
+    t = np.load(os.path.join(matrix_path, "t.npy"))
+    with open(os.path.join(matrix_path, "meta.json")) as f:
+        horizons = json.load(f)["horizons"]
+
+    test_lo, test_hi = np.searchsorted(t, [origin, origin + np.timedelta64(STEP_HOURS, "h")])
+    out = []
+    for j, h in enumerate(horizons):
+        # Only rows whose target (t + h) was observed before the origin
+        train_hi = np.searchsorted(t, origin - np.timedelta64(h, "h"))
+        train_lo = 0
+        if mode == "sliding":
+            train_lo = np.searchsorted(t, origin - np.timedelta64(h + WINDOW_DAYS * 24, "h"))
+        # Missing lags take the median AQI of this fold's training rows
+        fill = lag_median(now[train_lo:train_hi])
+        X_train, y_train = fill_lags(X[train_lo:train_hi], fill), Y[train_lo:train_hi, j]
+        X_test, y_test = fill_lags(X[test_lo:test_hi], fill), Y[test_lo:test_hi, j]
+        keep_train, keep_test = np.isfinite(y_train), np.isfinite(y_test)
+        if keep_train.sum() < MIN_TRAIN_ROWS or not keep_test.any():
+            continue
+
+        model = train_engine.new_model(n_estimators=N_ESTIMATORS, n_jobs=1)
+        start = time.perf_counter()
+        if keep_train.all():
+            model.fit(X_train, y_train)
+        else:
+            model.fit(X_train[keep_train], y_train[keep_train])
+        pred = model.predict(X_test[keep_test])
+        out.append({
+            "origin": str(origin),
+            "horizon": h,
+            "train_rows": int(keep_train.sum()),
+            "test_rows": int(keep_test.sum()),
+            "fit_seconds": time.perf_counter() - start,
+            "err": (pred - y_test[keep_test]).tolist(),
+            "persistence_err": (now[test_lo:test_hi][keep_test] - y_test[keep_test]).tolist(),
+        })
+    return out
+
+
+# -----------------------------
+# Metrics
+# -----------------------------
+def horizon_metrics(fold_results):
+    metrics = {}
+    by_horizon = {}
+    for r in fold_results:
+        by_horizon.setdefault(r["horizon"], []).append(r)
+    for h, rows in sorted(by_horizon.items()):
+        err = np.concatenate([r["err"] for r in rows])
+        base = np.concatenate([r["persistence_err"] for r in rows])
+        mae, base_mae = float(np.abs(err).mean()), float(np.abs(base).mean())
+        metrics[str(h)] = {
+            "folds": len(rows),
+            "n": int(len(err)),
+            "mae": mae,
+            "rmse": float(np.sqrt((err ** 2).mean())),
+            "bias": float(err.mean()),
+            "persistence_mae": base_mae,
+            # > 0 means better than "AQI stays where it is" (undefined at h=0,
+            # where persistence is the answer itself)
+            "skill_vs_persistence": 1 - mae / base_mae if base_mae else float("nan"),
+        }
+    return metrics
+
+
+def backtest(matrix_path, mode=MODE, workers=WORKERS):
+    t = np.load(os.path.join(matrix_path, "t.npy"))
+    fold_origins = origins(t)
+    logging.info(f"🔁 {len(fold_origins)} {mode} origins x {len(HORIZONS)} horizons on {workers} worker(s)")
+    results = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for fold in pool.map(run_fold, [matrix_path] * len(fold_origins), fold_origins, [mode] * len(fold_origins)):
+            results.extend(fold)
+    return results
+
+
+if __name__ == "__main__":
+    if os.getenv("GITHUB_ACTIONS"):
+        mlflow.set_tracking_uri("file:./mlruns")
+    else:
+        mlflow.set_tracking_uri("http://127.0.0.1:5000")
+    mlflow.set_experiment("PearlsAirSense")
+
+    start = time.perf_counter()
+    matrix_path = prepare_matrices()
+    fold_results = backtest(matrix_path)
+    metrics = horizon_metrics(fold_results)
+    elapsed = time.perf_counter() - start
+
+    with mlflow.start_run(run_name=f"Backtest_AQI_{MODE}"):
+        mlflow.log_params({"mode": MODE, "days": DAYS, "step_hours": STEP_HOURS,
+                           "n_estimators": N_ESTIMATORS, "horizons": ",".join(map(str, HORIZONS))})
+        if MODE == "sliding":
+            mlflow.log_param("window_days", WINDOW_DAYS)
+        for h, m in metrics.items():
+            for name in ("mae", "rmse", "bias", "skill_vs_persistence"):
+                if np.isfinite(m[name]):
+                    mlflow.log_metric(f"{name}_{h}h", m[name])
+        mlflow.log_metric("backtest_seconds", elapsed)
+
+    summary = {
+        "mode": MODE,
+        "days": DAYS,
+        "step_hours": STEP_HOURS,
+        "window_days": WINDOW_DAYS if MODE == "sliding" else None,
+        "n_estimators": N_ESTIMATORS,
+        "seconds": elapsed,
+        "per_horizon": metrics,
+        "folds": [{k: v for k, v in r.items() if not k.endswith("err")} for r in fold_results],
+    }
+    os.makedirs(os.path.dirname(METRICS_PATH), exist_ok=True)
+    with open(METRICS_PATH, "w") as f:
+        json.dump(summary, f, indent=2)
+
+    for h, m in metrics.items():
+        print(f"📈 +{h:>3}h  MAE {m['mae']:6.2f}  RMSE {m['rmse']:6.2f}  "
+              f"persistence MAE {m['persistence_mae']:6.2f}  skill {m['skill_vs_persistence']:+.2f}")
+    print(f"✅ Backtest ({MODE}) finished in {elapsed:.0f}s; metrics saved at: {METRICS_PATH}")
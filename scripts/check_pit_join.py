@@ -0,0 +1,123 @@
+# check_pit_join.py
+# Fails (exit 1) when the local point-in-time join (scripts/pit_join.py) and
+# Feast's get_historical_features disagree on any feature of any entity row.
+# CI runs it once the features are registered (Postgres with aqi_data loaded).
+#
+# Entity rows checked, ids from feature_io.entity_ids as train.py builds them:
+#   history      every row at its own timestamp (exact-timestamp matches),
+#                against aqi_features (ttl=None)
+#   before       every row one second before its timestamp (nothing yet)
+#   ttl_inside   every row TTL - 1s after its timestamp, against a copy of
+#                aqi_features with a TTL registered for the check (removed
+#                afterwards)
+#   ttl_edge     exactly TTL after (still inside: both ends are inclusive)
+#   ttl_expired  TTL + 1s after (every feature null)
+#
+# Usage: python scripts/check_pit_join.py
+import logging
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+import pit_join
+from feature_defs import ENTITY_KEY, FEATURE_VIEW, FEATURES
+from feature_io import entity_ids, load_features
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+FEATURE_REPO_PATH = os.path.join(BASE_DIR, "aqi_feature_store", "feature_repo")
+TTL_VIEW = f"{FEATURE_VIEW}_ttl_check"
+TTL = pd.Timedelta(hours=2)
+SECOND = pd.Timedelta(seconds=1)
+
+
+def entity_frame(csv_path=pit_join.CSV_PATH, offset=pd.Timedelta(0)):
+    # Same entity dataframe train.py builds (every row), shifted by offset
+    times = load_features(csv_path, columns=["time"])["time"]
+    return pd.DataFrame({
+        "event_timestamp": times + offset,
+        ENTITY_KEY: entity_ids(times),
+    })
+
+
+def _same(a, b):
+    if pd.api.types.is_numeric_dtype(a) and pd.api.types.is_numeric_dtype(b):
+        return np.allclose(a.astype(float), b.astype(float), rtol=1e-6, atol=1e-4, equal_nan=True)
+    return (a.astype(object).fillna("").astype(str) == b.astype(object).fillna("").astype(str)).all()
+
+
+def check_parity(local_df, feast_df):
+    # Feast returns tz-aware UTC timestamps, float32 for REAL columns and rows in
+    # its own order; normalise both sides before comparing. Returns the
+    # mismatched columns.
+    keys = [ENTITY_KEY, "event_timestamp"]
+    a, b = local_df.copy(), feast_df.copy()
+    for df in (a, b):
+        ts = pd.to_datetime(df["event_timestamp"])
+        df["event_timestamp"] = ts.dt.tz_convert(None) if ts.dt.tz is not None else ts
+    if len(a) != len(b):
+        return ["<row count>"]
+    a = a.sort_values(keys).reset_index(drop=True)
+    b = b.sort_values(keys).reset_index(drop=True)[a.columns]
+    if not (a[keys] == b[keys]).all().all():
+        return ["<entity rows>"]
+    return [col for col in FEATURES if not _same(a[col], b[col])]
+
+
+def ttl_view():
+    # aqi_features as defined in the feature repo, under another name and a TTL
+    from feast import FeatureView
+
+    sys.path.insert(0, FEATURE_REPO_PATH)
+    import aqi_features
+
+    return aqi_features.location, FeatureView(
+        name=TTL_VIEW,
+        entities=[aqi_features.location],
+        ttl=TTL.to_pytimedelta(),
+        schema=aqi_features.feature_fields,
+        source=aqi_features.aqi_source,
+    )
+
+
+def run(store):
+    source = pit_join.load_source(FEATURES, pit_join.build_source())
+    cases = {
+        "history": (FEATURE_VIEW, None, pd.Timedelta(0)),
+        "before": (FEATURE_VIEW, None, -SECOND),
+        "ttl_inside": (TTL_VIEW, TTL, TTL - SECOND),
+        "ttl_edge": (TTL_VIEW, TTL, TTL),
+        "ttl_expired": (TTL_VIEW, TTL, TTL + SECOND),
+    }
+    failed = {}
+    for name, (view, ttl, offset) in cases.items():
+        entity_df = entity_frame(offset=offset)
+        local_df = pit_join.get_historical_features(entity_df, FEATURES, source=source, ttl=ttl)
+        feast_df = store.get_historical_features(
+            entity_df=entity_df, features=[f"{view}:{f}" for f in FEATURES]
+        ).to_df()
+        mismatched = check_parity(local_df, feast_df)
+        matched = int(local_df[FEATURES].notna().any(axis=1).sum())
+        if mismatched:
+            failed[name] = mismatched
+            print(f"❌ {name}: {len(entity_df)} rows ({matched} matched) differ in {', '.join(mismatched)}")
+        else:
+            print(f"✅ {name}: {len(entity_df)} rows ({matched} matched) identical")
+    return failed
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    from feast import FeatureStore
+
+    store = FeatureStore(repo_path=FEATURE_REPO_PATH)
+    entity, view = ttl_view()
+    store.apply([entity, view])
+    try:
+        failed = run(store)
+    finally:
+        store.delete_feature_view(TTL_VIEW)
+    if failed:
+        sys.exit(1)
+    print("✅ Local point-in-time join matches Feast")
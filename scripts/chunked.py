@@ -0,0 +1,264 @@
+# chunked.py
+# Helpers for cleaning/merging time-ordered CSVs chunk by chunk with bounded
+# memory (CLEAN_MODE=stream in data_clean_feature.py and
+# merge_weather_pollutant_full.py). Each helper gives exactly the values the
+# whole-file pandas operation would:
+#
+#   read_chunks        - typed chunks of a CSV, checked to be in time order
+#   aligned_chunks     - pairs of chunks from two sorted inputs covering the
+#                        same key range (for chunk-wise merges)
+#   Interpolator       - Series.interpolate() (linear by row position)
+#                        across chunk boundaries, holding back at most
+#                        max_gap rows
+#   exact_quantiles    - Series.quantile()/median() over a multi-pass input
+#                        (radix selection, no full column held in memory)
+#
+# Window features continue across chunks through scripts/windows.py.
+import numpy as np
+import pandas as pd
+
+CHUNK_ROWS = 100_000
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+# exact_quantiles stops narrowing and collects the remaining candidates once
+# no more than this many values share the current key prefix
+COLLECT_LIMIT = 1 << 20
+_RADIX_BITS = 16
+
+
+# -----------------------------
+# Reading / aligning
+# -----------------------------
+def read_chunks(path, chunk_rows=CHUNK_ROWS, dtype=None, key="time"):
+    # Chunks with `key` parsed to datetime. Streaming relies on time order, so
+    # an out-of-order file fails loudly instead of producing a wrong result.
+    last = None
+    for chunk in pd.read_csv(path, chunksize=chunk_rows, dtype=dtype):
+        chunk[key] = pd.to_datetime(chunk[key])
+        if not chunk[key].is_monotonic_increasing or (last is not None and chunk[key].iloc[0] < last):
+            raise ValueError(f"❌ {path} is not sorted by {key}; use the in-memory mode (CLEAN_MODE=memory)")
+        last = chunk[key].iloc[-1]
+        yield chunk
+
+
+def _extend(iterator, buf):
+    chunk = next(iterator, None)
+    if chunk is None:
+        return buf, True
+    return (chunk if buf is None or buf.empty else pd.concat([buf, chunk], ignore_index=True)), False
+
+
+def aligned_chunks(left, right, key="time"):
+    # Yields (left_part, right_part) over consecutive, disjoint key ranges of
+    # two key-sorted chunk iterators. Every row of a given key lands in the
+    # same pair, so merging pair by pair equals merging the whole inputs.
+    sides = [iter(left), iter(right)]
+    bufs, done = [None, None], [False, False]
+    for i in (0, 1):
+        bufs[i], done[i] = _extend(sides[i], None)
+    bufs = [b if b is not None else pd.DataFrame(columns=[key]) for b in bufs]
+    while True:
+        for i in (0, 1):
+            while not done[i] and bufs[i].empty:
+                bufs[i], done[i] = _extend(sides[i], bufs[i])
+        if all(done):
+            if len(bufs[0]) or len(bufs[1]):
+                yield bufs[0], bufs[1]
+            return
+        # Keys below the smallest "last key read" are complete on both sides
+        cutoff = min(bufs[i][key].iloc[-1] for i in (0, 1) if not done[i])
+        cut = [int(bufs[i][key].searchsorted(cutoff, side="left")) for i in (0, 1)]
+        if cut[0] or cut[1]:
+            yield bufs[0].iloc[: cut[0]], bufs[1].iloc[: cut[1]]
+            bufs = [bufs[i].iloc[cut[i]:].reset_index(drop=True) for i in (0, 1)]
+        # Rows at the cutoff may continue in the next chunk of the side that set it
+        for i in (0, 1):
+            if not done[i] and bufs[i][key].iloc[-1] == cutoff:
+                bufs[i], done[i] = _extend(sides[i], bufs[i])
+
+
+# -----------------------------
+# Interpolation across chunks
+# -----------------------------
+class Interpolator:
+    # Linear interpolation by row position, like Series.interpolate(): leading
+    # NaNs stay NaN, trailing NaNs take the last valid value. Rows after a
+    # column's last valid value can only be filled once the next valid value
+    # arrives, so push() holds them back and returns the resolved rows.
+    #
+    # With max_gap, a run of more than max_gap NaN rows is not interpolated:
+    # it keeps the last valid value, as a trailing run does. Such a run is
+    # resolved as soon as it is that long, so at most max_gap rows are ever
+    # held (a sensor that stays NaN to the end of the file no longer holds
+    # the rest of it). max_gap=None interpolates every gap.
+    def __init__(self, columns, max_gap=None):
+        self.columns = columns
+        self.max_gap = max_gap
+        self.offset = 0  # global position of the first held row
+        self.held = None
+        self.anchor = {c: None for c in columns}  # last valid (position, value) before the held rows
+        self.gap = {c: 0 for c in columns}  # NaN rows of a long run already returned, still open
+
+    def push(self, chunk):
+        df = chunk.copy() if self.held is None else pd.concat([self.held, chunk], ignore_index=True)
+        df = df.reset_index(drop=True)
+        boundary = 0 if self.held is None else len(self.held)
+        cut = len(df)
+        for col in self.columns:
+            hold = self._fill_long_gaps(df, col, boundary)
+            cut = min(cut, hold)
+        return self._resolve(df, cut)
+
+    def flush(self):
+        if self.held is None or self.held.empty:
+            return None
+        return self._resolve(self.held, len(self.held))
+
+    def _fill_long_gaps(self, df, col, boundary):
+        # Fills runs longer than max_gap in df[col] with the value before them
+        # (in place). Returns where the rows still waiting for a value start
+        # (len(df) when none are).
+        raw = df[col].to_numpy(dtype=float)
+        values = raw.copy()
+        edges = np.diff(np.concatenate([[0], np.isnan(raw).astype(np.int8), [0]]))
+        starts, ends = np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+        hold, gap = len(df), 0
+        for s, e in zip(starts, ends):
+            if s == 0 and self.anchor[col] is None:
+                continue  # leading NaNs stay NaN
+            prior = self.anchor[col][1] if s == 0 else values[s - 1]
+            # A run continuing one already returned (filled, in the held rows)
+            length = e - s + (self.gap[col] if s == boundary else 0)
+            if self.max_gap is not None and length > self.max_gap:
+                values[s:e] = prior
+                gap = length if e == len(df) else 0
+            elif e == len(df):
+                hold = s
+        self.gap[col] = gap
+        df[col] = values
+        return hold
+
+    def _resolve(self, df, cut):
+        positions = self.offset + np.arange(len(df), dtype=float)
+        out = df.iloc[:cut].copy()
+        for col in self.columns:
+            values = df[col].to_numpy(dtype=float)
+            valid = ~np.isnan(values)
+            xp, fp = positions[valid], values[valid]
+            if self.anchor[col] is not None:
+                xp = np.concatenate([[self.anchor[col][0]], xp])
+                fp = np.concatenate([[self.anchor[col][1]], fp])
+            resolved = values[:cut].copy()
+            if len(xp):
+                missing = np.isnan(resolved) & (positions[:cut] > xp[0])  # leading NaNs stay NaN
+                resolved[missing] = np.interp(positions[:cut][missing], xp, fp)
+                before = xp < self.offset + cut
+                if before.any():
+                    last = np.flatnonzero(before)[-1]
+                    self.anchor[col] = (xp[last], fp[last])
+            out[col] = resolved
+        self.held = df.iloc[cut:].reset_index(drop=True)
+        self.offset += cut
+        return out
+
+
+# -----------------------------
+# Exact quantiles over several passes
+# -----------------------------
+def _keys(values):
+    # float64 -> uint64 with the same ordering
+    bits = values.view(np.uint64)
+    return np.where(bits >> np.uint64(63), ~bits, bits | np.uint64(1 << 63))
+
+
+def _from_key(key):
+    key = np.uint64(key)
+    bits = key & ~np.uint64(1 << 63) if key >> np.uint64(63) else ~key
+    return float(np.array([bits], dtype=np.uint64).view(np.float64)[0])
+
+
+def _lerp(a, b, t):
+    # numpy's "linear" quantile interpolation, operation for operation
+    diff = b - a
+    return b - diff * (1 - t) if t >= 0.5 else a + diff * t
+
+
+def exact_quantiles(passes, wanted, collect_limit=COLLECT_LIMIT):
+    # passes() -> iterator of {column: float64 array} covering the data once;
+    # it is called several times. wanted: {column: [q, ...]} where q may be
+    # "median". Returns {column: {q: value}}, equal to Series.quantile(q) /
+    # Series.median() over the concatenated columns.
+    counts = {c: 0 for c in wanted}
+    hist = {c: np.zeros(1 << _RADIX_BITS, dtype=np.int64) for c in wanted}
+    top = np.uint64(64 - _RADIX_BITS)
+    for arrays in passes():
+        for c in wanted:
+            v = arrays[c][~np.isnan(arrays[c])]
+            counts[c] += len(v)
+            hist[c] += np.bincount((_keys(v) >> top).astype(np.int64), minlength=1 << _RADIX_BITS)
+
+    # Order statistics needed per column, searched by (prefix, shift, rank in prefix)
+    ranks = {c: set() for c in wanted}
+    for c, qs in wanted.items():
+        n = counts[c]
+        for q in qs:
+            if n == 0:
+                continue
+            if q == "median":
+                ranks[c].update({(n - 1) // 2, n // 2})
+            else:
+                lo = int(np.floor((n - 1) * q))
+                ranks[c].update({lo, min(lo + 1, n - 1)})
+    searches = []  # [column, rank, prefix, shift, rank within prefix, count in prefix]
+    for c in wanted:
+        cum = np.cumsum(hist[c])
+        for r in ranks[c]:
+            b = int(np.searchsorted(cum, r, side="right"))
+            searches.append([c, r, b, 64 - _RADIX_BITS, r - (cum[b - 1] if b else 0), int(hist[c][b])])
+
+    found = {}
+    while searches:
+        # Few enough candidates (or the full key is fixed): gather and select;
+        # otherwise histogram the next 16 bits inside the prefix
+        collect, narrow = [], []
+        for s in searches:
+            (collect if s[5] <= collect_limit or s[3] == 0 else narrow).append(s)
+        pools = {id(s): [] for s in collect}
+        sub = {id(s): np.zeros(1 << _RADIX_BITS, dtype=np.int64) for s in narrow}
+        for arrays in passes():
+            keys = {c: _keys(arrays[c][~np.isnan(arrays[c])]) for c in wanted}
+            for s in collect:
+                k = keys[s[0]]
+                pools[id(s)].append(k[(k >> np.uint64(s[3])) == np.uint64(s[2])])
+            for s in narrow:
+                k = keys[s[0]]
+                k = k[(k >> np.uint64(s[3])) == np.uint64(s[2])]
+                shift = np.uint64(s[3] - _RADIX_BITS)
+                sub[id(s)] += np.bincount(((k >> shift) & np.uint64((1 << _RADIX_BITS) - 1)).astype(np.int64),
+                                          minlength=1 << _RADIX_BITS)
+        for s in collect:
+            pool = np.concatenate(pools[id(s)]) if pools[id(s)] else np.empty(0, dtype=np.uint64)
+            found[(s[0], s[1])] = _from_key(np.partition(pool, s[4])[s[4]])
+        searches = []
+        for s in narrow:
+            cum = np.cumsum(sub[id(s)])
+            b = int(np.searchsorted(cum, s[4], side="right"))
+            searches.append([s[0], s[1], (s[2] << _RADIX_BITS) | b, s[3] - _RADIX_BITS,
+                             s[4] - (cum[b - 1] if b else 0), int(sub[id(s)][b])])
+
+    result = {}
+    for c, qs in wanted.items():
+        n = counts[c]
+        result[c] = {}
+        for q in qs:
+            if n == 0:
+                result[c][q] = float("nan")
+            elif q == "median":
+                a, b = found[(c, (n - 1) // 2)], found[(c, n // 2)]
+                result[c][q] = a if n % 2 else float(np.mean([a, b]))
+            else:
+                vi = (n - 1) * q
+                lo = int(np.floor(vi))
+                result[c][q] = float(_lerp(np.float64(found[(c, lo)]), np.float64(found[(c, min(lo + 1, n - 1))]),
+                                           np.float64(vi - lo)))
+    return result
+
@@ -4,129 +4,392 @@ from datetime import datetime
 import logging
 import os
 
+import chunked
+import gaps
+import pipeline_metrics
+import quantiles
+import windows
+from aqi import calculate_aqi
+from feature_defs import TARGET_IMPUTED
+
 # Setup
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(message)s")
 
 FILE_PATH = "data/realtime_data.csv"
 OUTPUT_PATH = "data/aqi_feature_set_v1.csv"
-os.makedirs("data", exist_ok=True)
-
-# Load data
-df = pd.read_csv(FILE_PATH)
-logging.info(f"✅ Loaded data | Shape: {df.shape}")
+# Rolling-window state after the last row of OUTPUT_PATH (windows.FeatureSet),
+# so the next run only cleans the hours after it
+WINDOW_STATE_PATH = "data/aqi_feature_set_v1.windows.pkl"
 
+# CLEAN_MODE=memory loads the whole raw file; CLEAN_MODE=stream processes it
+# in time-ordered chunks of CLEAN_CHUNK_ROWS with bounded memory (for
+# multi-year / multi-station raw files). Both write the same bytes.
+CLEAN_MODE = os.getenv("CLEAN_MODE", "memory")
+CHUNK_ROWS = int(os.getenv("CLEAN_CHUNK_ROWS", chunked.CHUNK_ROWS))
+# Where the fill medians and IQR quartiles come from (scripts/quantiles.py):
+# exact (whole history every run), frozen (fitted with the current model) or
+# sketch (P² estimators fed only the new rows)
+CAPPING_QUANTILES = os.getenv("CAPPING_QUANTILES", "exact")
+# How missing readings are handled: interpolate (pollutants by row, the rest
+# with the history median) or grid (scripts/gaps.py: complete hourly grid,
+# short gaps by time, long ones by hour-of-week profile, `imputed` flags)
+GAP_FILL = os.getenv("GAP_FILL", "interpolate")
+# Pollutant gaps longer than this many rows keep the last reading instead of
+# being interpolated (and streaming never holds more rows than this back)
+INTERPOLATE_MAX_GAP_ROWS = int(os.getenv("INTERPOLATE_MAX_GAP_ROWS", 24 * 7))
 
-
-# Handle missing values
 cols_medium_missing = ['pm10', 'pm2_5', 'carbon_monoxide', 'nitrogen_dioxide',
                        'sulphur_dioxide', 'ozone']
-for col in cols_medium_missing:
-    df[col] = df[col].interpolate(method='linear')
-    if pd.isna(df[col].iloc[0]):
-        df[col].iloc[0] = df[col].median()
-    if pd.isna(df[col].iloc[-1]):
-        df[col].iloc[-1] = df[col].median()
-
 cols_numeric_min_missing = ['temperature_2m', 'relative_humidity_2m', 'wind_speed_10m',
                             'pressure_msl', 'precipitation', 'cloudcover']
-for col in cols_numeric_min_missing:
-    df[col] = df[col].fillna(df[col].median())
-
-# Cap outliers (IQR)
-numeric_cols = ['pm10', 'pm2_5', 'carbon_monoxide', 'nitrogen_dioxide', 'sulphur_dioxide', 'ozone',
-                'temperature_2m', 'relative_humidity_2m', 'wind_speed_10m',
-                'pressure_msl', 'precipitation', 'cloudcover']
-for col in numeric_cols:
-    Q1 = df[col].quantile(0.25)
-    Q3 = df[col].quantile(0.75)
-    IQR = Q3 - Q1
-    df[col] = df[col].clip(Q1 - 1.5 * IQR, Q3 + 1.5 * IQR)
-
-# Log transform
-# Log transform for skewed columns and round to 2 decimals
+numeric_cols = cols_medium_missing + cols_numeric_min_missing
 skewed_cols = ['pm10', 'pm2_5', 'carbon_monoxide', 'nitrogen_dioxide', 'sulphur_dioxide', 'wind_speed_10m', 'cloudcover']
+round3_cols = ['AQI', 'AQI_change_rate', 'AQI_rolling_mean_3hr', 'AQI_rolling_mean_6hr',
+               'PM2_5_rolling_mean_3hr', 'PM10_rolling_mean_3hr',
+               'temp_wind', 'humidity_pressure']
+round2_cols = ['pm10', 'pm2_5', 'carbon_monoxide', 'nitrogen_dioxide', 'sulphur_dioxide', 'ozone']
+# Readings always parse as float64, so every chunk formats them the same way
+RAW_DTYPES = {col: "float64" for col in numeric_cols}
+
+
+# -----------------------------
+# Statistics (whole history)
+# -----------------------------
+def fill_first_row(df, stats):
+    # Leading gaps survive interpolation; the very first row takes the median
+    for col in cols_medium_missing:
+        if pd.isna(df[col].iloc[0]):
+            df.loc[df.index[0], col] = stats["median"][col]
+    # (A trailing gap is already filled with the last value by interpolate(),
+    # so the last row can only be NaN when the whole column is, median included)
+    return df
+
+
+def fill_weather(df, stats):
+    for col in cols_numeric_min_missing:
+        df[col] = df[col].fillna(stats["median"][col])
+    return df
+
+
+def fit_stats(df):
+    # df: raw rows after interpolation
+    stats = {"median": {col: df[col].median() for col in numeric_cols}}
+    filled = fill_weather(fill_first_row(df.copy(), stats), stats)
+    stats["q1"] = {col: filled[col].quantile(0.25) for col in numeric_cols}
+    stats["q3"] = {col: filled[col].quantile(0.75) for col in numeric_cols}
+    return stats
+
+
+def fit_stats_streaming(interpolated_chunks):
+    # Same statistics as fit_stats(), in a few passes over the raw file
+    def columns(fill=None):
+        def passes():
+            for i, chunk in enumerate(interpolated_chunks()):
+                if fill is not None:
+                    if i == 0:
+                        chunk = fill_first_row(chunk, fill)
+                    chunk = fill_weather(chunk, fill)
+                yield {col: chunk[col].to_numpy(dtype=float) for col in numeric_cols}
+        return passes
+
+    medians = chunked.exact_quantiles(columns(), {col: ["median"] for col in numeric_cols})
+    stats = {"median": {col: medians[col]["median"] for col in numeric_cols}}
+    quartiles = chunked.exact_quantiles(columns(stats), {col: [0.25, 0.75] for col in numeric_cols})
+    stats["q1"] = {col: quartiles[col][0.25] for col in numeric_cols}
+    stats["q3"] = {col: quartiles[col][0.75] for col in numeric_cols}
+    return stats
+
+
+def sketch_stats(interpolated_chunks):
+    # Statistics from the saved P² sketch, fed only rows newer than the last
+    # run's; the first run builds it from exact quantiles of the history.
+    # Like fit_stats(), it sees the rows with the first row and the weather
+    # gaps filled by the medians (new rows: the sketch's medians so far).
+    def columns(chunk):
+        return {col: chunk[col].to_numpy(dtype=float) for col in numeric_cols}
+
+    def filled(fill):
+        for i, chunk in enumerate(interpolated_chunks()):
+            chunk = chunk.copy()  # memory mode hands over the frame it cleans
+            if i == 0:
+                chunk = fill_first_row(chunk, fill)
+            yield columns(fill_weather(chunk, fill))
+
+    sketch = quantiles.Sketch.load(columns=numeric_cols)
+    if sketch is None:
+        medians = chunked.exact_quantiles(lambda: (columns(c) for c in interpolated_chunks()),
+                                          {col: ["median"] for col in numeric_cols})
+        fill = {"median": {col: medians[col]["median"] for col in numeric_cols}}
+        sketch = quantiles.Sketch.fit(lambda: filled(fill), numeric_cols)
+        last = max((pd.to_datetime(c['time']).max() for c in interpolated_chunks()), default=None)
+        logging.info(f"✅ Built capping sketch from {int(sketch.count.max())} rows of history")
+    else:
+        last, added = pd.Timestamp(sketch.last_time), 0
+        fill = {"median": {col: sketch.quantile(col, 0.5) for col in numeric_cols}}
+        for chunk in interpolated_chunks():
+            new = chunk[pd.to_datetime(chunk['time']) > pd.Timestamp(sketch.last_time)]
+            if len(new):
+                sketch.update(columns(fill_weather(new.copy(), fill)))
+                last, added = max(last, pd.to_datetime(new['time']).max()), added + len(new)
+        logging.info(f"✅ Updated capping sketch with {added} new rows")
+    sketch.last_time = None if last is None or pd.isna(last) else str(last)
+    sketch.save()
+    return {
+        "median": {col: sketch.quantile(col, 0.5) for col in numeric_cols},
+        "q1": {col: sketch.quantile(col, 0.25) for col in numeric_cols},
+        "q3": {col: sketch.quantile(col, 0.75) for col in numeric_cols},
+    }
+
+
+def capping_stats(fit_exact, interpolated_chunks):
+    # fit_exact() -> exact statistics; interpolated_chunks() -> the raw rows
+    # after interpolation (one chunk in memory mode)
+    if CAPPING_QUANTILES == "frozen":
+        stats = quantiles.load_frozen(columns=numeric_cols)
+        if stats is not None:
+            logging.info(f"✅ Using capping quantiles frozen with the model ({quantiles.FROZEN_PATH})")
+            return stats
+        logging.warning("⚠️ No frozen capping quantiles yet (train.py writes them); fitting exact ones")
+    elif CAPPING_QUANTILES == "sketch":
+        return sketch_stats(interpolated_chunks)
+    elif CAPPING_QUANTILES != "exact":
+        raise ValueError(f"❌ CAPPING_QUANTILES must be one of {quantiles.MODES}, got {CAPPING_QUANTILES!r}")
+    return fit_exact()
+
+
+def save_applied(stats):
+    # The stats the rows just written were cleaned with; train.py freezes
+    # these with the model (quantiles.freeze)
+    quantiles.save_frozen(stats, f"{FILE_PATH} (CAPPING_QUANTILES={CAPPING_QUANTILES})", quantiles.APPLIED_PATH)
+
+
+# -----------------------------
+# Row transforms
+# -----------------------------
+def interpolated(chunks):
+    # Linear interpolation of pollutant gaps (row order), across chunk boundaries
+    interpolator = chunked.Interpolator(cols_medium_missing, max_gap=INTERPOLATE_MAX_GAP_ROWS)
+    for chunk in chunks:
+        out = interpolator.push(chunk)
+        if len(out):
+            yield out
+    out = interpolator.flush()
+    if out is not None and len(out):
+        yield out
+
+
+def _grid():
+    if GAP_FILL not in ("interpolate", "grid"):
+        raise ValueError(f"❌ GAP_FILL must be 'interpolate' or 'grid', got {GAP_FILL!r}")
+    return GAP_FILL == "grid"
+
+
+def gap_filled(chunks, profile, report=None):
+    # Time-ordered raw chunks on the hourly grid, every gap filled and flagged
+    filler = gaps.GapFiller(numeric_cols, profile)
+    yield from gaps.filled(chunks, filler)
+    if report is not None:
+        report.update(filler.report)
 
-for col in skewed_cols:
-    df['log_' + col] = np.log1p(df[col]).round(2)
-
-
-# Datetime conversion and sorting
-df['time'] = pd.to_datetime(df['time'])
-df = df.sort_values('time').reset_index(drop=True)
-
-# Time-based features
-df['hour'] = df['time'].dt.hour
-df['day'] = df['time'].dt.day
-df['month'] = df['time'].dt.month
-df['day_of_week'] = df['time'].dt.day_name()
-
-# AQI Calculation
-def calculate_aqi(pm25, pm10):
-    def aqi_subindex(Cp, Bp_lo, Bp_hi, I_lo, I_hi):
-        return ((I_hi - I_lo) / (Bp_hi - Bp_lo)) * (Cp - Bp_lo) + I_lo
-
-    pm25_breakpoints = [
-        (0.0, 12.0, 0, 50), (12.1, 35.4, 51, 100), (35.5, 55.4, 101, 150),
-        (55.5, 150.4, 151, 200), (150.5, 250.4, 201, 300), (250.5, 500.4, 301, 500)
-    ]
-    pm10_breakpoints = [
-        (0, 54, 0, 50), (55, 154, 51, 100), (155, 254, 101, 150),
-        (255, 354, 151, 200), (355, 424, 201, 300), (425, 604, 301, 500)
-    ]
-
-    aqi_pm25 = next((aqi_subindex(pm25, Bp_lo, Bp_hi, I_lo, I_hi)
-                     for Bp_lo, Bp_hi, I_lo, I_hi in pm25_breakpoints
-                     if Bp_lo <= pm25 <= Bp_hi), None)
-    aqi_pm10 = next((aqi_subindex(pm10, Bp_lo, Bp_hi, I_lo, I_hi)
-                     for Bp_lo, Bp_hi, I_lo, I_hi in pm10_breakpoints
-                     if Bp_lo <= pm10 <= Bp_hi), None)
-
-    if aqi_pm25 is not None and aqi_pm10 is not None:
-        return max(aqi_pm25, aqi_pm10)
-    elif aqi_pm25 is not None:
-        return aqi_pm25
-    elif aqi_pm10 is not None:
-        return aqi_pm10
+
+def prepared_frame(df, report=None):
+    # Whole raw frame with its gaps handled (GAP_FILL)
+    if _grid():
+        df['time'] = pd.to_datetime(df['time'])
+        df = df.sort_values('time', kind='stable').reset_index(drop=True)
+        return pd.concat(list(gap_filled([df], gaps.Profile.fit([df], numeric_cols), report)), ignore_index=True)
+    return pd.concat(list(interpolated([df])), ignore_index=True)
+
+
+def prepared_chunks(raw_chunks):
+    # raw_chunks() -> time-ordered raw chunks. Returns a callable giving them
+    # with gaps handled (GAP_FILL), for each of the passes streaming makes.
+    if _grid():
+        profile = gaps.Profile.fit(raw_chunks(), numeric_cols)
+        return lambda report=None: gap_filled(raw_chunks(), profile, report)
+    return lambda report=None: interpolated(raw_chunks())
+
+
+def flags_as_int(df):
+    # Rows cleaned without GAP_FILL=grid have no flags; keep the others integer
+    for col in (gaps.FLAG_COLUMN, TARGET_IMPUTED):
+        if col in df.columns:
+            df[col] = df[col].astype("Int64")
+    return df
+
+
+def clean_chunk(df, stats, state):
+    # state carries what the next chunk needs: whether this is the first row
+    # of the file and the rolling-window state
+    if state.get("first", True):
+        df = fill_first_row(df, stats)
+        state["first"] = False
+    df = fill_weather(df, stats)
+
+    # Cap outliers (IQR)
+    for col in numeric_cols:
+        IQR = stats["q3"][col] - stats["q1"][col]
+        df[col] = df[col].clip(stats["q1"][col] - 1.5 * IQR, stats["q3"][col] + 1.5 * IQR)
+
+    # Log transform for skewed columns and round to 2 decimals
+    for col in skewed_cols:
+        df['log_' + col] = np.log1p(df[col]).round(2)
+
+    # Time-based features
+    df['hour'] = df['time'].dt.hour
+    df['day'] = df['time'].dt.day
+    df['month'] = df['time'].dt.month
+    df['day_of_week'] = df['time'].dt.day_name()
+
+    # AQI Calculation (scripts/aqi.py)
+    df['AQI'] = df.apply(lambda row: calculate_aqi(row['pm2_5'], row['pm10']), axis=1).astype(float)
+    if gaps.FLAG_COLUMN in df.columns:
+        # AQI from a filled pm2_5 or pm10 is not a real target
+        bits = sum(1 << numeric_cols.index(c) for c in ('pm2_5', 'pm10'))
+        df[TARGET_IMPUTED] = ((df[gaps.FLAG_COLUMN].to_numpy() & bits) != 0).astype(int)
+
+    # AQI change rate and rolling averages (scripts/windows.py), continuing
+    # from the previous chunk
+    features = state.setdefault("windows", windows.FeatureSet(windows.FEATURES))
+    for name, values in features.batch(df).items():
+        df[name] = values
+
+    # Weather interaction features
+    df['temp_wind'] = df['temperature_2m'] * df['wind_speed_10m']
+    df['humidity_pressure'] = df['relative_humidity_2m'] / df['pressure_msl']
+
+    # Round numeric columns
+    df[round3_cols] = df[round3_cols].round(3)
+    df[round2_cols] = df[round2_cols].round(2)
+    return df
+
+
+# -----------------------------
+# In-memory path
+# -----------------------------
+def run_in_memory(metrics):
+    df = pd.read_csv(FILE_PATH, dtype=RAW_DTYPES)
+    metrics.read(FILE_PATH, rows=len(df))
+    logging.info(f"✅ Loaded data | Shape: {df.shape}")
+
+    report = {}
+    df = prepared_frame(df, report)
+    if report:
+        gaps.log_report(report)
+    stats = capping_stats(lambda: fit_stats(df), lambda: iter([df]))
+
+    # Datetime conversion and sorting (a time-ordered file is left as is)
+    df['time'] = pd.to_datetime(df['time'])
+    df = df.sort_values('time', kind='stable').reset_index(drop=True)
+
+    # ✅ Append only new timestamps to output file
+    if os.path.exists(OUTPUT_PATH):
+        existing_df = pd.read_csv(OUTPUT_PATH)
+        metrics.read(OUTPUT_PATH)
+        existing_df['time'] = pd.to_datetime(existing_df['time'])
+        last_time = existing_df['time'].max()
+
+        # Filter only new rows (not already in existing file)
+        new_rows = df[~df['time'].isin(existing_df['time'])]
+        resumed = None
+        if not new_rows.empty and new_rows['time'].min() > last_time:
+            resumed = windows.FeatureSet.load(WINDOW_STATE_PATH, windows.FEATURES, last_time)
+        if resumed is not None:
+            # Only the new hours, windows continuing from the last written row
+            state = {"first": False, "windows": resumed}
+            new_rows = clean_chunk(new_rows.copy(), stats, state)
+            logging.info(f"✅ Resumed rolling windows at {last_time} ({len(new_rows)} new rows)")
+        else:
+            state = {}
+            df = clean_chunk(df, stats, state)
+            new_rows = df[~df['time'].isin(existing_df['time'])]
+        if not new_rows.empty:
+            combined_df = pd.concat([existing_df, new_rows]).sort_values('time', kind='stable').reset_index(drop=True)
+            combined_df = flags_as_int(combined_df)
+            combined_df.to_csv(OUTPUT_PATH, index=False, date_format=chunked.TIME_FORMAT)
+            metrics.wrote(OUTPUT_PATH, rows=len(new_rows))
+            save_applied(stats)
+            logging.info(f"✅ Appended {len(new_rows)} new rows to {OUTPUT_PATH}")
+        else:
+            logging.info("ℹ️ No new timestamps found. File not updated.")
+        # Only used by the next run if this is also the file's last row
+        state["windows"].save(WINDOW_STATE_PATH, (new_rows if resumed is not None else df)['time'].max())
     else:
-        return None
-
-df['AQI'] = df.apply(lambda row: calculate_aqi(row['pm2_5'], row['pm10']), axis=1)
-
-# AQI change rate
-df['AQI_change_rate'] = df['AQI'].diff().fillna(0)
-
-# Rolling averages
-df['AQI_rolling_mean_3hr'] = df['AQI'].rolling(window=3, min_periods=1).mean()
-df['AQI_rolling_mean_6hr'] = df['AQI'].rolling(window=6, min_periods=1).mean()
-df['PM2_5_rolling_mean_3hr'] = df['pm2_5'].rolling(window=3, min_periods=1).mean()
-df['PM10_rolling_mean_3hr'] = df['pm10'].rolling(window=3, min_periods=1).mean()
-
-# Weather interaction features
-df['temp_wind'] = df['temperature_2m'] * df['wind_speed_10m']
-df['humidity_pressure'] = df['relative_humidity_2m'] / df['pressure_msl']
-
-# Round numeric columns
-round_cols = ['AQI', 'AQI_change_rate', 'AQI_rolling_mean_3hr', 'AQI_rolling_mean_6hr',
-              'PM2_5_rolling_mean_3hr', 'PM10_rolling_mean_3hr',
-              'temp_wind', 'humidity_pressure']
-df[round_cols] = df[round_cols].round(3)
-
-round_cols = ['pm10', 'pm2_5', 'carbon_monoxide', 'nitrogen_dioxide', 'sulphur_dioxide', 'ozone']
-df[round_cols] = df[round_cols].round(2)
-
-# ✅ Append only new timestamps to output file
-if os.path.exists(OUTPUT_PATH):
-    existing_df = pd.read_csv(OUTPUT_PATH)
-    existing_df['time'] = pd.to_datetime(existing_df['time'])
-
-    # Filter only new rows (not already in existing file)
-    new_rows = df[~df['time'].isin(existing_df['time'])]
-    if not new_rows.empty:
-        combined_df = pd.concat([existing_df, new_rows]).sort_values('time').reset_index(drop=True)
-        combined_df.to_csv(OUTPUT_PATH, index=False)
-        logging.info(f"✅ Appended {len(new_rows)} new rows to {OUTPUT_PATH}")
+        state = {}
+        df = clean_chunk(df, stats, state)
+        df.to_csv(OUTPUT_PATH, index=False, date_format=chunked.TIME_FORMAT)
+        metrics.wrote(OUTPUT_PATH, rows=len(df))
+        save_applied(stats)
+        logging.info(f"✅ Created new file at {OUTPUT_PATH}")
+        state["windows"].save(WINDOW_STATE_PATH, df['time'].max())
+
+
+# -----------------------------
+# Streaming path
+# -----------------------------
+def run_streaming(metrics):
+    prepared = prepared_chunks(lambda: chunked.read_chunks(FILE_PATH, CHUNK_ROWS, dtype=RAW_DTYPES))
+    stats = capping_stats(lambda: fit_stats_streaming(prepared), prepared)
+    logging.info(f"✅ Fill/capping statistics ready ({CAPPING_QUANTILES}, chunks of {CHUNK_ROWS} rows)")
+
+    rows_in = 0
+    last_time = None
+    state = {}
+    report = {}
+
+    def cleaned():
+        nonlocal rows_in, last_time
+        for chunk in prepared(report):
+            rows_in += len(chunk)
+            if len(chunk):
+                last_time = chunk['time'].iloc[-1]
+            yield clean_chunk(chunk, stats, state)
+
+    tmp_path = OUTPUT_PATH + ".tmp"
+    rows_new = 0
+    with open(tmp_path, "w", newline="") as f:
+        if os.path.exists(OUTPUT_PATH):
+            # Sorted merge of the existing file with the new rows; rows whose
+            # timestamp is already in the file are dropped, as in memory mode
+            existing = chunked.read_chunks(OUTPUT_PATH, CHUNK_ROWS)
+            columns = None
+            for old, new in chunked.aligned_chunks(existing, cleaned()):
+                if columns is None:
+                    columns = list(old.columns) + [c for c in new.columns if c not in old.columns]
+                new = new[~new['time'].isin(old['time'])]
+                rows_new += len(new)
+                part = pd.concat([old.reindex(columns=columns), new.reindex(columns=columns)])
+                part = flags_as_int(part.sort_values('time', kind='stable'))
+                part.to_csv(f, index=False, header=f.tell() == 0, date_format=chunked.TIME_FORMAT)
+            metrics.read(OUTPUT_PATH)
+        else:
+            for new in cleaned():
+                rows_new += len(new)
+                new.to_csv(f, index=False, header=f.tell() == 0, date_format=chunked.TIME_FORMAT)
+    metrics.read(FILE_PATH, rows=rows_in)
+    logging.info(f"✅ Streamed {rows_in} rows")
+    if report:
+        gaps.log_report(report)
+
+    if rows_new or not os.path.exists(OUTPUT_PATH):
+        created = not os.path.exists(OUTPUT_PATH)
+        os.replace(tmp_path, OUTPUT_PATH)
+        metrics.wrote(OUTPUT_PATH, rows=rows_new)
+        save_applied(stats)
+        logging.info(f"✅ {'Created new file at' if created else f'Appended {rows_new} new rows to'} {OUTPUT_PATH}")
     else:
+        os.remove(tmp_path)
         logging.info("ℹ️ No new timestamps found. File not updated.")
-else:
-    df.to_csv(OUTPUT_PATH, index=False)
-    logging.info(f"✅ Created new file at {OUTPUT_PATH}")
+    if last_time is not None:
+        # Lets a later memory-mode run resume (this mode always re-cleans)
+        state["windows"].save(WINDOW_STATE_PATH, last_time)
+
+
+if __name__ == "__main__":
+    os.makedirs("data", exist_ok=True)
+    with pipeline_metrics.start("clean") as metrics:
+        if CLEAN_MODE == "stream":
+            run_streaming(metrics)
+        else:
+            run_in_memory(metrics)
+        metrics.finish(mode=CLEAN_MODE, capping=CAPPING_QUANTILES, gap_fill=GAP_FILL)
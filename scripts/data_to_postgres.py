@@ -1,81 +1,213 @@
-import psycopg2
+import io
 import pandas as pd
-from dotenv import load_dotenv
-import os
-
-# Load .env variables
-
-
-# Load cleaned feature data
-df = pd.read_csv("data/aqi_feature_set_v1.csv")
-
-# Connect to PostgreSQL using env vars
-conn = psycopg2.connect(
-    dbname="aqi_feature_store",
-    user="postgres",
-    password="123",
-    host="localhost",
-    port="5432"
-)
-cur = conn.cursor()
-
-# 1️⃣ Create table if not exists
-cur.execute("""
-CREATE TABLE IF NOT EXISTS aqi_data (
-    id SERIAL PRIMARY KEY,
-    time TIMESTAMP UNIQUE,
-    pm10 FLOAT,
-    pm2_5 FLOAT,
-    carbon_monoxide FLOAT,
-    nitrogen_dioxide FLOAT,
-    sulphur_dioxide FLOAT,
-    ozone FLOAT,
-    temperature_2m FLOAT,
-    relative_humidity_2m FLOAT,
-    wind_speed_10m FLOAT,
-    pressure_msl FLOAT,
-    precipitation FLOAT,
-    cloudcover FLOAT,
-    day_of_week VARCHAR(15),
-    month INT,
-    log_pm10 FLOAT,
-    log_pm2_5 FLOAT,
-    log_carbon_monoxide FLOAT,
-    log_nitrogen_dioxide FLOAT,
-    log_sulphur_dioxide FLOAT,
-    log_wind_speed_10m FLOAT,
-    log_cloudcover FLOAT,
-    AQI FLOAT,
-    hour INT,
-    day INT,
-    AQI_change_rate FLOAT,
-    AQI_rolling_mean_3hr FLOAT,
-    AQI_rolling_mean_6hr FLOAT,
-    PM2_5_rolling_mean_3hr FLOAT,
-    PM10_rolling_mean_3hr FLOAT,
-    temp_wind FLOAT,
-    humidity_pressure FLOAT
-);
-""")
-conn.commit()
-
-# 2️⃣ Insert data, skipping duplicates
-for _, row in df.iterrows():
-    cur.execute("""
-        INSERT INTO aqi_data (
-            time, pm10, pm2_5, carbon_monoxide, nitrogen_dioxide, sulphur_dioxide, ozone,
-            temperature_2m, relative_humidity_2m, wind_speed_10m, pressure_msl, precipitation,
-            cloudcover, day_of_week, month, log_pm10, log_pm2_5, log_carbon_monoxide,
-            log_nitrogen_dioxide, log_sulphur_dioxide, log_wind_speed_10m, log_cloudcover,
-            AQI, hour, day, AQI_change_rate, AQI_rolling_mean_3hr, AQI_rolling_mean_6hr,
-            PM2_5_rolling_mean_3hr, PM10_rolling_mean_3hr, temp_wind, humidity_pressure
+
+import db
+import feature_schema
+import pipeline_metrics
+
+# -----------------------------
+# Table layout
+# -----------------------------
+# aqi_data is range-partitioned by month on `time`. Sensor values are REAL
+# (float4, which is what Feast reads them as anyway), calendar parts are
+# SMALLINT, and `time` is covered by a BRIN index: the table is append-only in
+# time order, so a BRIN index is a few pages per partition instead of a btree
+# over every row, and Feast's point-in-time scans prune whole partitions.
+# UNIQUE (time) (allowed: time is the partition key) keeps one row per hour
+# and backs the ON CONFLICT of the load.
+TABLE = "aqi_data"
+LEGACY_TABLE = "aqi_data_legacy"
+
+REAL_COLS = [
+    "pm10", "pm2_5", "carbon_monoxide", "nitrogen_dioxide", "sulphur_dioxide", "ozone",
+    "temperature_2m", "relative_humidity_2m", "wind_speed_10m", "pressure_msl",
+    "precipitation", "cloudcover",
+    "log_pm10", "log_pm2_5", "log_carbon_monoxide", "log_nitrogen_dioxide",
+    "log_sulphur_dioxide", "log_wind_speed_10m", "log_cloudcover",
+    "aqi", "aqi_change_rate", "aqi_rolling_mean_3hr", "aqi_rolling_mean_6hr",
+    "pm2_5_rolling_mean_3hr", "pm10_rolling_mean_3hr", "temp_wind", "humidity_pressure",
+]
+SMALLINT_COLS = ["month", "hour", "day"]
+
+# Column order matches data/aqi_feature_set_v1.csv
+CSV_COLUMNS = [
+    "time", "pm10", "pm2_5", "carbon_monoxide", "nitrogen_dioxide", "sulphur_dioxide", "ozone",
+    "temperature_2m", "relative_humidity_2m", "wind_speed_10m", "pressure_msl", "precipitation",
+    "cloudcover", "day_of_week", "month", "log_pm10", "log_pm2_5", "log_carbon_monoxide",
+    "log_nitrogen_dioxide", "log_sulphur_dioxide", "log_wind_speed_10m", "log_cloudcover",
+    "aqi", "hour", "day", "aqi_change_rate", "aqi_rolling_mean_3hr", "aqi_rolling_mean_6hr",
+    "pm2_5_rolling_mean_3hr", "pm10_rolling_mean_3hr", "temp_wind", "humidity_pressure",
+]
+
+
+def column_type(col):
+    if col == "time":
+        return "TIMESTAMP NOT NULL"
+    if col == "day_of_week":
+        return "VARCHAR(15)"
+    if col in SMALLINT_COLS:
+        return "SMALLINT"
+    if col in REAL_COLS:
+        return "REAL"
+    raise KeyError(f"No column type defined for '{col}'")
+
+
+def create_table_sql(table):
+    cols = ",\n    ".join(f"{c} {column_type(c)}" for c in CSV_COLUMNS)
+    return f"""
+CREATE TABLE IF NOT EXISTS {table} (
+    id SERIAL,
+    {cols},
+    UNIQUE (time)
+) PARTITION BY RANGE (time);
+"""
+
+
+def month_starts(min_time, max_time):
+    start = pd.Timestamp(min_time).to_period("M").to_timestamp()
+    end = pd.Timestamp(max_time).to_period("M").to_timestamp()
+    return list(pd.date_range(start, end, freq="MS"))
+
+
+def ensure_partitions(cur, table, min_time, max_time):
+    # One partition per calendar month covering the incoming rows
+    for start in month_starts(min_time, max_time):
+        end = start + pd.offsets.MonthBegin(1)
+        cur.execute(f"""
+            CREATE TABLE IF NOT EXISTS {table}_y{start:%Y}m{start:%m}
+            PARTITION OF {table}
+            FOR VALUES FROM ('{start:%Y-%m-%d}') TO ('{end:%Y-%m-%d}');
+        """)
+
+
+def ensure_indexes(cur, table):
+    # Partitioned index: Postgres creates the matching BRIN index on every partition
+    cur.execute(f"CREATE INDEX IF NOT EXISTS {table}_time_brin ON {table} USING brin (time);")
+
+
+def ensure_unique_time(cur, table):
+    # Partitioned tables created before UNIQUE (time) was part of the layout
+    cur.execute(
+        "SELECT 1 FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'u'",
+        (table,),
+    )
+    if cur.fetchone() is None:
+        cur.execute(f"ALTER TABLE {table} ADD UNIQUE (time);")
+        print(f"🔁 Added UNIQUE (time) to {table}")
+
+
+def table_kind(cur, table):
+    # 'p' = partitioned, 'r' = plain heap table, None = missing
+    cur.execute(
+        "SELECT c.relkind FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace "
+        "WHERE c.relname = %s AND n.nspname = current_schema()",
+        (table,),
+    )
+    row = cur.fetchone()
+    return row[0] if row else None
+
+
+def migrate_legacy_table(cur):
+    # Move rows from the old single-heap aqi_data (FLOAT columns, UNIQUE btree on
+    # time) into the partitioned layout. The old hourly loads re-sent the whole
+    # CSV, and every conflicting row still drew a SERIAL value, so legacy ids
+    # have gaps: rows are renumbered 1..N in time order (what
+    # feature_io.entity_ids assumes) and the sequence restarts at N+1. Runs
+    # inside the caller's transaction.
+    print(f"🔁 Migrating heap table {TABLE} to monthly partitions...")
+    cur.execute(f"ALTER TABLE {TABLE} RENAME TO {LEGACY_TABLE};")
+    cur.execute(create_table_sql(TABLE))
+
+    cur.execute(f"SELECT min(time), max(time), count(*) FILTER (WHERE time IS NULL) FROM {LEGACY_TABLE};")
+    min_time, max_time, no_time = cur.fetchone()
+    if no_time:
+        # The partition key is NOT NULL: these rows cannot be placed (or
+        # looked up by Feast); they are reported and left out
+        print(f"⚠️ Skipping {no_time} legacy rows with no time")
+    if min_time is not None:
+        ensure_partitions(cur, TABLE, min_time, max_time)
+
+    casts = ", ".join(
+        f"{c}::{column_type(c).replace(' NOT NULL', '')}" for c in CSV_COLUMNS
+    )
+    cur.execute(f"""
+        INSERT INTO {TABLE} (id, {", ".join(CSV_COLUMNS)})
+        SELECT row_number() OVER (ORDER BY time, id), {casts}
+        FROM {LEGACY_TABLE} WHERE time IS NOT NULL;
+    """)
+    migrated = cur.rowcount
+    cur.execute(f"""
+        SELECT setval(pg_get_serial_sequence('{TABLE}', 'id'),
+                      COALESCE((SELECT max(id) FROM {TABLE}), 0) + 1, false);
+    """)
+    cur.execute(f"DROP TABLE {LEGACY_TABLE};")
+    # The online store is keyed by the old ids: forget the materialization
+    # watermark so scripts/materialize.py rewrites it from the earliest row
+    cur.execute("SELECT to_regclass('feast_materialization_watermark');")
+    if cur.fetchone()[0] is not None:
+        cur.execute("DELETE FROM feast_materialization_watermark;")
+    print(f"✅ Migrated {migrated} rows into partitioned {TABLE} (ids renumbered 1..{migrated})")
+
+
+def load_new_rows(cur, df):
+    # COPY into a temp staging table, then append only timestamps not already
+    # present. The anti-join is bounded to the staging time range so it only
+    # touches the partitions being loaded, and keeps known rows from drawing
+    # ids (entity ids stay 1..N in time order); ON CONFLICT covers a
+    # concurrent load of the same hours.
+    cur.execute(f"CREATE TEMP TABLE {TABLE}_staging (LIKE {TABLE}) ON COMMIT DROP;")
+    cur.execute(f"ALTER TABLE {TABLE}_staging DROP COLUMN id;")
+
+    buf = io.StringIO()
+    df[CSV_COLUMNS].to_csv(buf, index=False, header=False)
+    with cur.copy(f"COPY {TABLE}_staging ({', '.join(CSV_COLUMNS)}) FROM STDIN WITH (FORMAT csv)") as copy:
+        copy.write(buf.getvalue())
+
+    cur.execute(f"""
+        INSERT INTO {TABLE} ({", ".join(CSV_COLUMNS)})
+        SELECT DISTINCT ON (s.time) {", ".join("s." + c for c in CSV_COLUMNS)}
+        FROM {TABLE}_staging s
+        WHERE NOT EXISTS (
+            SELECT 1 FROM {TABLE} a
+            WHERE a.time = s.time
+              AND a.time BETWEEN %s AND %s
         )
-        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+        ORDER BY s.time
         ON CONFLICT (time) DO NOTHING;
-    """, tuple(row))
+    """, (df["time"].min(), df["time"].max()))
+    return cur.rowcount
+
+
+if __name__ == "__main__":
+    with pipeline_metrics.start("postgres_load") as metrics:
+
+        # Load cleaned feature data
+        df = pd.read_csv("data/aqi_feature_set_v1.csv")
+        metrics.read("data/aqi_feature_set_v1.csv", rows=len(df))
+        df.columns = [c.lower() for c in df.columns]
+        df["time"] = pd.to_datetime(df["time"])
+
+        # Pooled connection (settings from env, see scripts/db.py); one transaction
+        with db.connection() as conn, conn.cursor() as cur:
+            # 1️⃣ Create (or migrate) the partitioned table
+            kind = table_kind(cur, TABLE)
+            if kind == "r":
+                migrate_legacy_table(cur)
+            elif kind is None:
+                cur.execute(create_table_sql(TABLE))
+            else:
+                ensure_unique_time(cur, TABLE)
+            ensure_indexes(cur, TABLE)
+
+            # 2️⃣ Insert data, skipping duplicates
+            ensure_partitions(cur, TABLE, df["time"].min(), df["time"].max())
+            inserted = load_new_rows(cur, df)
 
-conn.commit()
-cur.close()
-conn.close()
+        # DDL above may have changed the table layout; keep the Feast schema file in step
+        db.invalidate_schema_cache()
+        if feature_schema.refresh():
+            print(f"🔁 aqi_data DDL changed — regenerated {feature_schema.SCHEMA_PATH}")
 
-print("✅ New data inserted successfully — duplicates skipped.")
+        print(f"✅ {inserted} new rows inserted successfully — duplicates skipped.")
+        metrics.rows_out = inserted
+        metrics.finish()
@@ -0,0 +1,117 @@
+# db.py
+# Shared PostgreSQL access for the loader, the Feast bootstrap and the feature
+# viewer. One psycopg connection pool per process, configured from the
+# environment (or .env), so stages stop paying connection setup on every step.
+import atexit
+import os
+from contextlib import contextmanager
+from functools import lru_cache
+
+import pandas as pd
+from dotenv import load_dotenv
+from psycopg.conninfo import make_conninfo
+from psycopg_pool import ConnectionPool
+
+load_dotenv()
+
+# -----------------------------
+# Connection settings (env overrides, defaults match the CI Postgres service)
+# -----------------------------
+DB_NAME = os.getenv("PGDATABASE", "aqi_feature_store")
+DB_USER = os.getenv("PGUSER", "postgres")
+DB_PASSWORD = os.getenv("PGPASSWORD", "123")
+DB_HOST = os.getenv("PGHOST", "localhost")
+DB_PORT = os.getenv("PGPORT", "5432")
+
+POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", 1))
+POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", 4))
+POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", 30))
+
+# Statements run with prepare=True are planned once per pooled connection and
+# reused by every later call on that connection.
+COLUMNS_SQL = (
+    "SELECT column_name, data_type FROM information_schema.columns "
+    "WHERE table_name = %s AND table_schema = current_schema() ORDER BY ordinal_position"
+)
+LATEST_ROWS_SQL = "SELECT id, time FROM aqi_data ORDER BY time DESC LIMIT %s"
+MAX_TIME_SQL = "SELECT max(time) FROM aqi_data"
+MIN_TIME_SQL = "SELECT min(time) FROM aqi_data"
+COUNT_BETWEEN_SQL = "SELECT count(*) FROM aqi_data WHERE time >= %s AND time < %s"
+
+_pool = None
+
+
+def conninfo():
+    return make_conninfo(
+        dbname=DB_NAME, user=DB_USER, password=DB_PASSWORD, host=DB_HOST, port=DB_PORT
+    )
+
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        _pool = ConnectionPool(
+            conninfo(),
+            min_size=POOL_MIN_SIZE,
+            max_size=POOL_MAX_SIZE,
+            timeout=POOL_TIMEOUT,
+            open=True,
+        )
+        atexit.register(close_pool)
+    return _pool
+
+
+def close_pool():
+    global _pool
+    if _pool is not None:
+        _pool.close()
+        _pool = None
+
+
+@contextmanager
+def connection():
+    # Commits on clean exit, rolls back on error, then returns the connection to the pool
+    with get_pool().connection() as conn:
+        yield conn
+
+
+def fetch_all(sql, params=None, prepare=True):
+    with connection() as conn:
+        return conn.execute(sql, params, prepare=prepare).fetchall()
+
+
+def fetch_df(sql, params=None, prepare=True):
+    with connection() as conn:
+        cur = conn.execute(sql, params, prepare=prepare)
+        columns = [d.name for d in cur.description]
+        return pd.DataFrame(cur.fetchall(), columns=columns)
+
+
+# -----------------------------
+# Hot queries
+# -----------------------------
+@lru_cache(maxsize=None)
+def table_columns(table):
+    # information_schema is slow to query; the DDL only changes on migrations,
+    # so one lookup per process is enough (see invalidate_schema_cache)
+    return tuple(fetch_all(COLUMNS_SQL, (table,)))
+
+
+def invalidate_schema_cache():
+    table_columns.cache_clear()
+
+
+def latest_rows(limit):
+    return fetch_df(LATEST_ROWS_SQL, (limit,))
+
+
+def max_time():
+    return fetch_all(MAX_TIME_SQL)[0][0]
+
+
+def min_time():
+    return fetch_all(MIN_TIME_SQL)[0][0]
+
+
+def count_rows_between(start, end):
+    return fetch_all(COUNT_BETWEEN_SQL, (start, end))[0][0]
@@ -0,0 +1,37 @@
+# feature_defs.py
+# Single definition of the model's input features, shared by training
+# (scripts/train.py) and serving (app.py) so both build identical vectors.
+import pandas as pd
+
+FEATURE_VIEW = "aqi_features"
+ENTITY_KEY = "id"
+TARGET = "AQI"
+# 1 on hours whose AQI was computed from filled pm2_5/pm10 (GAP_FILL=grid);
+# those targets are synthetic and are left out of training and scoring
+TARGET_IMPUTED = "aqi_imputed"
+
+FEATURES = [
+    "pm10", "pm2_5", "carbon_monoxide", "nitrogen_dioxide", "sulphur_dioxide",
+    "ozone", "temperature_2m", "relative_humidity_2m", "wind_speed_10m",
+    "pressure_msl", "precipitation", "cloudcover", "month", "log_pm10",
+    "log_pm2_5", "log_carbon_monoxide", "log_nitrogen_dioxide", "log_sulphur_dioxide",
+    "log_wind_speed_10m", "log_cloudcover", "hour", "day",
+    "aqi_change_rate", "aqi_rolling_mean_3hr", "aqi_rolling_mean_6hr",
+    "pm2_5_rolling_mean_3hr", "pm10_rolling_mean_3hr", "temp_wind", "humidity_pressure",
+    "day_of_week"
+]
+CATEGORICAL = ["day_of_week"]
+
+
+def feature_refs():
+    return [f"{FEATURE_VIEW}:{f}" for f in FEATURES]
+
+
+def encode(df, columns=None):
+    # One-hot the categorical columns; when `columns` (the fitted model's
+    # feature_names_in_) is given, align to it so unseen/missing categories
+    # never change the vector's shape or order
+    df = pd.get_dummies(df, columns=[c for c in CATEGORICAL if c in df.columns])
+    if columns is not None:
+        df = df.reindex(columns=list(columns), fill_value=0)
+    return df
@@ -0,0 +1,119 @@
+# feature_io.py
+# Typed loader for the feature CSV (data/aqi_feature_set_v1.csv). Left to
+# inference, read_csv turns every column into float64/int64 and both `time`
+# and `day_of_week` into Python string objects. Here each column gets an
+# explicit dtype instead:
+#
+#   time            datetime64
+#   day_of_week     category (Monday..Sunday, fixed order)
+#   month/day/hour  int8
+#   AQI             float64 (training target, kept exact)
+#   everything else float32
+#
+# Callers project only the columns they use (`columns=`). With pyarrow
+# installed the CSV is parsed straight into those types by pyarrow.csv
+# (multi-threaded, no float64 intermediate); note that pandas' own
+# engine="pyarrow" parses to float64 first and casts afterwards, which
+# peaks higher than inference. Without pyarrow, the C engine gets the same
+# dtype mapping.
+#
+#   df = load_features(columns=["time", "AQI"])
+#   df = load_features(columns=FEATURES + ["time"], lowercase=True)
+import os
+
+import numpy as np
+import pandas as pd
+
+from feature_defs import FEATURES, TARGET, TARGET_IMPUTED
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+CSV_PATH = os.path.join(BASE_DIR, "data", "aqi_feature_set_v1.csv")
+
+TIME_COLUMN = "time"
+WEEKDAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+# Keyed by lower-case name; the CSV mixes cases (AQI, AQI_change_rate, ...)
+DTYPES = {
+    "day_of_week": pd.CategoricalDtype(WEEKDAYS),
+    "month": np.int8,
+    "day": np.int8,
+    "hour": np.int8,
+    "aqi": np.float64,
+}
+DEFAULT_DTYPE = np.float32
+
+
+def _arrow_type(pa, dtype):
+    if isinstance(dtype, pd.CategoricalDtype):
+        return pa.dictionary(pa.int32(), pa.string())  # the only dictionary CSV type pyarrow parses
+    return pa.from_numpy_dtype(dtype)
+
+
+def _read_arrow(path, header, dtypes):
+    import pyarrow as pa
+    from pyarrow import csv
+
+    column_types = {c: _arrow_type(pa, dtype) for c, dtype in dtypes.items()}
+    if TIME_COLUMN in header:
+        column_types[TIME_COLUMN] = pa.timestamp("ns")
+    table = csv.read_csv(path, convert_options=csv.ConvertOptions(
+        column_types=column_types, include_columns=header,
+    ))
+    # A null in an int8 column comes back as float64 with NaN rather than failing
+    df = table.to_pandas(self_destruct=True)
+    for c, dtype in dtypes.items():
+        if isinstance(dtype, pd.CategoricalDtype):
+            df[c] = df[c].cat.set_categories(dtype.categories)  # fixed Monday..Sunday order
+    return df
+
+
+def schema(header):
+    # read_csv dtype mapping for the given CSV header; columns outside the
+    # feature set (e.g. station/city in other extracts) are left to inference
+    known = set(FEATURES) | {TARGET.lower()}
+    return {c: DTYPES.get(c.lower(), DEFAULT_DTYPE) for c in header if c.lower() in known}
+
+
+def load_features(path=CSV_PATH, columns=None, lowercase=False):
+    # `columns` may use either case; all requested columns must exist
+    header = list(pd.read_csv(path, nrows=0).columns)
+    if columns is not None:
+        by_lower = {c.lower(): c for c in header}
+        missing = [c for c in columns if c.lower() not in by_lower]
+        if missing:
+            raise KeyError(f"Columns {missing} not found in {path}. Please check your dataset.")
+        wanted = {by_lower[c.lower()] for c in columns}
+        header = [c for c in header if c in wanted]  # file order, like usecols
+
+    dtypes = schema(header)
+    try:
+        df = _read_arrow(path, header, dtypes)
+    except ImportError:
+        df = pd.read_csv(
+            path,
+            usecols=header,
+            dtype=dtypes,
+            parse_dates=[TIME_COLUMN] if TIME_COLUMN in header else None,
+        )
+    if lowercase:
+        df.columns = [c.lower() for c in df.columns]
+    return df
+
+
+def entity_ids(times):
+    # aqi_data ids for rows with these timestamps: 1..N in time order, as
+    # data_to_postgres.py inserts them (equal times keep file order). In the
+    # order of `times`, so for the time-ordered feature CSV simply 1..N.
+    order = np.argsort(pd.to_datetime(times).to_numpy(), kind="stable")
+    ids = np.empty(len(order), dtype=np.int64)
+    ids[order] = np.arange(1, len(order) + 1)
+    return ids
+
+
+def target_observed(path=CSV_PATH):
+    # Per CSV row: True where AQI comes from observed readings. Files cleaned
+    # without GAP_FILL=grid (or rows from before it) have no flag: all True.
+    header = list(pd.read_csv(path, nrows=0).columns)
+    if TARGET_IMPUTED not in header:
+        return np.ones(len(load_features(path, columns=[TIME_COLUMN])), dtype=bool)
+    flags = load_features(path, columns=[TARGET_IMPUTED])[TARGET_IMPUTED]
+    return pd.to_numeric(flags, errors="coerce").fillna(0).to_numpy() == 0
@@ -0,0 +1,113 @@
+# feature_schema.py
+# Persisted column schema for the aqi_data FeatureView. The schema lives in
+# aqi_feature_store/feature_repo/aqi_schema.json so loading the Feast repo
+# (feast apply, FeatureStore(...), CI retries) never touches Postgres. It is
+# rewritten only when the table DDL hash changes.
+#
+# Usage:
+#   python scripts/feature_schema.py refresh   # rewrite the file if the DDL changed
+#   python scripts/feature_schema.py check     # exit 1 if the file drifted from the table
+import hashlib
+import json
+import os
+import sys
+from datetime import datetime, timezone
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+SCHEMA_PATH = os.path.join(BASE_DIR, "aqi_feature_store", "feature_repo", "aqi_schema.json")
+SCHEMA_VERSION = 1
+TABLE = "aqi_data"
+
+
+class SchemaDriftError(RuntimeError):
+    pass
+
+
+def ddl_hash(columns):
+    # Order-sensitive hash over (column_name, data_type) pairs
+    payload = json.dumps([[name, dtype] for name, dtype in columns])
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def load_schema(path=SCHEMA_PATH):
+    if not os.path.exists(path):
+        raise FileNotFoundError(
+            f"⚠️ Feature schema not found at {path}. "
+            f"Run `python scripts/feature_schema.py refresh` against the database first."
+        )
+    with open(path) as f:
+        schema = json.load(f)
+    if schema.get("version") != SCHEMA_VERSION:
+        raise SchemaDriftError(
+            f"❌ {path} has schema version {schema.get('version')}, expected {SCHEMA_VERSION}. "
+            f"Run `python scripts/feature_schema.py refresh`."
+        )
+    return schema
+
+
+def load_columns(path=SCHEMA_PATH):
+    return [(col["name"], col["type"]) for col in load_schema(path)["columns"]]
+
+
+def save_schema(columns, path=SCHEMA_PATH):
+    schema = {
+        "version": SCHEMA_VERSION,
+        "table": TABLE,
+        "ddl_hash": ddl_hash(columns),
+        "generated_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "columns": [{"name": name, "type": dtype} for name, dtype in columns],
+    }
+    with open(path, "w") as f:
+        json.dump(schema, f, indent=2)
+        f.write("\n")
+    return schema
+
+
+def live_columns():
+    import db
+
+    return list(db.table_columns(TABLE))
+
+
+def refresh(path=SCHEMA_PATH):
+    # Returns True when the file was rewritten
+    columns = live_columns()
+    if not columns:
+        raise SchemaDriftError(f"❌ Table {TABLE} has no columns (does it exist yet?)")
+    current = ddl_hash(columns)
+    if os.path.exists(path):
+        try:
+            if load_schema(path)["ddl_hash"] == current:
+                return False
+        except SchemaDriftError:
+            pass
+    save_schema(columns, path)
+    return True
+
+
+def check(path=SCHEMA_PATH):
+    stored = load_schema(path)["ddl_hash"]
+    current = ddl_hash(live_columns())
+    if stored != current:
+        raise SchemaDriftError(
+            f"❌ {TABLE} DDL changed since {path} was generated "
+            f"(stored {stored[:12]}, live {current[:12]}). "
+            f"Run `python scripts/feature_schema.py refresh` and re-apply the Feast repo."
+        )
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "check"
+    if command == "refresh":
+        changed = refresh()
+        print(f"✅ Schema {'rewritten' if changed else 'unchanged'}: {SCHEMA_PATH}")
+    elif command == "check":
+        try:
+            check()
+        except SchemaDriftError as e:
+            print(e)
+            sys.exit(1)
+        print(f"✅ Schema in sync with {TABLE}: {SCHEMA_PATH}")
+    else:
+        print(f"Unknown command '{command}' (expected 'refresh' or 'check')")
+        sys.exit(2)
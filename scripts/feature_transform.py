@@ -0,0 +1,164 @@
+# feature_transform.py
+# The model's input pipeline, fitted by train.py and saved with the model (as
+# `feature_transformer_` on the pickle, and in the ONNX metadata), so serving
+# builds exactly the columns the model was trained on. transform() makes the
+# float matrix in one vectorized pass, for a training frame or a single row:
+#
+#   numeric   the FEATURES readings and derived features, in order
+#   cyclical  sin/cos of hour-of-day and month, instead of the raw numbers
+#             (23h sits next to 0h, December next to January)
+#   weekday   one-hot day_of_week over a fixed Monday..Sunday order; strings
+#             or the loader's categorical, unknown days give all zeros
+#   lags      AQI 1, 2, 3 and 24 hours before each row, from a history of
+#             (time, aqi): the latest reading at most LAG_TOLERANCE older
+#             than that hour, else the history median fitted with the model
+#
+#   transformer = FeatureTransformer().fit(history)
+#   X = transformer.transform(features_df, history)   # features_df: FEATURES + time
+#
+# fit() only sees the training rows' history (the median must not come from
+# test rows). Cross-validation builds the matrix once with lag_fill=np.nan and
+# fills each fold with fill_lags(X, lag_median(training AQI)).
+#
+# Models trained before this (no `feature_transformer_`) keep the one-hot
+# encoding of feature_defs.encode; model_input() picks the right one.
+import numpy as np
+import pandas as pd
+
+from feature_defs import CATEGORICAL, FEATURES, TARGET, encode
+from feature_io import WEEKDAYS
+
+TIME_KEY = "time"
+LAG_SOURCE = TARGET.lower()
+LAGS = (1, 2, 3, 24)
+LAG_TOLERANCE = pd.Timedelta(hours=1)
+CYCLICAL = {"hour": 24, "month": 12}
+
+
+def lag_median(values):
+    # The fill fit() learns: median of the non-missing AQI values
+    values = pd.to_numeric(pd.Series(np.asarray(values).ravel()), errors="coerce").to_numpy(dtype=float)
+    values = values[~np.isnan(values)]
+    return float(np.median(values)) if len(values) else 0.0
+
+
+def fill_lags(X, fill, lags=LAGS):
+    # X built with lag_fill=np.nan (lag columns last): missing lags take
+    # `fill`. Copies only when something is missing (X may be a memmap view).
+    at = X.shape[1] - len(lags)
+    missing = np.isnan(X[:, at:])
+    if not missing.any():
+        return X
+    X = np.array(X)
+    X[:, at:][missing] = fill
+    return X
+
+
+def _times(values):
+    # Naive datetime64[ns] (Feast hands back tz-aware UTC)
+    times = pd.DatetimeIndex(pd.to_datetime(values))
+    if times.tz is not None:
+        times = times.tz_convert(None)
+    return times.as_unit("ns").to_numpy()
+
+
+class FeatureTransformer:
+    def __init__(self, lags=LAGS, lag_source=LAG_SOURCE, time_key=TIME_KEY):
+        self.numeric = [c for c in FEATURES if c not in CATEGORICAL and c not in CYCLICAL]
+        self.lags = [int(k) for k in lags]
+        self.lag_source = lag_source
+        self.time_key = time_key
+        self.lag_fill_ = None
+
+    @property
+    def feature_names_out_(self):
+        return (
+            self.numeric
+            + [f"{c}_{fn}" for c in CYCLICAL for fn in ("sin", "cos")]
+            + [f"day_of_week_{d}" for d in WEEKDAYS]
+            + [f"{self.lag_source}_lag_{k}h" for k in self.lags]
+        )
+
+    @property
+    def needs_history(self):
+        return bool(self.lags)
+
+    def fit(self, history):
+        # history: frame with time_key and lag_source over the training span
+        self.lag_fill_ = lag_median(history[self.lag_source])
+        return self
+
+    def transform(self, df, history=None, lag_fill=None):
+        # lag_fill overrides the fitted fill (np.nan leaves missing lags open)
+        if lag_fill is None and self.lag_fill_ is None:
+            raise RuntimeError("❌ FeatureTransformer.transform() before fit()")
+        n = len(df)
+        X = np.empty((n, len(self.feature_names_out_)))
+        at = len(self.numeric)
+        X[:, :at] = df[self.numeric].to_numpy(dtype=float)
+
+        for col, period in CYCLICAL.items():
+            # month is 1..12, hour 0..23: both start the cycle at angle 0
+            angle = 2 * np.pi * (df[col].to_numpy(dtype=float) - (col == "month")) / period
+            X[:, at], X[:, at + 1] = np.sin(angle), np.cos(angle)
+            at += 2
+
+        codes = pd.Categorical(df["day_of_week"], categories=WEEKDAYS).codes
+        X[:, at: at + len(WEEKDAYS)] = codes[:, None] == np.arange(len(WEEKDAYS))
+        at += len(WEEKDAYS)
+
+        if self.lags:
+            X[:, at:] = self._lags(df[self.time_key], history, self.lag_fill_ if lag_fill is None else lag_fill)
+        return X
+
+    def _lags(self, times, history, fill):
+        n = len(times)
+        if history is None or not len(history):
+            return np.full((n, len(self.lags)), fill)
+        history = history[[self.time_key, self.lag_source]].dropna()
+        seen = _times(history[self.time_key])
+        values = history[self.lag_source].to_numpy(dtype=float)
+        order = np.argsort(seen, kind="stable")
+        seen, values = seen[order], values[order]
+
+        at = _times(times)
+        out = np.empty((n, len(self.lags)))
+        tolerance = LAG_TOLERANCE.to_timedelta64()
+        for j, k in enumerate(self.lags):
+            wanted = at - np.timedelta64(k, "h")
+            i = np.searchsorted(seen, wanted, side="right") - 1
+            found = (i >= 0) & (wanted - seen[np.maximum(i, 0)] <= tolerance)
+            out[:, j] = np.where(found, values[np.maximum(i, 0)], fill)
+        return out
+
+    # -----------------------------
+    # Persistence (the pickle carries the object; ONNX metadata this dict)
+    # -----------------------------
+    def to_dict(self):
+        return {
+            "lags": self.lags,
+            "lag_source": self.lag_source,
+            "time_key": self.time_key,
+            "lag_fill": self.lag_fill_,
+            "feature_names": self.feature_names_out_,
+        }
+
+    @classmethod
+    def from_dict(cls, payload):
+        transformer = cls(payload["lags"], payload["lag_source"], payload["time_key"])
+        transformer.lag_fill_ = payload["lag_fill"]
+        if transformer.feature_names_out_ != payload["feature_names"]:
+            raise ValueError("❌ Saved feature transformer does not match FEATURES in feature_defs.py")
+        return transformer
+
+
+def model_input(model, features_df, history=None, default_columns=None):
+    # Float matrix for `model`: its fitted transformer, or for older models
+    # the one-hot encoding aligned to feature_names_in_ (or default_columns)
+    transformer = getattr(model, "feature_transformer_", None)
+    if transformer is not None:
+        return transformer.transform(features_df, history)
+    columns = getattr(model, "feature_names_in_", None)
+    if columns is None:
+        columns = default_columns
+    return encode(features_df, columns=columns).to_numpy(dtype=float)
@@ -0,0 +1,201 @@
+# gaps.py
+# Missing-hour handling for the raw readings (GAP_FILL=grid in
+# data_clean_feature.py). Rows are put on a complete hourly grid, and every
+# gap is classified by its length, over all columns at once:
+#
+#   short (<= GAP_SHORT_HOURS, observed on both sides)
+#       linear in time between the two observations
+#   long, leading or trailing
+#       hour-of-week profile: the column's mean at that hour of that weekday,
+#       or its overall mean if that slot was never observed
+#
+# Each output row carries `imputed`, a bitmask with bit i set when column i
+# (in the order given to GapFiller) was filled rather than observed.
+#
+# GapFiller is incremental: push() returns the rows whose gaps are settled
+# and holds back the tail of a gap that may still turn out short. Pushing a
+# file chunk by chunk gives exactly what pushing it whole does.
+#
+#   filler = gaps.GapFiller(columns, gaps.Profile.fit(chunks(), columns))
+#   for out in gaps.filled(chunks(), filler): ...
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+
+KEY = "time"
+FREQ = "1h"
+SHORT_GAP_HOURS = int(os.getenv("GAP_SHORT_HOURS", 3))
+FLAG_COLUMN = "imputed"
+_SLOTS = 7 * 24
+
+
+def hour_of_week(times):
+    times = pd.DatetimeIndex(times)
+    return np.asarray(times.dayofweek * 24 + times.hour, dtype=np.int64)
+
+
+# -----------------------------
+# Hour-of-week profile
+# -----------------------------
+class Profile:
+    # Per column: sum and count of observed values per hour-of-week slot
+    def __init__(self, columns):
+        self.columns = list(columns)
+        self.sums = np.zeros((_SLOTS, len(self.columns)))
+        self.counts = np.zeros((_SLOTS, len(self.columns)), dtype=np.int64)
+
+    @classmethod
+    def fit(cls, chunks, columns, key=KEY):
+        profile = cls(columns)
+        for chunk in chunks:
+            profile.update(chunk, key)
+        return profile
+
+    def update(self, df, key=KEY):
+        values = df[self.columns].to_numpy(dtype=float)
+        seen = ~np.isnan(values)
+        k = len(self.columns)
+        # One flat bincount over (slot, column) cells
+        cell = (hour_of_week(df[key])[:, None] * k + np.arange(k)[None, :])[seen]
+        self.sums += np.bincount(cell, weights=values[seen], minlength=_SLOTS * k).reshape(_SLOTS, k)
+        self.counts += np.bincount(cell, minlength=_SLOTS * k).reshape(_SLOTS, k)
+        return self
+
+    def table(self):
+        # (hour-of-week x columns) fill values; NaN where a column was never seen
+        with np.errstate(invalid="ignore", divide="ignore"):
+            by_slot = self.sums / self.counts
+            overall = self.sums.sum(axis=0) / self.counts.sum(axis=0)
+        return np.where(self.counts > 0, by_slot, overall[None, :])
+
+
+# -----------------------------
+# Gap filling
+# -----------------------------
+class GapFiller:
+    def __init__(self, columns, profile, short_hours=SHORT_GAP_HOURS, key=KEY, freq=FREQ):
+        self.columns = list(columns)
+        self.profile = profile
+        self.short_hours = short_hours
+        self.key = key
+        self.step = pd.Timedelta(freq).to_timedelta64()
+        self.held = None  # grid rows not settled yet
+        self.last_time = None  # newest grid time pushed
+        # Last observation before the held rows, per column (NaT/NaN: none yet)
+        self.anchor_time = np.full(len(self.columns), np.datetime64("NaT"), dtype="datetime64[ns]")
+        self.anchor_value = np.full(len(self.columns), np.nan)
+        self.report = {"rows_inserted": 0, "duplicates": 0, "short_cells": 0, "long_cells": 0, "unfilled_cells": 0}
+
+    def _on_grid(self, chunk):
+        # Reindex onto the hourly grid, continuing from the previous chunk;
+        # a repeated timestamp keeps its first row
+        chunk = chunk.assign(**{self.key: pd.to_datetime(chunk[self.key]).dt.floor(FREQ)})
+        if self.last_time is not None:
+            chunk = chunk[chunk[self.key] > self.last_time]
+        before = len(chunk)
+        chunk = chunk.drop_duplicates(self.key, keep="first")
+        self.report["duplicates"] += before - len(chunk)
+        if chunk.empty:
+            return chunk
+        start = chunk[self.key].iloc[0] if self.last_time is None else self.last_time + self.step
+        grid = pd.date_range(start, chunk[self.key].iloc[-1], freq=FREQ, name=self.key)
+        self.report["rows_inserted"] += len(grid) - len(chunk)
+        self.last_time = grid[-1]
+        return chunk.set_index(self.key).reindex(grid).reset_index()
+
+    def push(self, chunk):
+        grid = self._on_grid(chunk)
+        df = grid if self.held is None else pd.concat([self.held, grid], ignore_index=True)
+        if df.empty:
+            return df
+        times = df[self.key].to_numpy(dtype="datetime64[ns]")
+        seen = ~np.isnan(df[self.columns].to_numpy(dtype=float))
+
+        # Rows after a column's last observation wait for the next one unless
+        # the gap is already too long to be short (or has no left side)
+        rows = np.arange(len(df))[:, None]
+        last_seen = np.where(seen, rows, -1).max(axis=0)
+        prev_time = np.where(last_seen >= 0, times[np.maximum(last_seen, 0)], self.anchor_time)
+        with np.errstate(invalid="ignore"):  # NaT: no observation yet
+            open_hours = (times[-1] - prev_time) // self.step
+        settled = np.isnat(prev_time) | (open_hours > self.short_hours) | (last_seen == len(df) - 1)
+        cut = int(np.where(settled, len(df), last_seen + 1).min())
+        return self._resolve(df, times, cut)
+
+    def flush(self):
+        # End of input: trailing gaps are filled from the profile
+        if self.held is None or self.held.empty:
+            return None
+        times = self.held[self.key].to_numpy(dtype="datetime64[ns]")
+        return self._resolve(self.held, times, len(self.held))
+
+    def _resolve(self, df, times, cut):
+        values = df[self.columns].to_numpy(dtype=float, copy=True)
+        missing = np.isnan(values)
+        n, k = values.shape
+        rows = np.arange(n)[:, None]
+        t = times.view("i8")
+        step = self.step.astype("timedelta64[ns]").astype("i8")
+
+        # Previous / next observation of every cell; before the first row the
+        # anchor (last observation already emitted) stands in
+        prev_at = np.maximum.accumulate(np.where(missing, -1, rows), axis=0)
+        next_at = np.minimum.accumulate(np.where(missing, n, rows)[::-1], axis=0)[::-1]
+
+        # Only the missing cells of the rows being emitted are worked on
+        r, c = np.nonzero(missing[:cut])
+        p, q = prev_at[r, c], next_at[r, c]
+        in_df = p >= 0
+        has_prev = in_df | ~np.isnat(self.anchor_time[c])
+        prev_time = np.where(in_df, t[np.maximum(p, 0)], self.anchor_time.view("i8")[c])
+        prev_value = np.where(in_df, values[np.maximum(p, 0), c], self.anchor_value[c])
+        has_next = q < n
+        next_time = t[np.minimum(q, n - 1)]
+        next_value = values[np.minimum(q, n - 1), c]
+
+        # Classify by gap length: short gaps by time, the rest by profile
+        short = has_prev & has_next & ((next_time - prev_time) // step - 1 <= self.short_hours)
+        fill = self.profile.table()[hour_of_week(times[r]), c]
+        share = (t[r] - prev_time)[short] / (next_time - prev_time)[short]
+        fill[short] = prev_value[short] + share * (next_value - prev_value)[short]
+        values[r, c] = fill
+
+        out = df.iloc[:cut].copy()
+        out[self.columns] = values[:cut]
+        done = ~np.isnan(fill)
+        out[FLAG_COLUMN] = np.bincount(r[done], weights=(1 << c[done]), minlength=cut).astype(np.int64)
+        self.report["short_cells"] += int(short.sum())
+        self.report["long_cells"] += int((~short & done).sum())
+        self.report["unfilled_cells"] += int((~done).sum())
+
+        # The last observation among the emitted rows anchors the next push
+        if cut:
+            last = prev_at[cut - 1]
+            self.anchor_time = np.where(last >= 0, times[np.maximum(last, 0)], self.anchor_time)
+            self.anchor_value = np.where(last >= 0, values[np.maximum(last, 0), np.arange(k)], self.anchor_value)
+        self.held = df.iloc[cut:].reset_index(drop=True)
+        return out
+
+
+def filled(chunks, filler):
+    # Settled rows of `chunks` (time ordered) through `filler`, then the rest
+    for chunk in chunks:
+        out = filler.push(chunk)
+        if len(out):
+            yield out
+    out = filler.flush()
+    if out is not None and len(out):
+        yield out
+
+
+def log_report(report, label="gap fill"):
+    logging.info(
+        f"🩹 {label}: {report['rows_inserted']} missing hours added, {report['short_cells']} cells interpolated, "
+        f"{report['long_cells']} from the hour-of-week profile"
+    )
+    if report["duplicates"]:
+        logging.warning(f"⚠️ {label}: {report['duplicates']} repeated timestamps dropped (first kept)")
+    if report["unfilled_cells"]:
+        logging.warning(f"⚠️ {label}: {report['unfilled_cells']} cells left empty (column never observed)")
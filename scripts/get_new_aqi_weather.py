@@ -1,12 +1,14 @@
 # fetch_incremental_data.py
 import os
-import requests
 import pandas as pd
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
 import logging
 import time
 
+import align
+import pipeline_metrics
+
 # -----------------------------
 # Setup
 # -----------------------------
@@ -15,10 +17,17 @@ API_KEY = os.getenv("API_KEY")  # OpenWeatherMap API key
 LAT = float(os.getenv("LAT", 33.6007))
 LON = float(os.getenv("LON", 73.0679))
 FILE_PATH = "data/realtime_data.csv"
+# A day whose requests keep failing transiently is retried on later runs
+# until it ended this many days ago, then written with blanks so ingestion
+# never stalls behind it
+FETCH_RETRY_DAYS = float(os.getenv("FETCH_RETRY_DAYS", 2))
 os.makedirs("data", exist_ok=True)
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(message)s")
 
+# Rows, bytes, HTTP calls/retries per provider (recorded when run as a script)
+metrics = pipeline_metrics.Stage("fetch")
+
 # -----------------------------
 # Helper: Safe float conversion
 # -----------------------------
@@ -28,45 +37,56 @@ def to_float_safe(val):
     except:
         return None
 
+AQI_COLUMNS = ["pm10", "pm2_5", "carbon_monoxide", "nitrogen_dioxide", "sulphur_dioxide", "ozone"]
+WEATHER_COLUMNS = ["temperature_2m", "relative_humidity_2m", "wind_speed_10m",
+                   "pressure_msl", "precipitation", "cloudcover"]
+
 # -----------------------------
-# Fetch AQI
+# Fetch AQI (one history call per day)
 # -----------------------------
-def fetch_aqi(timestamp):
-    unix_time = int(timestamp.timestamp())
+def no_data(columns):
+    return pd.DataFrame(columns=["time"] + columns)
+
+
+def fetch_aqi_day(start, end):
+    # Hourly components for [start, end], both on the hour and on the same day.
+    # None when the request failed transiently (network error, 429/5xx after
+    # http_get's retries, unreadable body); a refused request (other 4xx) is
+    # an empty frame, like a day without data, as retrying will not change it
     url = (
         f"http://api.openweathermap.org/data/2.5/air_pollution/history?"
-        f"lat={LAT}&lon={LON}&start={unix_time}&end={unix_time+3600}&appid={API_KEY}"
+        f"lat={LAT}&lon={LON}&start={int(start.timestamp())}&end={int(end.timestamp()) + 3600}&appid={API_KEY}"
     )
+    rows = []
     try:
-        r = requests.get(url, timeout=20)
-        if r.status_code == 200:
-            data = r.json().get("list", [])
-            if data:
-                c = data[0]["components"]
-                return {
-                    "time": timestamp.strftime("%Y-%m-%d %H:%M:%S"),
-                    "pm10": to_float_safe(c.get("pm10")),
-                    "pm2_5": to_float_safe(c.get("pm2_5")),
-                    "carbon_monoxide": to_float_safe(c.get("co")),
-                    "nitrogen_dioxide": to_float_safe(c.get("no2")),
-                    "sulphur_dioxide": to_float_safe(c.get("so2")),
-                    "ozone": to_float_safe(c.get("o3")),
-                }
+        r = pipeline_metrics.http_get(metrics, "openweathermap", url, timeout=20)
+        if r.status_code in pipeline_metrics.TRANSIENT_STATUS:
+            raise RuntimeError(f"HTTP {r.status_code}")
+        if r.status_code != 200:
+            logging.warning(f"⚠️ AQI request for {start.date()} refused (HTTP {r.status_code}); no data for it")
+            return no_data(AQI_COLUMNS)
+        for item in r.json().get("list", []):
+            c = item["components"]
+            rows.append({
+                "time": datetime.fromtimestamp(item["dt"]).replace(minute=0, second=0),
+                "pm10": to_float_safe(c.get("pm10")),
+                "pm2_5": to_float_safe(c.get("pm2_5")),
+                "carbon_monoxide": to_float_safe(c.get("co")),
+                "nitrogen_dioxide": to_float_safe(c.get("no2")),
+                "sulphur_dioxide": to_float_safe(c.get("so2")),
+                "ozone": to_float_safe(c.get("o3")),
+            })
     except Exception as e:
-        logging.warning(f"⚠️ AQI fetch error at {timestamp}: {e}")
-
-    # If failed, return empty row
-    return {
-        "time": timestamp.strftime("%Y-%m-%d %H:%M:%S"),
-        "pm10": None, "pm2_5": None, "carbon_monoxide": None,
-        "nitrogen_dioxide": None, "sulphur_dioxide": None, "ozone": None,
-    }
+        logging.warning(f"⚠️ AQI fetch error for {start.date()}: {e}")
+        return None
+    return pd.DataFrame(rows, columns=["time"] + AQI_COLUMNS)
 
 # -----------------------------
-# Fetch Weather
+# Fetch Weather (one archive call per day)
 # -----------------------------
-def fetch_weather(timestamp):
-    date_str = timestamp.strftime("%Y-%m-%d")
+def fetch_weather_day(start, end):
+    # Same contract as fetch_aqi_day
+    date_str = start.strftime("%Y-%m-%d")
     url = (
         f"https://archive-api.open-meteo.com/v1/archive?"
         f"latitude={LAT}&longitude={LON}"
@@ -76,41 +96,79 @@ def fetch_weather(timestamp):
         f"&timezone=auto"
     )
     try:
-        w = requests.get(url, timeout=30).json()
-        if "hourly" in w:
-            times = w["hourly"]["time"]
-            hour_index = next(
-                (i for i, t in enumerate(times) if t.startswith(timestamp.strftime("%Y-%m-%dT%H"))),
-                None
-            )
-            if hour_index is not None:
-                return {
-                    "time": timestamp.strftime("%Y-%m-%d %H:%M:%S"),
-                    "temperature_2m": to_float_safe(w["hourly"]["temperature_2m"][hour_index]),
-                    "relative_humidity_2m": to_float_safe(w["hourly"]["relative_humidity_2m"][hour_index]),
-                    "wind_speed_10m": to_float_safe(w["hourly"]["wind_speed_10m"][hour_index]),
-                    "pressure_msl": to_float_safe(w["hourly"]["pressure_msl"][hour_index]),
-                    "precipitation": to_float_safe(w["hourly"]["precipitation"][hour_index]),
-                    "cloudcover": to_float_safe(w["hourly"]["cloudcover"][hour_index]),
-                }
+        r = pipeline_metrics.http_get(metrics, "open_meteo", url, timeout=30)
+        if r.status_code in pipeline_metrics.TRANSIENT_STATUS:
+            raise RuntimeError(f"HTTP {r.status_code}")
+        w = r.json()
+        if r.status_code != 200 or "hourly" not in w:
+            reason = w.get("reason", "no hourly data in response")
+            logging.warning(f"⚠️ Weather request for {date_str} refused (HTTP {r.status_code}: {reason}); no data for it")
+            return no_data(WEATHER_COLUMNS)
+        hourly = w["hourly"]
+        df = pd.DataFrame({"time": pd.to_datetime(hourly["time"]).floor("h")})
+        for col in WEATHER_COLUMNS:
+            df[col] = [to_float_safe(v) for v in hourly[col]]
+        return df[(df["time"] >= start) & (df["time"] <= end)]
     except Exception as e:
-        logging.warning(f"⚠️ Weather fetch error at {timestamp}: {e}")
-
-    return {
-        "time": timestamp.strftime("%Y-%m-%d %H:%M:%S"),
-        "temperature_2m": None, "relative_humidity_2m": None,
-        "wind_speed_10m": None, "pressure_msl": None,
-        "precipitation": None, "cloudcover": None
-    }
+        logging.warning(f"⚠️ Weather fetch error for {date_str}: {e}")
+        return None
 
 # -----------------------------
-# Merge AQI & Weather
+# Fetch + align a window of hours
 # -----------------------------
-def merge_and_add_features(aqi_data, weather_data):
-    merged = {**aqi_data, **{k:v for k,v in weather_data.items() if k!="time"}}
-    timestamp = datetime.strptime(aqi_data["time"], "%Y-%m-%d %H:%M:%S")
-    merged["day_of_week"] = timestamp.strftime("%A")
-    merged["month"] = timestamp.strftime("%B")
+def day_windows(start, end):
+    day = start
+    while day <= end:
+        day_end = min(end, day.replace(hour=23, minute=0, second=0, microsecond=0))
+        yield day, day_end
+        day = day_end + timedelta(hours=1)
+
+
+def fetch_window(start, end, now=None):
+    # Both series come back in time order, so they are aligned with a sorted
+    # merge; every hour up to the last fully fetched day gets a row, blank
+    # where a source had nothing for it. A transient failure ends the window
+    # before its day, so the next run fetches that day again instead of it
+    # being written as blanks, until the day is FETCH_RETRY_DAYS old.
+    now = now or datetime.now()
+    aqi_parts, weather_parts = [], []
+    fetched_end = None
+    for day_start, day_end in day_windows(start, end):
+        stale = now - day_end >= timedelta(days=FETCH_RETRY_DAYS)
+        aqi_day = fetch_aqi_day(day_start, day_end)
+        weather_day = fetch_weather_day(day_start, day_end) if aqi_day is not None or stale else None
+        if aqi_day is None or weather_day is None:
+            if not stale:
+                logging.warning(f"⚠️ Stopping before {day_start}; the next run retries from there")
+                break
+            logging.warning(f"⚠️ {day_start.date()} still failing after {FETCH_RETRY_DAYS:g} days; writing what was fetched")
+            aqi_day = no_data(AQI_COLUMNS) if aqi_day is None else aqi_day
+            weather_day = no_data(WEATHER_COLUMNS) if weather_day is None else weather_day
+        aqi_parts.append(aqi_day)
+        weather_parts.append(weather_day)
+        fetched_end = day_end
+        logging.info(f"Fetched data for {day_start} .. {day_end}")
+        time.sleep(1)  # avoid hitting API too fast
+    if fetched_end is None:
+        return pd.DataFrame()
+    # Days without data add nothing but a dtype-less empty frame; leave them out
+    aqi_parts = [p for p in aqi_parts if len(p)] or [no_data(AQI_COLUMNS)]
+    weather_parts = [p for p in weather_parts if len(p)] or [no_data(WEATHER_COLUMNS)]
+    aqi = pd.concat(aqi_parts, ignore_index=True).astype({c: float for c in AQI_COLUMNS})
+    weather = pd.concat(weather_parts, ignore_index=True).astype({c: float for c in WEATHER_COLUMNS})
+    aqi["time"] = pd.to_datetime(aqi["time"])
+    weather["time"] = pd.to_datetime(weather["time"])
+
+    merged, report = align.outer_join(aqi, weather, keep="last")
+    align.log_report(report, "AQI x weather")
+    merged = align.to_grid(merged, start, fetched_end)
+    missing = int(merged[AQI_COLUMNS + WEATHER_COLUMNS].isna().all(axis=1).sum())
+    if missing:
+        logging.warning(f"⚠️ {missing} of {len(merged)} hours have no data from either source")
+
+    merged["day_of_week"] = merged["time"].dt.strftime("%A")
+    merged["month"] = merged["time"].dt.strftime("%B")
+    merged["time"] = merged["time"].dt.strftime("%Y-%m-%d %H:%M:%S")
     return merged
 
 # -----------------------------
@@ -119,7 +177,8 @@ def merge_and_add_features(aqi_data, weather_data):
 def fetch_incremental_data():
     # Read last timestamp
     if os.path.exists(FILE_PATH):
-        df_existing = pd.read_csv(FILE_PATH)
+        df_existing = pd.read_csv(FILE_PATH, usecols=["time"])
+        metrics.read(FILE_PATH)
         df_existing['time'] = pd.to_datetime(df_existing['time'])
         last_time = df_existing['time'].max()
     else:
@@ -127,23 +186,18 @@ def fetch_incremental_data():
         last_time = datetime.strptime("2025-10-12 01:00", "%Y-%m-%d %H:%M")
 
     logging.info(f"Last timestamp: {last_time}")
-    current_time = last_time + timedelta(hours=1)
+    current_time = pd.Timestamp(last_time).floor("h").to_pydatetime() + timedelta(hours=1)
     end_time = datetime.now()
-    new_rows = []
-
-    while current_time <= end_time:
-        aqi_data = fetch_aqi(current_time)
-        weather_data = fetch_weather(current_time)
-        merged = merge_and_add_features(aqi_data, weather_data)
-        new_rows.append(merged)
-        logging.info(f"Fetched data for {current_time}")
-        current_time += timedelta(hours=1)
-        time.sleep(1)  # avoid hitting API too fast
 
-    if new_rows:
-        df_new = pd.DataFrame(new_rows)
+    if current_time <= end_time:
+        df_new = fetch_window(current_time, end_time.replace(minute=0, second=0, microsecond=0))
+        if df_new.empty:
+            logging.info("No new data fetched.")
+            return df_new
         # Append to CSV
+        size_before = os.path.getsize(FILE_PATH) if os.path.exists(FILE_PATH) else 0
         df_new.to_csv(FILE_PATH, mode="a", header=not os.path.exists(FILE_PATH), index=False)
+        metrics.wrote(FILE_PATH, rows=len(df_new), bytes_before=size_before)
         logging.info(f"✅ Saved {len(df_new)} new rows to {FILE_PATH}")
         return df_new
     else:
@@ -154,4 +208,5 @@ def fetch_incremental_data():
 # Main
 # -----------------------------
 if __name__ == "__main__":
-    fetch_incremental_data()
+    with metrics:
+        fetch_incremental_data()
@@ -0,0 +1,93 @@
+# intervals.py
+# Prediction intervals for /forecast, replacing the random jitter that used
+# to separate the three horizons.
+#
+# Conformal (preferred): train.py scores the held-out tail of history and
+# stores, for each horizon h, the p10/p50/p90 of AQI(t + h) - prediction(t)
+# on the model itself (`forecast_residuals_`, also carried in ONNX metadata).
+# Serving is then one prediction plus a (horizons x quantiles) offset add.
+#
+# Forest spread (fallback for models trained before residuals were stored):
+# per-tree predictions in one pass from the forest's leaf indices, gathered
+# out of a (trees x nodes) leaf-value table built once per model.
+import weakref
+
+import numpy as np
+import pandas as pd
+
+QUANTILES = (0.1, 0.5, 0.9)
+HORIZON_HOURS = (24, 48, 72)
+
+_leaf_tables = weakref.WeakKeyDictionary()
+
+
+# -----------------------------
+# Conformal residuals (training time)
+# -----------------------------
+def horizon_residuals(timestamps, y_true, y_pred, horizons=HORIZON_HOURS, quantiles=QUANTILES):
+    # {horizon_hours: [q10, q50, q90]} of actual(t + h) - predicted(t). Rows
+    # whose t + h is not in the frame (gaps, end of history) are skipped.
+    frame = pd.DataFrame({
+        "time": pd.to_datetime(pd.Series(timestamps)).to_numpy(),
+        "actual": np.asarray(y_true, dtype=float),
+        "pred": np.asarray(y_pred, dtype=float),
+    })
+    actual_at = frame.set_index("time")["actual"]
+    actual_at = actual_at[~actual_at.index.duplicated(keep="last")]
+    residuals = {}
+    for h in horizons:
+        future = actual_at.reindex(frame["time"] + pd.Timedelta(hours=h)).to_numpy()
+        err = future - frame["pred"].to_numpy()
+        err = err[np.isfinite(err)]
+        if len(err):
+            residuals[str(h)] = [float(v) for v in np.quantile(err, quantiles)]
+    return residuals
+
+
+# -----------------------------
+# Forest spread (serving fallback)
+# -----------------------------
+def _leaf_table(model):
+    table = _leaf_tables.get(model)
+    if table is None or table.shape[0] != len(model.estimators_):
+        trees = [est.tree_ for est in model.estimators_]
+        table = np.zeros((len(trees), max(t.node_count for t in trees)))
+        for i, t in enumerate(trees):
+            table[i, : t.node_count] = t.value[:, 0, 0]
+        _leaf_tables[model] = table
+    return table
+
+
+def per_tree_predictions(model, X):
+    # (n_rows, n_trees); apply() walks every tree in compiled code
+    if hasattr(model, "per_tree_predictions"):  # shared_store.SharedForest
+        return model.per_tree_predictions(X)
+    leaves = model.apply(X)
+    table = _leaf_table(model)
+    return table[np.arange(table.shape[0]), leaves]
+
+
+# -----------------------------
+# Serving
+# -----------------------------
+def forecast(model, X, horizons=HORIZON_HOURS, quantiles=QUANTILES):
+    # Returns (method, point, {"p10": [...], "p50": [...], "p90": [...]}) for
+    # the first row of X, one quantile entry per horizon
+    residuals = getattr(model, "forecast_residuals_", None) or {}
+    keys = ["p" + str(int(round(q * 100))) for q in quantiles]
+    if all(str(h) in residuals for h in horizons):
+        point = float(model.predict(X)[0])
+        offsets = np.array([residuals[str(h)] for h in horizons])  # (horizons, quantiles)
+        values = point + offsets
+        method = "conformal"
+    elif hasattr(model, "per_tree_predictions") or (hasattr(model, "estimators_") and hasattr(model, "apply")):
+        per_tree = per_tree_predictions(model, X)[0]
+        point = float(per_tree.mean())  # == model.predict for a forest
+        values = np.tile(np.quantile(per_tree, quantiles), (len(horizons), 1))
+        method = "forest"
+    else:
+        point = float(model.predict(X)[0])
+        values = np.full((len(horizons), len(quantiles)), point)
+        method = "point"
+    values = np.sort(values, axis=1)  # quantiles never cross
+    return method, point, {k: [round(float(v), 2) for v in values[:, j]] for j, k in enumerate(keys)}
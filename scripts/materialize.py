@@ -0,0 +1,207 @@
+# materialize.py
+# Incremental Feast materialization driver. Keeps a durable per-FeatureView
+# watermark in Postgres (next to the online store it describes), materializes
+# only the slice after it, and splits large backfills into fixed windows that
+# are materialized in parallel. Worker threads only read the offline store and
+# write the online store; the materialization intervals in Feast's registry
+# (a read-modify-write of one shared object) are recorded afterwards by the
+# driver alone, so concurrent windows cannot overwrite each other's entries.
+#
+# Usage: python scripts/materialize.py [feature_view]
+import logging
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+import db
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(message)s")
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+FEATURE_REPO_PATH = os.path.join(BASE_DIR, "aqi_feature_store", "feature_repo")
+
+WINDOW_HOURS = int(os.getenv("MATERIALIZE_WINDOW_HOURS", 24 * 7))
+WORKERS = int(os.getenv("MATERIALIZE_WORKERS", 4))
+
+WATERMARK_TABLE = "feast_materialization_watermark"
+
+_local = threading.local()
+
+
+# -----------------------------
+# Watermark storage
+# -----------------------------
+def ensure_watermark_table():
+    with db.connection() as conn:
+        conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS {WATERMARK_TABLE} (
+                feature_view TEXT PRIMARY KEY,
+                watermark TIMESTAMPTZ NOT NULL,
+                updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+            );
+        """)
+
+
+def get_watermark(feature_view):
+    rows = db.fetch_all(
+        f"SELECT watermark FROM {WATERMARK_TABLE} WHERE feature_view = %s", (feature_view,)
+    )
+    return rows[0][0] if rows else None
+
+
+def set_watermark(feature_view, watermark):
+    with db.connection() as conn:
+        conn.execute(f"""
+            INSERT INTO {WATERMARK_TABLE} (feature_view, watermark)
+            VALUES (%s, %s)
+            ON CONFLICT (feature_view)
+            DO UPDATE SET watermark = EXCLUDED.watermark, updated_at = now();
+        """, (feature_view, watermark))
+
+
+# -----------------------------
+# Chunking
+# -----------------------------
+def as_utc(ts):
+    if ts.tzinfo is None:
+        return ts.replace(tzinfo=timezone.utc)
+    return ts.astimezone(timezone.utc)
+
+
+def as_naive_utc(ts):
+    # aqi_data.time is a naive TIMESTAMP holding UTC
+    return as_utc(ts).replace(tzinfo=None)
+
+
+def chunk_windows(start, end, window_hours=WINDOW_HOURS):
+    step = timedelta(hours=window_hours)
+    windows = []
+    cur = start
+    while cur < end:
+        windows.append((cur, min(cur + step, end)))
+        cur += step
+    return windows
+
+
+def _thread_store(repo_path):
+    # FeatureStore is not safe to share across threads; one per worker thread
+    from feast import FeatureStore
+
+    if getattr(_local, "store", None) is None:
+        _local.store = FeatureStore(repo_path=repo_path)
+    return _local.store
+
+
+def _materialize_chunk(repo_path, feature_view, start, end):
+    # store.materialize() without its registry update (see record_intervals)
+    store = _thread_store(repo_path)
+    rows = db.count_rows_between(as_naive_utc(start), as_naive_utc(end))
+
+    t0 = time.perf_counter()
+    if rows:
+        from tqdm import tqdm
+
+        store._get_provider().materialize_single_feature_view(
+            config=store.config,
+            feature_view=store.get_feature_view(feature_view),
+            start_date=start,
+            end_date=end,
+            registry=store.registry,
+            project=store.project,
+            tqdm_builder=lambda length: tqdm(total=length, disable=True),
+        )
+    elapsed = time.perf_counter() - t0
+
+    rate = rows / elapsed if elapsed > 0 else 0.0
+    logging.info(
+        f"📦 {feature_view} {start:%Y-%m-%d %H:%M} → {end:%Y-%m-%d %H:%M} | "
+        f"{rows} rows in {elapsed:.2f}s ({rate:,.0f} rows/sec)"
+    )
+    return rows
+
+
+def record_intervals(repo_path, feature_view, windows):
+    # Single writer for the registry: one interval per finished window
+    store = _thread_store(repo_path)
+    view = store.get_feature_view(feature_view)
+    for start, end in windows:
+        store.registry.apply_materialization(view, store.project, start, end)
+
+
+# -----------------------------
+# Driver
+# -----------------------------
+def materialize_incremental(feature_view="aqi_features", repo_path=FEATURE_REPO_PATH,
+                            end_date=None, window_hours=WINDOW_HOURS, workers=WORKERS):
+    ensure_watermark_table()
+    end_date = as_utc(end_date or datetime.now(timezone.utc))
+
+    watermark = get_watermark(feature_view)
+    if watermark is None:
+        earliest = db.min_time()
+        if earliest is None:
+            logging.info(f"ℹ️ aqi_data is empty — nothing to materialize for {feature_view}")
+            return 0
+        watermark = as_utc(earliest)
+    watermark = as_utc(watermark)
+
+    # Never move the watermark past the newest loaded row: an hour that is
+    # fetched late must still land after the watermark on the next run
+    latest = db.max_time()
+    if latest is not None:
+        end_date = min(end_date, as_utc(latest) + timedelta(seconds=1))
+
+    if watermark >= end_date:
+        logging.info(f"ℹ️ {feature_view} already materialized up to {watermark}")
+        return 0
+
+    windows = chunk_windows(watermark, end_date, window_hours)
+    logging.info(
+        f"🚀 Materializing {feature_view} from {watermark} to {end_date} "
+        f"in {len(windows)} window(s) of {window_hours}h with {workers} worker(s)"
+    )
+
+    t0 = time.perf_counter()
+    results = {}
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(windows)))) as pool:
+        futures = {
+            pool.submit(_materialize_chunk, repo_path, feature_view, start, end): (start, end)
+            for start, end in windows
+        }
+        for future, window in futures.items():
+            try:
+                results[window] = future.result()
+            except Exception as e:
+                logging.warning(f"⚠️ Window {window[0]} → {window[1]} failed: {e}")
+
+    finished = [window for window in windows if results.get(window)]
+    if finished:
+        record_intervals(repo_path, feature_view, finished)
+
+    # The registry intervals are informational; the Postgres watermark is the
+    # source of truth. Advance it only across the contiguous run of finished
+    # windows, so a failed chunk is retried on the next run instead of skipped
+    new_watermark = watermark
+    for window in windows:
+        if window not in results:
+            break
+        new_watermark = window[1]
+    if new_watermark > watermark:
+        set_watermark(feature_view, new_watermark)
+
+    total = sum(results.values())
+    elapsed = time.perf_counter() - t0
+    logging.info(
+        f"✅ {feature_view}: {total} rows in {elapsed:.2f}s "
+        f"({total / elapsed if elapsed > 0 else 0:,.0f} rows/sec), watermark → {new_watermark}"
+    )
+    if len(results) < len(windows):
+        raise RuntimeError(f"❌ {len(windows) - len(results)} materialization window(s) failed")
+    return total
+
+
+if __name__ == "__main__":
+    materialize_incremental(sys.argv[1] if len(sys.argv) > 1 else "aqi_features")
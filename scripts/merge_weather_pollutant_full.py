@@ -1,29 +1,96 @@
 import pandas as pd
+import logging
 import os
 
-# ✅ Load both datasets
-aqi = pd.read_csv("data/historical_raw_data.csv")
-weather = pd.read_csv("data/historical_weather_data.csv")
+import align
+import chunked
+import pipeline_metrics
 
-# ✅ Convert to datetime
-aqi["time"] = pd.to_datetime(aqi["time"])
-weather["time"] = pd.to_datetime(weather["time"])
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(message)s")
 
-# ✅ Round both to the hour (ensures alignment)
-aqi["time"] = aqi["time"].dt.floor("H")
-weather["time"] = weather["time"].dt.floor("H")
+AQI_PATH = "data/historical_raw_data.csv"
+WEATHER_PATH = "data/historical_weather_data.csv"
+output_path = "data/full_merged_features.csv"
 
-# ✅ Merge using full outer join (keep *all* timestamps)
-merged = pd.merge(aqi, weather, on="time", how="outer")
+# CLEAN_MODE=stream merges the two (time-ordered) files chunk by chunk with
+# bounded memory instead of loading both; the output is byte-identical
+CLEAN_MODE = os.getenv("CLEAN_MODE", "memory")
+CHUNK_ROWS = int(os.getenv("CLEAN_CHUNK_ROWS", chunked.CHUNK_ROWS))
+TEXT_COLUMNS = {"time", "day_of_week", "month"}
 
-# ✅ Sort by time
-merged = merged.sort_values("time").reset_index(drop=True)
 
-# ✅ Save combined dataset
-os.makedirs("data", exist_ok=True)
-output_path = "data/full_merged_features.csv"
-merged.to_csv(output_path, index=False)
+def read_dtypes(path):
+    # Readings as float64 in every chunk (an all-integer chunk would otherwise
+    # be written without the ".0" the whole-file read produces)
+    header = pd.read_csv(path, nrows=0).columns
+    return {c: "float64" for c in header if c not in TEXT_COLUMNS}
+
+
+def merge(aqi, weather):
+    # ✅ Round both to the hour (ensures alignment)
+    aqi = aqi.assign(time=aqi["time"].dt.floor("h"))
+    weather = weather.assign(time=weather["time"].dt.floor("h"))
+
+    # ✅ Full outer join (keep *all* timestamps) as a sorted merge: both files
+    # are already in time order, so no hash join and no re-sort
+    return align.outer_join(aqi, weather, key="time")
+
+
+def run_in_memory(metrics):
+    # ✅ Load both datasets
+    aqi = pd.read_csv(AQI_PATH, dtype=read_dtypes(AQI_PATH))
+    weather = pd.read_csv(WEATHER_PATH, dtype=read_dtypes(WEATHER_PATH))
+    metrics.read(AQI_PATH, rows=len(aqi))
+    metrics.read(WEATHER_PATH, rows=len(weather))
+
+    # ✅ Convert to datetime
+    aqi["time"] = pd.to_datetime(aqi["time"])
+    weather["time"] = pd.to_datetime(weather["time"])
+
+    merged, report = merge(aqi, weather)
+    merged.to_csv(output_path, index=False, date_format=chunked.TIME_FORMAT)
+    return report
+
+
+def run_streaming(metrics):
+    rows = {"aqi": 0, "weather": 0}
+
+    def counted(name, chunks):
+        for chunk in chunks:
+            rows[name] += len(chunk)
+            chunk["time"] = chunk["time"].dt.floor("h")  # flooring keeps time order
+            yield chunk
+
+    aqi = counted("aqi", chunked.read_chunks(AQI_PATH, CHUNK_ROWS, dtype=read_dtypes(AQI_PATH)))
+    weather = counted("weather", chunked.read_chunks(WEATHER_PATH, CHUNK_ROWS, dtype=read_dtypes(WEATHER_PATH)))
+    reports, last_time = [], None
+    with open(output_path + ".tmp", "w", newline="") as f:
+        for aqi_part, weather_part in chunked.aligned_chunks(aqi, weather):
+            merged, report = merge(aqi_part, weather_part)
+            if last_time is not None and len(merged):
+                # a gap can also fall between two chunks
+                reports.append(align.gap_report([last_time, merged["time"].iloc[0]]))
+            last_time = merged["time"].iloc[-1] if len(merged) else last_time
+            reports.append(report)
+            merged.to_csv(f, index=False, header=f.tell() == 0, date_format=chunked.TIME_FORMAT)
+    os.replace(output_path + ".tmp", output_path)
+    metrics.read(AQI_PATH, rows=rows["aqi"])
+    metrics.read(WEATHER_PATH, rows=rows["weather"])
+    return align.combine(reports)
+
+
+if __name__ == "__main__":
+    with pipeline_metrics.start("merge") as metrics:
+
+        # ✅ Save combined dataset
+        os.makedirs("data", exist_ok=True)
+        report = run_streaming(metrics) if CLEAN_MODE == "stream" else run_in_memory(metrics)
+        align.log_report(report, "AQI x weather")
+        total = report["rows"]
+        metrics.wrote(output_path, rows=total)
+        metrics.finish(mode=CLEAN_MODE, gaps=report["gaps"], missing_hours=report["missing_steps"],
+                       duplicates=report["left_duplicates"] + report["right_duplicates"])
 
-print(f"✅ Full merged dataset saved: {output_path}")
-print(f"📊 Total rows: {len(merged)}")
-print("⚠️ Note: Missing values are left blank — handle later during cleaning.")
+        print(f"✅ Full merged dataset saved: {output_path}")
+        print(f"📊 Total rows: {total}")
+        print("⚠️ Note: Missing values are left blank — handle later during cleaning.")
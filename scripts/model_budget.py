@@ -0,0 +1,154 @@
+# model_budget.py
+# Serving-cost checks for a freshly trained model: pickled size, load time,
+# memory after load, single-row and 1k-row predict latency. train.py compares
+# the numbers against configurable budgets and either fails or prunes the
+# forest (fewer trees first, then shallower trees) until it fits.
+import json
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import joblib
+import numpy as np
+
+MAX_SIZE_MB = float(os.getenv("MODEL_MAX_SIZE_MB", 50))
+MAX_LOAD_SECONDS = float(os.getenv("MODEL_MAX_LOAD_SECONDS", 2))
+MAX_PREDICT_1_MS = float(os.getenv("MODEL_MAX_PREDICT_1_MS", 25))
+MAX_PREDICT_1K_MS = float(os.getenv("MODEL_MAX_PREDICT_1K_MS", 250))
+MAX_RSS_MB = float(os.getenv("MODEL_MAX_RSS_MB", 500))
+# "prune" shrinks the forest until it fits, "fail" aborts training
+BUDGET_ACTION = os.getenv("MODEL_BUDGET_ACTION", "prune")
+
+MIN_TREES = int(os.getenv("MODEL_PRUNE_MIN_TREES", 25))
+DEPTH_STEPS = [24, 16, 12, 8]
+
+BUDGETS = {
+    "model_size_mb": MAX_SIZE_MB,
+    "load_seconds": MAX_LOAD_SECONDS,
+    "predict_1_ms": MAX_PREDICT_1_MS,
+    "predict_1k_ms": MAX_PREDICT_1K_MS,
+    "rss_after_load_mb": MAX_RSS_MB,
+}
+
+# Loads the model in a clean interpreter so load time and memory are not
+# flattered by modules/arrays already resident in the training process
+_LOAD_PROBE = """
+import json, os, resource, sys, time
+import joblib, sklearn.ensemble  # import cost is not load cost
+def rss():
+    try:  # current RSS on Linux
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except OSError:  # peak RSS elsewhere (bytes on macOS)
+        r = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return r / (1024 * 1024) if sys.platform == "darwin" else r / 1024
+before = rss()
+start = time.perf_counter()
+model = joblib.load(sys.argv[1])
+print(json.dumps({"load_seconds": time.perf_counter() - start, "rss_after_load_mb": rss() - before}))
+"""
+
+
+class BudgetExceeded(RuntimeError):
+    pass
+
+
+def _median_ms(fn, repeats):
+    fn()  # warm-up
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings) * 1000)
+
+
+def benchmark(model, X_sample):
+    fd, path = tempfile.mkstemp(suffix=".pkl")
+    os.close(fd)
+    try:
+        joblib.dump(model, path)
+        stats = {"model_size_mb": os.path.getsize(path) / 1e6}
+        try:
+            probe = subprocess.run(
+                [sys.executable, "-c", _LOAD_PROBE, path],
+                capture_output=True, text=True, check=True, timeout=300,
+            )
+            stats.update(json.loads(probe.stdout.strip().splitlines()[-1]))
+        except Exception as e:
+            # e.g. no `resource` module (Windows): time the load in-process instead
+            logging.warning(f"⚠️ Load probe failed ({e}); timing load in-process")
+            start = time.perf_counter()
+            joblib.load(path)
+            stats["load_seconds"] = time.perf_counter() - start
+            stats["rss_after_load_mb"] = float("nan")
+    finally:
+        os.remove(path)
+
+    single = X_sample.iloc[:1]
+    batch = X_sample.iloc[np.arange(1000) % len(X_sample)]
+    stats["predict_1_ms"] = _median_ms(lambda: model.predict(single), 50)
+    stats["predict_1k_ms"] = _median_ms(lambda: model.predict(batch), 5)
+    return stats
+
+
+def violations(stats, budgets=BUDGETS):
+    # NaN (unmeasured) never counts as a violation
+    return {k: (stats[k], limit) for k, limit in budgets.items() if stats.get(k, 0) > limit}
+
+
+def _prune_steps(model):
+    # Cheapest first: drop trees from the fitted forest (no refit), then refit
+    # with progressively shallower trees at the minimum tree count
+    n = len(model.estimators_)
+    while n > MIN_TREES:
+        n = max(MIN_TREES, n // 2)
+        yield "trees", n
+    current_depth = model.max_depth or float("inf")
+    for depth in DEPTH_STEPS:
+        if depth < current_depth:
+            yield "depth", depth
+
+
+def truncate_trees(model, n):
+    # Keep the newest trees: a warm start appends the trees grown on fresh data
+    # at the end of estimators_, and the pruned forest is what the next warm
+    # start grows from
+    model.estimators_ = model.estimators_[-n:]
+    model.n_estimators = n
+    return model
+
+
+def enforce(model, X_sample, action=BUDGET_ACTION, refit=None):
+    # Returns (model, stats, pruned_description). `refit(max_depth=, n_estimators=)`
+    # must return a model fitted on the training data with those limits.
+    stats = benchmark(model, X_sample)
+    over = violations(stats)
+    if not over:
+        return model, stats, None
+    summary = ", ".join(f"{k}={v:.2f} > {limit:g}" for k, (v, limit) in over.items())
+    if action == "fail":
+        raise BudgetExceeded(f"❌ Model exceeds serving budget: {summary}")
+
+    logging.info(f"✂️ Model over budget ({summary}) — pruning")
+    pruned = None
+    for kind, value in _prune_steps(model):
+        if kind == "trees":
+            model = truncate_trees(model, value)
+            pruned = f"trees={value}"
+        elif refit is not None:
+            model = refit(max_depth=value, n_estimators=len(model.estimators_))
+            pruned = f"trees={len(model.estimators_)},max_depth={value}"
+        else:
+            break
+        stats = benchmark(model, X_sample)
+        over = violations(stats)
+        logging.info(f"   {pruned}: {', '.join(f'{k}={v:.2f}' for k, v in stats.items())}")
+        if not over:
+            return model, stats, pruned
+
+    summary = ", ".join(f"{k}={v:.2f} > {limit:g}" for k, (v, limit) in over.items())
+    raise BudgetExceeded(f"❌ Model still exceeds serving budget after pruning ({pruned}): {summary}")
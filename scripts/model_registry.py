@@ -0,0 +1,145 @@
+# model_registry.py
+# Hot-reloading model holder for app.py. A background thread polls the model
+# file's mtime (or an MLflow registry stage), loads a new version off the
+# request path, validates it with a smoke prediction and swaps the current
+# reference in one assignment. The last few versions stay loaded so they can
+# be compared side by side.
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+import joblib
+import numpy as np
+
+POLL_SECONDS = float(os.getenv("MODEL_POLL_SECONDS", 30))
+KEEP_VERSIONS = int(os.getenv("MODEL_KEEP_VERSIONS", 3))
+# e.g. "models:/PearlsAirSense/Production" to follow an MLflow registry stage
+# instead of the local pickle
+REGISTRY_URI = os.getenv("MODEL_REGISTRY_URI")
+
+
+class ModelVersion:
+    def __init__(self, version, model, source):
+        self.version = version
+        self.model = model
+        self.source = source
+        self.loaded_at = datetime.now(timezone.utc)
+
+    def describe(self):
+        return {
+            "version": self.version,
+            "source": self.source,
+            "loaded_at": self.loaded_at.isoformat(timespec="seconds"),
+            "n_features": int(getattr(self.model, "n_features_in_", 0)),
+        }
+
+
+def smoke_test(model, sample=None):
+    # A model that cannot produce a finite prediction never becomes current
+    n = getattr(model, "n_features_in_", None)
+    if sample is None:
+        if n is None:
+            raise ValueError("model has no n_features_in_ and no smoke sample was given")
+        sample = np.zeros((1, n))
+    pred = np.asarray(model.predict(sample))
+    if pred.shape[0] != len(sample) or not np.all(np.isfinite(pred)):
+        raise ValueError(f"smoke prediction invalid: {pred!r}")
+
+
+class ModelRegistry:
+    def __init__(self, path, registry_uri=REGISTRY_URI, poll_seconds=POLL_SECONDS,
+                 keep_versions=KEEP_VERSIONS, smoke_sample=None, loader=joblib.load):
+        self.path = path
+        self.loader = loader  # e.g. onnx_backend.load for an .onnx file
+        self.registry_uri = registry_uri
+        self.poll_seconds = poll_seconds
+        self.keep_versions = keep_versions
+        self.smoke_sample = smoke_sample
+        self._versions = OrderedDict()
+        self._current = None
+        self._lock = threading.Lock()  # guards _versions; reads of _current are lock-free
+        self._stop = threading.Event()
+        self._thread = None
+        # First load is synchronous so the app never serves without a model
+        self.check()
+        if self._current is None:
+            raise RuntimeError(f"❌ No loadable model at {registry_uri or path}")
+
+    # -----------------------------
+    # Version discovery
+    # -----------------------------
+    def _latest_version(self):
+        if self.registry_uri:
+            from mlflow.tracking import MlflowClient
+
+            _, name, stage = self.registry_uri.rstrip("/").rsplit("/", 2)
+            versions = MlflowClient().get_latest_versions(name, stages=[stage])
+            return f"{name}/v{versions[0].version}" if versions else None
+        if not os.path.exists(self.path):
+            return None
+        return str(os.stat(self.path).st_mtime_ns)
+
+    def _load(self, version):
+        if self.registry_uri:
+            import mlflow.sklearn
+
+            return mlflow.sklearn.load_model(self.registry_uri)
+        return self.loader(self.path)
+
+    # -----------------------------
+    # Reload
+    # -----------------------------
+    def check(self):
+        # Returns True when a new version was swapped in
+        try:
+            version = self._latest_version()
+            if version is None or (self._current and version == self._current.version):
+                return False
+            start = time.perf_counter()
+            model = self._load(version)
+            smoke_test(model, self.smoke_sample)
+        except Exception as e:
+            logging.warning(f"⚠️ Model reload skipped: {e}")
+            return False
+
+        loaded = ModelVersion(version, model, self.registry_uri or self.path)
+        with self._lock:
+            self._versions[version] = loaded
+            while len(self._versions) > self.keep_versions:
+                self._versions.popitem(last=False)
+        self._current = loaded  # atomic swap; in-flight requests keep their reference
+        logging.info(f"🔁 Model version {version} live (loaded in {time.perf_counter() - start:.2f}s)")
+        return True
+
+    def _watch(self):
+        while not self._stop.wait(self.poll_seconds):
+            self.check()
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._watch, name="model-watcher", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    # -----------------------------
+    # Access
+    # -----------------------------
+    def current(self):
+        return self._current.model
+
+    def current_version(self):
+        return self._current
+
+    def get(self, version):
+        with self._lock:
+            return self._versions[version].model
+
+    def versions(self):
+        with self._lock:
+            return [v.describe() for v in self._versions.values()]
@@ -0,0 +1,101 @@
+# online_features.py
+# Latest feature vector for serving, read from the Feast Postgres online store
+# through a small in-process TTL cache. Concurrent requests that arrive while
+# the cache is stale share one lookup instead of each hitting Postgres.
+#
+# A refresh is one online-store call. aqi_data ids are assigned in time order,
+# so the cache asks for the last id it served and the PROBE_AHEAD ids after
+# it together, and keeps the newest complete vector. aqi_data is only queried
+# for the latest id on the first refresh, or when every probed id is filled
+# (the store moved further ahead than the probe).
+import logging
+import os
+import threading
+import time
+
+import pandas as pd
+
+import db
+from feature_defs import ENTITY_KEY, FEATURES, feature_refs
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+FEATURE_REPO_PATH = os.path.join(BASE_DIR, "aqi_feature_store", "feature_repo")
+
+TTL_SECONDS = float(os.getenv("ONLINE_FEATURE_TTL_SECONDS", 30))
+PROBE_AHEAD = int(os.getenv("ONLINE_FEATURE_PROBE_AHEAD", 24))
+
+
+class OnlineFeatureCache:
+    def __init__(self, repo_path=FEATURE_REPO_PATH, ttl=TTL_SECONDS, probe_ahead=PROBE_AHEAD):
+        self.repo_path = repo_path
+        self.ttl = ttl
+        self.probe_ahead = probe_ahead
+        self._store = None
+        self._lock = threading.Lock()
+        self._value = None
+        self._fetched_at = 0.0
+        self._entity_id = None
+
+    def _feature_store(self):
+        if self._store is None:
+            from feast import FeatureStore
+
+            self._store = FeatureStore(repo_path=self.repo_path)
+        return self._store
+
+    def _fresh(self):
+        return self._value is not None and time.monotonic() - self._fetched_at < self.ttl
+
+    def _latest_id(self):
+        latest = db.latest_rows(1)
+        if latest.empty:
+            raise LookupError("aqi_data is empty")
+        return int(latest[ENTITY_KEY].iloc[0])
+
+    def _probe(self, first_id):
+        # (entity id, vector) of the newest complete vector among first_id ..
+        # first_id + probe_ahead, in one get_online_features call
+        ids = list(range(first_id, first_id + self.probe_ahead + 1))
+        response = self._feature_store().get_online_features(
+            features=feature_refs(),
+            entity_rows=[{ENTITY_KEY: i} for i in ids],
+        ).to_dict(include_event_timestamps=True)
+        for j in reversed(range(len(ids))):
+            row = {f: response[f][j] for f in FEATURES}
+            if all(v is not None for v in row.values()):
+                # `time` rides along so predictions can be matched to actuals
+                # later; the model input (feature_transform.model_input) leaves it out
+                event_time = pd.Timestamp(response[f"{FEATURES[0]}__ts"][j], unit="s")
+                return ids[j], pd.DataFrame([{**row, "time": event_time}], columns=FEATURES + ["time"])
+        raise LookupError(f"Online store has no complete vector for {ENTITY_KEY}={first_id}..{ids[-1]}")
+
+    def _fetch(self):
+        if self._entity_id is None:
+            self._entity_id = self._latest_id()
+        entity_id, value = self._probe(self._entity_id)
+        if entity_id == self._entity_id + self.probe_ahead:
+            # Possibly further ahead than probed: resync from aqi_data
+            latest_id = self._latest_id()
+            if latest_id > entity_id:
+                try:
+                    entity_id, value = self._probe(latest_id)
+                except LookupError:
+                    pass  # not materialized yet; keep the newest probed vector
+        self._entity_id = entity_id
+        return value
+
+    def latest(self):
+        # Fast path: no lock while the cached vector is still fresh
+        if self._fresh():
+            return self._value
+        with self._lock:
+            # Whoever waited on the lock picks up the value the first caller fetched
+            if not self._fresh():
+                self._value = self._fetch()
+                self._fetched_at = time.monotonic()
+                logging.info(f"🔄 Refreshed online feature vector (ttl {self.ttl:.0f}s)")
+            return self._value
+
+    def invalidate(self):
+        with self._lock:
+            self._value = None
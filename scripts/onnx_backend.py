@@ -0,0 +1,163 @@
+# onnx_backend.py
+# ONNX export of the trained regressor (sklearn RandomForest, or an XGBoost
+# alternative) and an onnxruntime-backed stand-in for it at serving time.
+# OnnxModel exposes predict / feature_names_in_ / n_features_in_ (and the
+# fitted feature_transformer_ when the model has one), so
+# ModelRegistry, ShadowEvaluator and /forecast use it like the sklearn model.
+#
+# skl2onnx (export), onnxmltools (XGBoost export) and onnxruntime (serving)
+# are optional; callers fall back to the pickle when they are missing.
+import json
+import os
+
+import numpy as np
+
+from feature_transform import FeatureTransformer
+
+# 0 = one intra-op thread per CPU the container may use. Keep inter-op at 1:
+# a tree ensemble is a single node, so there is nothing to run in parallel.
+INTRA_OP_THREADS = int(os.getenv("ONNX_INTRA_OP_THREADS", 0))
+INTER_OP_THREADS = int(os.getenv("ONNX_INTER_OP_THREADS", 1))
+# Max difference tolerated between the pickle and the ONNX graph, relative to
+# the prediction (absolute below 1 AQI). ONNX tree ensembles accumulate leaf
+# values in float32, so the error grows with the prediction and tree count.
+PARITY_RTOL = float(os.getenv("ONNX_PARITY_RTOL", 1e-4))
+
+INPUT_NAME = "input"
+
+
+class ParityError(RuntimeError):
+    pass
+
+
+def container_cpus():
+    # cgroup v2 CPU quota first (docker --cpus / k8s limits), then affinity
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()
+        if quota != "max":
+            return max(1, int(int(quota) / int(period)))
+    except (OSError, ValueError):
+        pass
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:  # macOS / Windows
+        return os.cpu_count() or 1
+
+
+# -----------------------------
+# Export
+# -----------------------------
+def to_onnx(model):
+    n_features = int(model.n_features_in_)
+    if type(model).__module__.startswith("xgboost"):
+        from onnxmltools import convert_xgboost
+        from onnxmltools.convert.common.data_types import FloatTensorType
+
+        # The converter only understands f0..fN feature names
+        booster = model.get_booster()
+        names = booster.feature_names
+        booster.feature_names = None
+        try:
+            onx = convert_xgboost(model, initial_types=[(INPUT_NAME, FloatTensorType([None, n_features]))])
+        finally:
+            booster.feature_names = names
+    else:
+        from skl2onnx import convert_sklearn
+        from skl2onnx.common.data_types import FloatTensorType
+
+        onx = convert_sklearn(model, initial_types=[(INPUT_NAME, FloatTensorType([None, n_features]))])
+
+    # ONNX inputs are positional; keep the column order next to the graph
+    names = getattr(model, "feature_names_in_", None)
+    if names is not None:
+        meta = onx.metadata_props.add()
+        meta.key, meta.value = "feature_names", json.dumps([str(c) for c in names])
+    # Conformal residuals for /forecast intervals (scripts/intervals.py)
+    residuals = getattr(model, "forecast_residuals_", None)
+    if residuals:
+        meta = onx.metadata_props.add()
+        meta.key, meta.value = "forecast_residuals", json.dumps(residuals)
+    # Fitted input pipeline (scripts/feature_transform.py)
+    transformer = getattr(model, "feature_transformer_", None)
+    if transformer is not None:
+        meta = onx.metadata_props.add()
+        meta.key, meta.value = "feature_transformer", json.dumps(transformer.to_dict())
+    return onx
+
+
+def export(model, path, X_check=None):
+    # Writes path atomically. With X_check, the exported graph must reproduce
+    # model.predict within PARITY_RTOL before it replaces the previous file.
+    # Returns the max relative difference (None when unchecked).
+    onx = to_onnx(model)
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(onx.SerializeToString())
+    max_diff = None
+    if X_check is not None:
+        try:
+            max_diff = parity(model, OnnxModel(tmp), X_check)
+        except Exception:
+            os.remove(tmp)
+            raise
+        if max_diff > PARITY_RTOL:
+            os.remove(tmp)
+            raise ParityError(f"❌ ONNX export differs from sklearn by {max_diff:.2e} relative (> {PARITY_RTOL})")
+    os.replace(tmp, path)
+    return max_diff
+
+
+def parity(model, onnx_model, X):
+    # Max |Δ| / max(|prediction|, 1). Both sides get the same float32 inputs
+    # (the trees split on float32 anyway), so only the accumulation differs.
+    X = X.astype(np.float32) if hasattr(X, "astype") else np.asarray(X, dtype=np.float32)
+    expected = np.asarray(model.predict(X), dtype=np.float64)
+    actual = onnx_model.predict(X)
+    if not len(expected):
+        return 0.0
+    return float(np.max(np.abs(expected - actual) / np.maximum(np.abs(expected), 1.0)))
+
+
+# -----------------------------
+# Serving
+# -----------------------------
+class OnnxModel:
+    def __init__(self, path, intra_op_threads=INTRA_OP_THREADS, inter_op_threads=INTER_OP_THREADS):
+        import onnxruntime as ort
+
+        opts = ort.SessionOptions()
+        opts.intra_op_num_threads = intra_op_threads or container_cpus()
+        opts.inter_op_num_threads = inter_op_threads
+        opts.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.path = path
+        self.session = ort.InferenceSession(path, opts, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+
+        meta = self.session.get_modelmeta().custom_metadata_map
+        names = json.loads(meta["feature_names"]) if "feature_names" in meta else None
+        if names is not None:
+            self.feature_names_in_ = np.array(names, dtype=object)
+        if "forecast_residuals" in meta:
+            self.forecast_residuals_ = json.loads(meta["forecast_residuals"])
+        if "feature_transformer" in meta:
+            self.feature_transformer_ = FeatureTransformer.from_dict(json.loads(meta["feature_transformer"]))
+        self.n_features_in_ = int(self.session.get_inputs()[0].shape[1])
+
+    def predict(self, X):
+        X = np.ascontiguousarray(np.asarray(X, dtype=np.float32))
+        out = self.session.run(None, {self.input_name: X})[0]
+        return out.reshape(-1).astype(np.float64)
+
+
+def load(path):
+    return OnnxModel(path)
+
+
+def available():
+    try:
+        import onnxruntime  # noqa: F401
+    except ImportError:
+        return False
+    return True
@@ -0,0 +1,264 @@
+# pipeline_metrics.py
+# Structured metrics for the hourly pipeline. Each stage (fetch, merge,
+# clean, postgres_load, feast_materialize, train) runs as its own process, so
+# every stage appends one JSON record to PIPELINE_METRICS_PATH:
+# rows in/out, bytes read/written, wall and CPU seconds, HTTP calls per
+# provider (errors, retries, bytes, remaining quota) and ok/failed. Re-runs
+# of a stage (the CI retry loops) show up as extra attempts.
+#
+#   with pipeline_metrics.start("clean") as stage:   # wraps the stage's __main__
+#       stage.read(path); stage.rows_in = len(df)
+#       ...
+#       stage.wrote(path, rows=len(out))
+#       stage.finish()  # optional; "failed" if the block raises or exits non-zero
+#
+# `python scripts/pipeline_metrics.py summary` prints the run's per-stage
+# table, compares it with the previous run and rewrites the Prometheus
+# textfile (PIPELINE_PROM_PATH) for node_exporter's textfile collector.
+import json
+import logging
+import os
+import sys
+import time
+from datetime import datetime, timezone
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+METRICS_PATH = os.getenv("PIPELINE_METRICS_PATH", os.path.join(BASE_DIR, "data", "pipeline_metrics.jsonl"))
+PROM_PATH = os.getenv("PIPELINE_PROM_PATH", os.path.join(BASE_DIR, "data", "pipeline_metrics.prom"))
+# One id for every stage of a run: the Actions run, or the UTC hour locally
+RUN_ID = os.getenv("PIPELINE_RUN_ID") or os.getenv("GITHUB_RUN_ID") or datetime.now(timezone.utc).strftime("%Y%m%dT%H")
+HTTP_RETRIES = int(os.getenv("HTTP_RETRIES", 2))
+# Daily call budgets for providers that do not report quota in headers
+# (override with QUOTA_<PROVIDER>, e.g. QUOTA_OPENWEATHERMAP=1000; 0 = unknown)
+DAILY_QUOTA = {
+    "open_meteo": int(os.getenv("QUOTA_OPEN_METEO", 10000)),
+    "openweathermap": int(os.getenv("QUOTA_OPENWEATHERMAP", 0)),
+}
+# Statuses http_get retries; anything else >= 400 is the provider refusing the request
+TRANSIENT_STATUS = (429, 500, 502, 503, 504)
+QUOTA_HEADERS = ("X-RateLimit-Remaining", "RateLimit-Remaining", "X-Ratelimit-Remaining")
+REGRESSION_RATIO = 1.5
+
+
+# -----------------------------
+# Stage recorder
+# -----------------------------
+class Stage:
+    def __init__(self, name, path=METRICS_PATH):
+        self.name = name
+        self.path = path
+        self.rows_in = 0
+        self.rows_out = 0
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.http = {}
+        self.extra = {}
+        self._wall = time.perf_counter()
+        self._cpu = time.process_time()
+        self._finished = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        # A stage that leaves the block before finish() is still recorded:
+        # failed on an exception, or a SystemExit/sys.exit() whose code is
+        # not 0/None (a message counts as failure, as the interpreter treats
+        # it). The exception is never swallowed.
+        if exc_type is None or (issubclass(exc_type, SystemExit) and exc.code in (None, 0)):
+            self.finish()
+        elif issubclass(exc_type, SystemExit):
+            self.finish("failed", error=f"exit status {exc.code}")
+        else:
+            self.finish("failed", error=f"{exc_type.__name__}: {exc}")
+        return False
+
+    def read(self, path, rows=None):
+        if os.path.exists(path):
+            self.bytes_read += os.path.getsize(path)
+        if rows is not None:
+            self.rows_in += rows
+
+    def wrote(self, path, rows=None, bytes_before=0):
+        # bytes_before: size of the file before an append, so only new bytes count
+        if os.path.exists(path):
+            self.bytes_written += os.path.getsize(path) - bytes_before
+        if rows is not None:
+            self.rows_out += rows
+
+    def http_call(self, provider, status, nbytes=0, retries=0, quota_remaining=None):
+        stats = self.http.setdefault(provider, {"calls": 0, "errors": 0, "retries": 0, "bytes": 0,
+                                                "quota_remaining": None})
+        stats["calls"] += 1
+        stats["retries"] += retries
+        stats["bytes"] += nbytes
+        if status is None or status >= 400:
+            stats["errors"] += 1
+        if quota_remaining is not None:
+            stats["quota_remaining"] = quota_remaining
+
+    def finish(self, status="ok", **extra):
+        if self._finished:
+            return
+        self._finished = True
+        self.extra.update(extra)
+        for provider, stats in self.http.items():
+            if stats["quota_remaining"] is None and DAILY_QUOTA.get(provider):
+                stats["quota_remaining"] = DAILY_QUOTA[provider] - calls_today(provider, self.path) - stats["calls"]
+        record = {
+            "run_id": RUN_ID,
+            "stage": self.name,
+            "status": status,
+            "finished_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "wall_seconds": round(time.perf_counter() - self._wall, 3),
+            "cpu_seconds": round(time.process_time() - self._cpu, 3),
+            "rows_in": self.rows_in,
+            "rows_out": self.rows_out,
+            "bytes_read": self.bytes_read,
+            "bytes_written": self.bytes_written,
+            "http": self.http,
+            **self.extra,
+        }
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, "a") as f:
+            f.write(json.dumps(record) + "\n")
+        logging.info(
+            f"📊 {self.name}: {status} in {record['wall_seconds']:.1f}s "
+            f"(cpu {record['cpu_seconds']:.1f}s), rows {self.rows_in}→{self.rows_out}"
+        )
+
+
+def start(name):
+    # Use as a context manager around the stage's work (see Stage.__exit__)
+    return Stage(name)
+
+
+# -----------------------------
+# HTTP helper (counts calls, retries transient failures)
+# -----------------------------
+def http_get(stage, provider, url, retries=HTTP_RETRIES, **kwargs):
+    import requests
+
+    attempt = 0
+    while True:
+        try:
+            response = requests.get(url, **kwargs)
+        except requests.RequestException:
+            if attempt < retries:
+                attempt += 1
+                time.sleep(2 ** attempt)
+                continue
+            stage.http_call(provider, None, retries=attempt)
+            raise
+        if response.status_code in TRANSIENT_STATUS and attempt < retries:
+            attempt += 1
+            time.sleep(2 ** attempt)
+            continue
+        quota = next((response.headers[h] for h in QUOTA_HEADERS if h in response.headers), None)
+        stage.http_call(
+            provider, response.status_code, nbytes=len(response.content), retries=attempt,
+            quota_remaining=int(quota) if quota is not None and quota.isdigit() else None,
+        )
+        return response
+
+
+# -----------------------------
+# Reading records back
+# -----------------------------
+def load_records(path=METRICS_PATH):
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def calls_today(provider, path=METRICS_PATH):
+    today = datetime.now(timezone.utc).date().isoformat()
+    return sum(
+        r.get("http", {}).get(provider, {}).get("calls", 0)
+        for r in load_records(path) if r.get("finished_at", "").startswith(today)
+    )
+
+
+def run_summary(records, run_id):
+    # Last attempt per stage, in the order stages first ran; attempts counted
+    stages = {}
+    for r in records:
+        if r["run_id"] != run_id:
+            continue
+        attempts = stages[r["stage"]]["attempts"] + 1 if r["stage"] in stages else 1
+        stages[r["stage"]] = {**r, "attempts": attempts}
+    return stages
+
+
+def previous_run_id(records, run_id):
+    ids = [r["run_id"] for r in records if r["run_id"] != run_id]
+    return ids[-1] if ids else None
+
+
+def prometheus_lines(stages, run_id):
+    lines = []
+    gauges = [
+        ("wall_seconds", "Stage wall time"), ("cpu_seconds", "Stage CPU time"),
+        ("rows_in", "Rows read by the stage"), ("rows_out", "Rows written by the stage"),
+        ("bytes_read", "Bytes read by the stage"), ("bytes_written", "Bytes written by the stage"),
+        ("attempts", "Attempts needed (CI retries + 1)"),
+    ]
+    for key, help_text in gauges:
+        name = f"aqi_pipeline_stage_{key}"
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} gauge"]
+        for stage, r in stages.items():
+            lines.append(f'{name}{{stage="{stage}",run_id="{run_id}"}} {r[key]}')
+    lines += ["# HELP aqi_pipeline_stage_ok 1 if the stage's last attempt succeeded",
+              "# TYPE aqi_pipeline_stage_ok gauge"]
+    for stage, r in stages.items():
+        lines.append(f'aqi_pipeline_stage_ok{{stage="{stage}",run_id="{run_id}"}} {int(r["status"] == "ok")}')
+    for key in ("calls", "errors", "retries", "bytes", "quota_remaining"):
+        name = f"aqi_pipeline_http_{key}"
+        lines += [f"# TYPE {name} gauge"]
+        for stage, r in stages.items():
+            for provider, stats in r.get("http", {}).items():
+                if stats.get(key) is not None:
+                    lines.append(f'{name}{{stage="{stage}",provider="{provider}",run_id="{run_id}"}} {stats[key]}')
+    return lines
+
+
+def summary(run_id=RUN_ID, path=METRICS_PATH, prom_path=PROM_PATH):
+    records = load_records(path)
+    stages = run_summary(records, run_id)
+    if not stages:
+        print(f"ℹ️ No pipeline metrics recorded for run {run_id}")
+        return stages
+    previous = run_summary(records, previous_run_id(records, run_id))
+
+    print(f"📊 Pipeline run {run_id}")
+    print(f"{'stage':<18} {'status':<7} {'tries':>5} {'wall s':>8} {'cpu s':>8} "
+          f"{'rows in':>9} {'rows out':>9} {'MB read':>8} {'MB written':>10}")
+    for stage, r in stages.items():
+        slower = ""
+        before = previous.get(stage)
+        if before and before["wall_seconds"] > 0 and r["wall_seconds"] > REGRESSION_RATIO * before["wall_seconds"]:
+            slower = f"  ⚠️ {r['wall_seconds'] / before['wall_seconds']:.1f}x slower than last run"
+        print(f"{stage:<18} {r['status']:<7} {r['attempts']:>5} {r['wall_seconds']:>8.1f} {r['cpu_seconds']:>8.1f} "
+              f"{r['rows_in']:>9} {r['rows_out']:>9} {r['bytes_read'] / 1e6:>8.2f} {r['bytes_written'] / 1e6:>10.2f}{slower}")
+        for provider, stats in r.get("http", {}).items():
+            quota = "?" if stats["quota_remaining"] is None else stats["quota_remaining"]
+            print(f"    ↳ {provider}: {stats['calls']} calls, {stats['errors']} errors, "
+                  f"{stats['retries']} retries, {stats['bytes'] / 1e3:.0f} kB, quota left {quota}")
+    total = sum(r["wall_seconds"] for r in stages.values())
+    print(f"⏱️ Total stage time: {total:.1f}s")
+
+    os.makedirs(os.path.dirname(prom_path), exist_ok=True)
+    with open(prom_path + ".tmp", "w") as f:
+        f.write("\n".join(prometheus_lines(stages, run_id)) + "\n")
+    os.replace(prom_path + ".tmp", prom_path)  # textfile collector must never see a partial file
+    print(f"✅ Prometheus textfile written: {prom_path}")
+    return stages
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(message)s")
+    command = sys.argv[1] if len(sys.argv) > 1 else "summary"
+    if command != "summary":
+        sys.exit(f"Usage: python {sys.argv[0]} summary")
+    summary(sys.argv[2] if len(sys.argv) > 2 else RUN_ID)
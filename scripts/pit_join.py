@@ -0,0 +1,83 @@
+# pit_join.py
+# Local point-in-time join: the same answer Feast's get_historical_features
+# gives for aqi_features, computed with a sorted-merge asof join over a
+# Parquet copy of the feature set instead of a Postgres round trip.
+#
+# For every entity row (id, event_timestamp) it picks the latest source row
+# with the same id and time <= event_timestamp, no older than the feature's
+# TTL (None = unbounded, like the FeatureView's ttl=None).
+import logging
+import os
+
+import pandas as pd
+
+from feature_defs import ENTITY_KEY, FEATURES
+from feature_io import entity_ids, load_features
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+CSV_PATH = os.path.join(BASE_DIR, "data", "aqi_feature_set_v1.csv")
+PARQUET_PATH = os.path.join(BASE_DIR, "data", "aqi_feature_set_v1.parquet")
+TIMESTAMP = "time"
+EVENT_TIMESTAMP = "event_timestamp"
+
+
+def build_source(csv_path=CSV_PATH, parquet_path=PARQUET_PATH):
+    # Parquet copy of the feature CSV with the same id/column names as aqi_data
+    # in Postgres (feature_io.entity_ids, the ids train.py asks for). Rebuilt
+    # only when the CSV is newer.
+    if os.path.exists(parquet_path) and os.path.getmtime(parquet_path) >= os.path.getmtime(csv_path):
+        return parquet_path
+    df = load_features(csv_path, lowercase=True)
+    df.insert(0, ENTITY_KEY, entity_ids(df[TIMESTAMP]))
+    df = df.sort_values(TIMESTAMP, kind="stable").reset_index(drop=True)
+    df.to_parquet(parquet_path, index=False)
+    logging.info(f"✅ Built Parquet feature source: {parquet_path} ({len(df)} rows)")
+    return parquet_path
+
+
+def load_source(features=FEATURES, parquet_path=None):
+    path = parquet_path or build_source()
+    return pd.read_parquet(path, columns=[ENTITY_KEY, TIMESTAMP] + list(features))
+
+
+def _utc_naive(ts):
+    ts = pd.to_datetime(ts)
+    if ts.dt.tz is not None:
+        ts = ts.dt.tz_convert("UTC").dt.tz_localize(None)
+    return ts.astype("datetime64[ns]")
+
+
+def get_historical_features(entity_df, features=FEATURES, source=None, ttl=None):
+    # ttl: None, a Timedelta applied to every feature, or {feature: Timedelta}
+    # for per-feature TTLs. Features sharing a TTL are joined in one pass.
+    if source is None:
+        source = load_source(features)
+
+    left = entity_df.copy()
+    left["_row"] = range(len(left))
+    left["_ts"] = _utc_naive(left[EVENT_TIMESTAMP])
+    left = left.sort_values("_ts", kind="stable")
+
+    right = source[[ENTITY_KEY, TIMESTAMP] + list(features)].copy()
+    right["_ts"] = _utc_naive(right[TIMESTAMP])
+    right = right.drop(columns=[TIMESTAMP]).sort_values("_ts", kind="stable")
+
+    groups = {}
+    for f in features:
+        f_ttl = ttl.get(f) if isinstance(ttl, dict) else ttl
+        groups.setdefault(f_ttl, []).append(f)
+
+    out = left
+    for f_ttl, cols in groups.items():
+        out = pd.merge_asof(
+            out,
+            right[[ENTITY_KEY, "_ts"] + cols],
+            on="_ts",
+            by=ENTITY_KEY,
+            direction="backward",
+            allow_exact_matches=True,
+            tolerance=pd.Timedelta(f_ttl) if f_ttl is not None else None,
+        )
+
+    out = out.sort_values("_row").drop(columns=["_row", "_ts"]).reset_index(drop=True)
+    return out[list(entity_df.columns) + list(features)]
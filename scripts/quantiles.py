@@ -0,0 +1,206 @@
+# quantiles.py
+# Quantiles behind the IQR capping (and median fills) in
+# data_clean_feature.py, selected with CAPPING_QUANTILES:
+#
+#   exact  - recomputed over the whole raw history on every run (default).
+#            Caps move whenever history grows.
+#   frozen - the caps the last cleaning run applied (data/capping_applied.json,
+#            written by every mode), copied next to the model by train.py
+#            (models/capping_quantiles.json, and on the model as
+#            `capping_quantiles_`). Cleaning applies exactly the caps the
+#            serving model was trained with until the next training.
+#   sketch - P² estimators (Jain & Chlamtac, 1985) per column and quantile,
+#            kept in data/capping_sketch.json. Each run only feeds the rows
+#            newer than the last one seen: O(new rows), five numbers per
+#            estimator, no history held.
+#
+# The sketch starts from exact quantiles of the history it is built on (the
+# P² markers placed at their ideal positions), so it only approximates what
+# arrives after that.
+import json
+import os
+from datetime import datetime, timezone
+
+import numpy as np
+
+import chunked
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+FROZEN_PATH = os.path.join(BASE_DIR, "models", "capping_quantiles.json")
+SKETCH_PATH = os.path.join(BASE_DIR, "data", "capping_sketch.json")
+APPLIED_PATH = os.path.join(BASE_DIR, "data", "capping_applied.json")
+QUANTILES = (0.25, 0.5, 0.75)
+MODES = ("exact", "frozen", "sketch")
+_MARKERS = 5
+
+
+# -----------------------------
+# Frozen quantiles (saved with the model)
+# -----------------------------
+def save_frozen(stats, source, path=FROZEN_PATH):
+    # stats: {"median"|"q1"|"q3": {column: value}} as used by data_clean_feature
+    payload = {
+        "fitted_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "source": source,
+        **{k: {c: float(v) for c, v in stats[k].items()} for k in ("median", "q1", "q3")},
+    }
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + ".tmp", "w") as f:
+        json.dump(payload, f, indent=2)
+    os.replace(path + ".tmp", path)
+    return payload
+
+
+def freeze(applied_path=APPLIED_PATH, path=FROZEN_PATH):
+    # Copies the stats the last cleaning run applied (save_frozen(...,
+    # APPLIED_PATH)) to the model's; None when no run has recorded them
+    if not os.path.exists(applied_path):
+        return None
+    with open(applied_path) as f:
+        payload = json.load(f)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + ".tmp", "w") as f:
+        json.dump(payload, f, indent=2)
+    os.replace(path + ".tmp", path)
+    return payload
+
+
+def load_frozen(path=FROZEN_PATH, columns=None):
+    # None when there is no frozen set (or it lacks one of `columns`)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        payload = json.load(f)
+    if columns is not None and any(c not in payload["q1"] for c in columns):
+        return None
+    return {k: payload[k] for k in ("median", "q1", "q3")}
+
+
+# -----------------------------
+# P² sketch
+# -----------------------------
+class Sketch:
+    # One P² estimator per (column, quantile), updated in lockstep: every
+    # marker array is (estimators x 5), so a row costs a handful of numpy
+    # operations whatever the number of columns.
+    def __init__(self, columns, quantiles=QUANTILES):
+        self.columns = list(columns)
+        self.quantiles = [float(q) for q in quantiles]
+        p = np.tile(self.quantiles, len(self.columns))
+        self.step = np.stack([np.zeros_like(p), p / 2, p, (1 + p) / 2, np.ones_like(p)], axis=1)
+        shape = (len(self.columns) * len(self.quantiles), _MARKERS)
+        self.heights = np.full(shape, np.nan)
+        self.positions = np.zeros(shape)
+        self.desired = np.zeros(shape)
+        self.count = np.zeros(len(self.columns), dtype=np.int64)
+        self.last_time = None  # newest row fed, maintained by the caller
+
+    def _rows(self, col):
+        i = self.columns.index(col)
+        return slice(i * len(self.quantiles), (i + 1) * len(self.quantiles))
+
+    @classmethod
+    def fit(cls, passes, columns, quantiles=QUANTILES):
+        # passes() -> iterator of {column: float array} over the history (see
+        # chunked.exact_quantiles); markers start at their exact values
+        sketch = cls(columns, quantiles)
+        for arrays in passes():
+            for i, col in enumerate(sketch.columns):
+                sketch.count[i] += int((~np.isnan(arrays[col])).sum())
+        levels = sorted({float(s) for s in sketch.step.ravel()})
+        exact = chunked.exact_quantiles(passes, {col: levels for col in sketch.columns})
+        for i, col in enumerate(sketch.columns):
+            rows = sketch._rows(col)
+            if sketch.count[i]:
+                sketch.heights[rows] = [[exact[col][s] for s in step] for step in sketch.step[rows]]
+                sketch.positions[rows] = 1 + (sketch.count[i] - 1) * sketch.step[rows]
+                sketch.desired[rows] = sketch.positions[rows]
+        return sketch
+
+    def update(self, arrays):
+        # arrays: {column: float array} of new rows, oldest first; NaNs skip
+        values = np.stack([np.asarray(arrays[c], dtype=float) for c in self.columns], axis=1)
+        per_q = len(self.quantiles)
+        for row in values:
+            seen = ~np.isnan(row)
+            self.count += seen
+            x = np.repeat(row, per_q)
+            live = np.repeat(seen, per_q)
+            # Columns with no history yet take their first value as every marker
+            fresh = live & np.isnan(self.heights[:, 0])
+            self.heights[fresh] = x[fresh][:, None]
+            self.positions[fresh] = 1.0
+            self.desired[fresh] = 1.0
+            live &= ~fresh
+            if live.any():
+                self._observe(live, x)
+        return self
+
+    def _observe(self, live, x):
+        h, n = self.heights[live], self.positions[live]
+        x = x[live]
+        h[:, 0] = np.minimum(h[:, 0], x)
+        h[:, -1] = np.maximum(h[:, -1], x)
+        cell = (x[:, None] >= h[:, 1:-1]).sum(axis=1)  # markers above x shift right
+        n += np.arange(_MARKERS)[None, :] > cell[:, None]
+        self.desired[live] += self.step[live]
+        d = self.desired[live]
+        for i in range(1, _MARKERS - 1):
+            gap = d[:, i] - n[:, i]
+            move = ((gap >= 1) & (n[:, i + 1] - n[:, i] > 1)) | ((gap <= -1) & (n[:, i - 1] - n[:, i] < -1))
+            if not move.any():
+                continue
+            s = np.sign(gap)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                parabolic = h[:, i] + s / (n[:, i + 1] - n[:, i - 1]) * (
+                    (n[:, i] - n[:, i - 1] + s) * (h[:, i + 1] - h[:, i]) / (n[:, i + 1] - n[:, i])
+                    + (n[:, i + 1] - n[:, i] - s) * (h[:, i] - h[:, i - 1]) / (n[:, i] - n[:, i - 1])
+                )
+                towards = np.where(s > 0, i + 1, i - 1)
+                rows = np.arange(len(h))
+                linear = h[:, i] + s * (h[rows, towards] - h[:, i]) / (n[rows, towards] - n[:, i])
+            inside = (h[:, i - 1] < parabolic) & (parabolic < h[:, i + 1])
+            h[:, i] = np.where(move, np.where(inside, parabolic, linear), h[:, i])
+            n[:, i] += np.where(move, s, 0)
+        self.heights[live], self.positions[live] = h, n
+
+    def quantile(self, col, q):
+        row = self._rows(col).start + self.quantiles.index(float(q))
+        return float(self.heights[row, 2])
+
+    # -----------------------------
+    # Persistence
+    # -----------------------------
+    def save(self, path=SKETCH_PATH):
+        payload = {
+            "columns": self.columns,
+            "quantiles": self.quantiles,
+            "last_time": self.last_time,
+            "count": self.count.tolist(),
+            # NaN (no data yet) as null
+            "heights": [[None if np.isnan(v) else float(v) for v in r] for r in self.heights],
+            "positions": self.positions.tolist(),
+            "desired": self.desired.tolist(),
+        }
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + ".tmp", "w") as f:
+            json.dump(payload, f)
+        os.replace(path + ".tmp", path)
+
+    @classmethod
+    def load(cls, path=SKETCH_PATH, columns=None, quantiles=QUANTILES):
+        # None when there is no saved sketch or it tracks other columns/quantiles
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            payload = json.load(f)
+        if (columns is not None and payload["columns"] != list(columns)) or \
+                payload["quantiles"] != [float(q) for q in quantiles]:
+            return None
+        sketch = cls(payload["columns"], payload["quantiles"])
+        sketch.last_time = payload["last_time"]
+        sketch.count = np.array(payload["count"], dtype=np.int64)
+        sketch.heights = np.array([[np.nan if v is None else v for v in r] for r in payload["heights"]], dtype=float)
+        sketch.positions = np.array(payload["positions"], dtype=float)
+        sketch.desired = np.array(payload["desired"], dtype=float)
+        return sketch
@@ -0,0 +1,182 @@
+# request_metrics.py
+# Per-route and per-phase request timings for app.py, exposed in Prometheus
+# text format on /metrics, plus opt-in per-request profiling.
+#
+#   with phase("data_load"):
+#       df = pd.read_csv(...)
+#
+# Profiling: send `X-Profile: <PROFILE_TOKEN>` (or `?profile=<PROFILE_TOKEN>`)
+# and the request runs under pyinstrument when installed, cProfile otherwise.
+# The dump is written to PROFILE_DIR and its path returned in the
+# X-Profile-Path response header. Disabled while PROFILE_TOKEN is unset.
+import cProfile
+import io
+import logging
+import os
+import pstats
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+from flask import Response, g, request
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN")
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(BASE_DIR, "data", "profiles"))
+# Seconds; Prometheus client defaults, stretched for the plotting routes
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+# -----------------------------
+# Metric store
+# -----------------------------
+class Histogram:
+    def __init__(self, name, help_text, labels, buckets=BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.buckets = buckets
+        self._series = {}  # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._series.items())
+        for label_values, series in items:
+            labels = ",".join(f'{k}="{v}"' for k, v in zip(self.labels, label_values))
+            for bound, count in zip(self.buckets, series):
+                lines.append(f'{self.name}_bucket{{{labels},le="{bound}"}} {count}')
+            lines.append(f'{self.name}_bucket{{{labels},le="+Inf"}} {series[-1]}')
+            lines.append(f"{self.name}_sum{{{labels}}} {series[-2]:.6f}")
+            lines.append(f"{self.name}_count{{{labels}}} {series[-1]}")
+        return lines
+
+
+REQUESTS = Histogram(
+    "aqi_http_request_duration_seconds", "Request wall time by route",
+    ("route", "method", "status"),
+)
+PHASES = Histogram(
+    "aqi_http_request_phase_seconds", "Wall time of named phases inside a request",
+    ("route", "phase"),
+)
+
+
+def render_metrics():
+    return "\n".join(REQUESTS.render() + PHASES.render()) + "\n"
+
+
+# -----------------------------
+# Request hooks
+# -----------------------------
+def _route():
+    rule = request.url_rule
+    return rule.rule if rule is not None else "unmatched"
+
+
+@contextmanager
+def phase(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        PHASES.observe(elapsed, _route(), name)
+        g.setdefault("phases", []).append((name, elapsed))
+
+
+def _profile_requested():
+    if not PROFILE_TOKEN:
+        return False
+    return PROFILE_TOKEN in (request.headers.get("X-Profile"), request.args.get("profile"))
+
+
+def _start_profiler():
+    try:
+        from pyinstrument import Profiler
+    except ImportError:
+        profiler = cProfile.Profile()
+        profiler.enable()
+        return "cprofile", profiler
+    profiler = Profiler()
+    profiler.start()
+    return "pyinstrument", profiler
+
+
+def _dump_profile(kind, profiler):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    stem = f"{datetime.now(timezone.utc):%Y%m%dT%H%M%S%f}_{request.endpoint or 'unmatched'}"
+    if kind == "pyinstrument":
+        profiler.stop()
+        path = os.path.join(PROFILE_DIR, stem + ".html")
+        with open(path, "w") as f:
+            f.write(profiler.output_html())
+        return path
+    profiler.disable()
+    path = os.path.join(PROFILE_DIR, stem + ".prof")  # open with snakeviz / pstats
+    profiler.dump_stats(path)
+    summary = io.StringIO()
+    pstats.Stats(profiler, stream=summary).sort_stats("cumulative").print_stats(25)
+    with open(path[:-5] + ".txt", "w") as f:
+        f.write(summary.getvalue())
+    return path
+
+
+def init_app(app):
+    @app.before_request
+    def _start():
+        g.request_start = time.perf_counter()
+        g.profiler = None
+        if _profile_requested():
+            try:
+                g.profiler = _start_profiler()
+            except Exception as e:  # e.g. another request is already being profiled
+                logging.warning(f"⚠️ Profiler not started: {e}")
+
+    @app.after_request
+    def _finish(response):
+        elapsed = time.perf_counter() - g.request_start
+        if request.endpoint != "metrics":
+            REQUESTS.observe(elapsed, _route(), request.method, str(response.status_code))
+        phases = g.get("phases", [])
+        response.headers["Server-Timing"] = ", ".join(
+            [f"{name};dur={seconds * 1000:.1f}" for name, seconds in phases]
+            + [f"total;dur={elapsed * 1000:.1f}"]
+        )
+        if g.get("profiler"):
+            try:
+                response.headers["X-Profile-Path"] = _dump_profile(*g.profiler)
+            except Exception as e:
+                logging.warning(f"⚠️ Profile dump failed: {e}")
+            g.profiler = None
+        return response
+
+    @app.teardown_request
+    def _abandon_profiler(exc):
+        # Unhandled exception with PROPAGATE_EXCEPTIONS: never leave a profiler running
+        if g.get("profiler"):
+            kind, profiler = g.profiler
+            if kind == "pyinstrument":
+                profiler.stop()
+            else:
+                profiler.disable()
+            g.profiler = None
+
+    @app.route("/metrics")
+    def metrics():
+        return Response(render_metrics(), mimetype="text/plain; version=0.0.4")
+
+    return app
@@ -0,0 +1,184 @@
+# shadow.py
+# Shadow and canary evaluation for /forecast. Shadow models score the same
+# feature vector as the primary model on a background worker, so they never
+# add latency to the response. Every prediction (primary included) is logged
+# with the feature row's timestamp; once the actual AQI for that hour is in
+# the feature set, rolling errors per model can be compared before a switch.
+# The log is compacted to what the report can still use whenever it grows
+# past SHADOW_MAX_LOG_MB, so neither the file nor /shadow's read grows with
+# traffic. Appends and compaction hold an flock on <log>.lock, so gunicorn
+# workers sharing the log never lose each other's rows to a compaction.
+import csv
+import logging
+import os
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from feature_io import load_features, target_observed
+from feature_transform import model_input
+from model_registry import ModelRegistry
+
+try:
+    import fcntl
+except ImportError:  # Windows: only this process's threads are serialized
+    fcntl = None
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+PREDICTIONS_PATH = os.getenv("SHADOW_PREDICTIONS_PATH", os.path.join(BASE_DIR, "data", "shadow_predictions.csv"))
+ACTUALS_PATH = os.path.join(BASE_DIR, "data", "aqi_feature_set_v1.csv")
+
+# Comma-separated model pickles, e.g. "models/candidate_rf.pkl,models/candidate_xgb.pkl"
+SHADOW_MODEL_PATHS = [p for p in os.getenv("SHADOW_MODEL_PATHS", "").split(",") if p.strip()]
+# Share of /forecast requests answered by CANARY_MODEL (one of the shadow names)
+CANARY_PERCENT = float(os.getenv("CANARY_PERCENT", 0))
+CANARY_MODEL = os.getenv("CANARY_MODEL")
+ERROR_WINDOW = int(os.getenv("SHADOW_ERROR_WINDOW", 168))  # last N scored hours per model
+MAX_LOG_MB = float(os.getenv("SHADOW_MAX_LOG_MB", 5))
+
+PRIMARY = "primary"
+FIELDS = ["logged_at", "feature_time", "model", "version", "served", "prediction"]
+
+
+def model_name(path):
+    return os.path.splitext(os.path.basename(path))[0]
+
+
+@contextmanager
+def _locked(path):
+    with open(path, "a") as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def predict_one(model, features_df, history=None):
+    # Each model encodes with its own fitted transformer (or legacy one-hots)
+    return float(model.predict(model_input(model, features_df, history))[0])
+
+
+class ShadowEvaluator:
+    def __init__(self, primary, shadow_paths=SHADOW_MODEL_PATHS, predictions_path=PREDICTIONS_PATH,
+                 canary_percent=CANARY_PERCENT, canary_model=CANARY_MODEL, loader=joblib.load):
+        self.primary = primary
+        self.shadows = {}
+        for path in shadow_paths:
+            try:
+                self.shadows[model_name(path)] = ModelRegistry(path.strip(), loader=loader).start()
+            except Exception as e:
+                logging.warning(f"⚠️ Shadow model {path} not loaded: {e}")
+        self.predictions_path = predictions_path
+        self.canary_percent = canary_percent if canary_model in self.shadows else 0.0
+        self.canary_model = canary_model
+        # One worker keeps shadow inference and log appends serial and off the request thread
+        self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="shadow")
+        self._write_lock = threading.Lock()
+
+    # -----------------------------
+    # Request path
+    # -----------------------------
+    def choose(self):
+        # Returns (name, registry) of the model that answers this request
+        if self.canary_percent and random.random() * 100 < self.canary_percent:
+            return self.canary_model, self.shadows[self.canary_model]
+        return PRIMARY, self.primary
+
+    def submit(self, features_df, served_name, served_version, served_prediction, history=None):
+        # Called after the response value is known; everything else is async.
+        # history: recent (time, aqi) rows for models with lag features
+        feature_time = str(features_df["time"].iloc[0]) if "time" in features_df.columns else ""
+        self._pool.submit(
+            self._run, features_df.copy(), feature_time, served_name, served_version, served_prediction, history
+        )
+
+    # -----------------------------
+    # Background worker
+    # -----------------------------
+    def _run(self, features_df, feature_time, served_name, served_version, served_prediction, history):
+        now = datetime.now(timezone.utc).isoformat(timespec="seconds")
+        rows = [[now, feature_time, served_name, served_version, True, served_prediction]]
+        candidates = {PRIMARY: self.primary, **self.shadows}
+        for name, registry in candidates.items():
+            if name == served_name:
+                continue
+            try:
+                version = registry.current_version()
+                rows.append([now, feature_time, name, version.version, False,
+                             predict_one(version.model, features_df, history)])
+            except Exception as e:
+                logging.warning(f"⚠️ Shadow prediction failed for {name}: {e}")
+        self._append(rows)
+
+    def _append(self, rows):
+        # The thread lock covers this process, the flock the other workers:
+        # an append must not land in a file a compaction is about to replace
+        with self._write_lock, _locked(self.predictions_path + ".lock"):
+            new_file = not os.path.exists(self.predictions_path)
+            with open(self.predictions_path, "a", newline="") as f:
+                writer = csv.writer(f)
+                if new_file:
+                    writer.writerow(FIELDS)
+                writer.writerows(rows)
+            if os.path.getsize(self.predictions_path) > MAX_LOG_MB * 2**20:
+                self._compact()
+
+    def _compact(self, window=ERROR_WINDOW):
+        # Keep what rolling_errors() can use: the last prediction per model and
+        # hour, for each model's 2 * window most recent hours (room for hours
+        # whose actual is not in yet). Rows are kept as text, byte for byte.
+        preds = pd.read_csv(self.predictions_path, dtype=str, keep_default_na=False)
+        preds["_t"] = pd.to_datetime(preds["feature_time"], errors="coerce")
+        preds = preds[preds["_t"].notna()].sort_values("logged_at", kind="stable")
+        preds = preds.drop_duplicates(["model", "_t"], keep="last")
+        preds = preds.sort_values("_t", kind="stable").groupby("model").tail(2 * window)
+        preds = preds.sort_values("logged_at", kind="stable").drop(columns="_t")
+        tmp = self.predictions_path + ".tmp"
+        preds.to_csv(tmp, index=False)
+        os.replace(tmp, self.predictions_path)  # readers see the old or the new file
+        logging.info(f"🗜️ Compacted {self.predictions_path} to {len(preds)} rows")
+
+    # -----------------------------
+    # Reporting
+    # -----------------------------
+    def rolling_errors(self, window=ERROR_WINDOW, actuals_path=ACTUALS_PATH):
+        if not os.path.exists(self.predictions_path):
+            return {}
+        preds = pd.read_csv(self.predictions_path)
+        preds = preds[preds["feature_time"].notna()]
+        preds["feature_time"] = pd.to_datetime(preds["feature_time"])
+        # /forecast is hit many times per hour; score each model once per hour
+        preds = preds.sort_values("logged_at").drop_duplicates(["model", "feature_time"], keep="last")
+
+        actuals = load_features(actuals_path, columns=["time", "AQI"])
+        actuals = actuals[target_observed(actuals_path)]  # no scoring against filled hours
+        scored = preds.merge(actuals, left_on="feature_time", right_on="time", how="inner")
+
+        report = {}
+        for name, group in scored.groupby("model"):
+            recent = group.sort_values("feature_time").tail(window)
+            err = recent["prediction"] - recent["AQI"]
+            report[name] = {
+                "n": int(len(recent)),
+                "mae": round(float(np.abs(err).mean()), 3),
+                "rmse": round(float(np.sqrt((err ** 2).mean())), 3),
+                "bias": round(float(err.mean()), 3),
+                "versions": sorted(recent["version"].astype(str).unique().tolist()),
+            }
+        return report
+
+    def describe(self):
+        return {
+            "shadows": sorted(self.shadows),
+            "canary_model": self.canary_model if self.canary_percent else None,
+            "canary_percent": self.canary_percent,
+        }
@@ -0,0 +1,299 @@
+# shared_store.py
+# Serving data shared by all worker processes of app.py (gunicorn -w N with
+# SERVING_MEMORY=shared). One process publishes, every worker memory-maps the
+# same files, so the feature frame and the forest exist once in RAM however
+# many workers run:
+#
+#   features  the feature CSV as one .npy file per column (categoricals as
+#             codes); FeatureStore.frame() wraps the mapped arrays in a
+#             DataFrame without copying them
+#   model     a RandomForest / ExtraTrees regressor flattened into node arrays
+#             over all trees (children, split feature and threshold, leaf
+#             values); SharedForest predicts from them directly. Other models
+#             are unpickled per process as before.
+#
+# Publications live under SHARED_STORE_DIR (tmpfs /dev/shm where there is one,
+# so the pages are plain shared memory) in a directory per source version
+# (file mtime). The first process to see a new version takes a file lock,
+# writes a temp directory and renames it into place; the others wait on the
+# lock and attach. Old versions are removed once a newer one is published
+# (mapped pages stay valid until the workers holding them let go).
+#
+#   features = shared_store.FeatureStore("data/aqi_feature_set_v1.csv")
+#   df = features.frame(columns=["time", "aqi"], lowercase=True)
+#   models = ModelRegistry("models/aqi_rf_model.pkl", loader=shared_store.load_model)
+#
+# `python scripts/shared_store.py` publishes both ahead of starting workers.
+import json
+import logging
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from feature_io import CSV_PATH, load_features
+
+try:
+    import fcntl
+except ImportError:  # Windows: the rename alone keeps publications whole
+    fcntl = None
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+STORE_DIR = os.getenv(
+    "SHARED_STORE_DIR",
+    "/dev/shm/aqi_shared_store" if os.path.isdir("/dev/shm") else os.path.join(BASE_DIR, ".cache", "shared_store"),
+)
+MODEL_PATH = os.path.join(BASE_DIR, "models", "aqi_rf_model.pkl")
+MANIFEST = "manifest.json"
+KEEP_VERSIONS = 2
+
+# Model attributes the serving code reads besides predict()
+MODEL_ATTRIBUTES = (
+    "feature_names_in_", "n_features_in_", "n_outputs_",
+    "forecast_residuals_", "capping_quantiles_", "feature_transformer_",
+)
+
+
+# -----------------------------
+# Publication
+# -----------------------------
+def _version(path):
+    return str(os.stat(path).st_mtime_ns)
+
+
+@contextmanager
+def _locked(path):
+    with open(path, "a") as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _prune(store_dir, name, keep):
+    prefix = f"{name}-"
+    versions = sorted(
+        (d for d in os.listdir(store_dir) if d.startswith(prefix) and d[len(prefix):].isdigit()),
+        key=lambda d: int(d[len(prefix):]),
+    )
+    for d in versions[:-keep]:
+        shutil.rmtree(os.path.join(store_dir, d), ignore_errors=True)
+
+
+def published(name, version, write, store_dir=STORE_DIR):
+    # Directory holding `name` at `version`; write(tmp_dir) fills it the
+    # first time (one process only, the manifest last)
+    path = os.path.join(store_dir, f"{name}-{version}")
+    if os.path.exists(os.path.join(path, MANIFEST)):
+        return path
+    os.makedirs(store_dir, exist_ok=True)
+    with _locked(os.path.join(store_dir, f"{name}.lock")):
+        if not os.path.exists(os.path.join(path, MANIFEST)):  # published while we waited
+            tmp = tempfile.mkdtemp(prefix=f".{name}-", dir=store_dir)
+            try:
+                write(tmp)
+                os.rename(tmp, path)
+            except Exception:
+                shutil.rmtree(tmp, ignore_errors=True)
+                raise
+            _prune(store_dir, name, KEEP_VERSIONS)
+            logging.info(f"📤 Published {name} version {version} to {path}")
+    return path
+
+
+def _write_manifest(path, manifest):
+    with open(os.path.join(path, MANIFEST), "w") as f:
+        json.dump(manifest, f)
+
+
+def _read_manifest(path):
+    with open(os.path.join(path, MANIFEST)) as f:
+        return json.load(f)
+
+
+def _mapped(path, name):
+    # A plain read-only ndarray over the mapping (which it keeps alive)
+    return np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r").view(np.ndarray)
+
+
+# -----------------------------
+# Feature frame
+# -----------------------------
+def _save_frame(df, path):
+    columns = []
+    for i, (name, s) in enumerate(df.items()):
+        entry = {"name": name, "file": str(i), "dtype": str(s.dtype)}
+        if isinstance(s.dtype, np.dtype) and s.dtype != object:
+            values = s.to_numpy()
+        else:
+            # Categoricals (and any string column) as codes into a category list
+            cat = s.astype("category").cat
+            values = cat.codes.to_numpy()
+            entry["categories"] = cat.categories.tolist()
+            entry["ordered"] = bool(cat.ordered)
+        np.save(os.path.join(path, f"{i}.npy"), values)
+        columns.append(entry)
+    _write_manifest(path, {"rows": len(df), "columns": columns})
+
+
+def _load_column(path, entry):
+    values = _mapped(path, entry["file"])
+    if "categories" not in entry:
+        return values
+    cat = pd.Categorical.from_codes(values, categories=entry["categories"], ordered=entry["ordered"])
+    return cat if entry["dtype"] == "category" else pd.Series(cat).astype(entry["dtype"]).array
+
+
+class FeatureStore:
+    def __init__(self, source=CSV_PATH, store_dir=STORE_DIR):
+        self.source = source
+        self.store_dir = store_dir
+        self.name = "features-" + os.path.splitext(os.path.basename(source))[0]
+        self._attached = (None, None)  # (version, {column: mapped array})
+
+    def publish(self):
+        version = _version(self.source)
+        return version, published(
+            self.name, version, lambda tmp: _save_frame(load_features(self.source), tmp), self.store_dir
+        )
+
+    def columns(self):
+        version, columns = self._attached
+        if version != _version(self.source):
+            version, path = self.publish()
+            manifest = _read_manifest(path)
+            columns = {entry["name"]: _load_column(path, entry) for entry in manifest["columns"]}
+            self._attached = (version, columns)  # one assignment; readers keep the old dict
+        return columns
+
+    def frame(self, columns=None, lowercase=False):
+        # Same frame (and projection rules) as feature_io.load_features, over
+        # the mapped arrays
+        arrays = self.columns()
+        names = list(arrays)
+        if columns is not None:
+            by_lower = {c.lower(): c for c in names}
+            missing = [c for c in columns if c.lower() not in by_lower]
+            if missing:
+                raise KeyError(f"Columns {missing} not found in {self.source}. Please check your dataset.")
+            wanted = {by_lower[c.lower()] for c in columns}
+            names = [c for c in names if c in wanted]
+        df = pd.DataFrame({c: arrays[c] for c in names}, copy=False)
+        if lowercase:
+            df.columns = [c.lower() for c in df.columns]
+        return df
+
+
+# -----------------------------
+# Forest
+# -----------------------------
+def is_forest(model):
+    from sklearn.ensemble import ExtraTreesRegressor, RandomForestRegressor
+
+    return isinstance(model, (RandomForestRegressor, ExtraTreesRegressor))
+
+
+def _save_forest(model, path):
+    trees = [est.tree_ for est in model.estimators_]
+    counts = np.array([t.node_count for t in trees])
+    offsets = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    left, right, feature, threshold, missing_left, value = [], [], [], [], [], []
+    for t, off in zip(trees, offsets):
+        own = np.arange(t.node_count) + off
+        leaf = t.children_left == -1
+        # Leaves point at themselves, so extra steps leave them in place
+        left.append(np.where(leaf, own, t.children_left + off))
+        right.append(np.where(leaf, own, t.children_right + off))
+        feature.append(np.where(leaf, 0, t.feature))
+        threshold.append(np.where(leaf, np.inf, t.threshold))
+        go_left = getattr(t, "missing_go_to_left", None)
+        missing_left.append(np.zeros(t.node_count, dtype=bool) if go_left is None else go_left.astype(bool))
+        value.append(t.value[:, :, 0])
+    arrays = {
+        "roots": offsets.astype(np.int64),
+        "left": np.concatenate(left).astype(np.int64),
+        "right": np.concatenate(right).astype(np.int64),
+        "feature": np.concatenate(feature).astype(np.int64),
+        "threshold": np.concatenate(threshold).astype(np.float64),
+        "missing_left": np.concatenate(missing_left),
+        "value": np.concatenate(value).astype(np.float64),
+    }
+    for name, values in arrays.items():
+        np.save(os.path.join(path, f"{name}.npy"), values)
+    joblib.dump({a: getattr(model, a) for a in MODEL_ATTRIBUTES if hasattr(model, a)},
+                os.path.join(path, "attributes.joblib"))
+    _write_manifest(path, {
+        "kind": "forest",
+        "trees": len(trees),
+        "nodes": int(counts.sum()),
+        "max_depth": max(int(t.max_depth) for t in trees),
+    })
+
+
+class SharedForest:
+    # Stand-in for the forest (predict / n_features_in_ / the sidecar
+    # attributes), like onnx_backend.OnnxModel
+    def __init__(self, path):
+        self.path = path
+        manifest = _read_manifest(path)
+        self.max_depth = manifest["max_depth"]
+        for name in ("roots", "left", "right", "feature", "threshold", "missing_left", "value"):
+            setattr(self, name, _mapped(path, name))
+        for name, value in joblib.load(os.path.join(path, "attributes.joblib")).items():
+            setattr(self, name, value)
+
+    def apply(self, X):
+        # (n_rows, n_trees) leaf of every tree, all trees stepped together
+        X = np.asarray(X, dtype=np.float32)  # what the trees split on
+        rows = np.arange(len(X))[:, None]
+        node = np.broadcast_to(self.roots, (len(X), len(self.roots)))
+        for _ in range(self.max_depth):
+            x = X[rows, self.feature[node]]
+            go_left = (x <= self.threshold[node]) | (np.isnan(x) & self.missing_left[node])
+            step = np.where(go_left, self.left[node], self.right[node])
+            if np.array_equal(step, node):
+                break
+            node = step
+        return node
+
+    def per_tree_predictions(self, X):
+        return self.value[self.apply(X), 0]
+
+    def predict(self, X):
+        # Trees are added in order and divided once, as the forest does
+        per_tree = self.value[self.apply(X)]  # (rows, trees, outputs)
+        out = np.cumsum(per_tree, axis=1)[:, -1] / len(self.roots)
+        return out[:, 0] if out.shape[1] == 1 else out
+
+
+def _save_model(model_path, path):
+    model = joblib.load(model_path)
+    if is_forest(model):
+        _save_forest(model, path)
+    else:
+        _write_manifest(path, {"kind": "pickle"})
+
+
+def load_model(path, store_dir=STORE_DIR):
+    # ModelRegistry loader: forests come back as a SharedForest over the
+    # published arrays, anything else is unpickled in this process
+    name = "model-" + os.path.splitext(os.path.basename(path))[0]
+    published_path = published(name, _version(path), lambda tmp: _save_model(path, tmp), store_dir)
+    if _read_manifest(published_path)["kind"] == "forest":
+        return SharedForest(published_path)
+    return joblib.load(path)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    version, path = FeatureStore().publish()
+    print(f"✅ Features {version}: {path}")
+    model = load_model(MODEL_PATH)
+    print(f"✅ Model: {getattr(model, 'path', 'not a forest, unpickled per worker')}")
@@ -2,7 +2,6 @@ import pandas as pd
 import numpy as np
 from feast import FeatureStore
 from sklearn.model_selection import train_test_split
-from sklearn.ensemble import RandomForestRegressor
 from sklearn.metrics import mean_squared_error, mean_absolute_error, r2_score
 import joblib
 import mlflow
@@ -10,6 +9,17 @@ import mlflow.sklearn
 import os
 import sys
 
+from feature_defs import FEATURES, TARGET, feature_refs
+from feature_io import entity_ids, load_features, target_observed
+import feature_transform
+import intervals
+import model_budget
+import onnx_backend
+import pipeline_metrics
+import pit_join
+import quantiles
+import train_engine
+
 # -----------------------------
 # 🧭 MLflow tracking (local or remote)
 # -----------------------------
@@ -25,6 +35,8 @@ else:
 BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
 FEATURE_REPO_PATH = os.path.join(BASE_DIR, "aqi_feature_store", "feature_repo")
 DATA_PATH = os.path.join(BASE_DIR, "data", "aqi_feature_set_v1.csv")
+# "feast" = Postgres point-in-time join via Feast, "local" = asof join over Parquet (scripts/pit_join.py)
+FEATURE_SOURCE = os.getenv("TRAINING_FEATURE_SOURCE", "feast")
 MODEL_DIR = os.path.join(BASE_DIR, "models")
 os.makedirs(MODEL_DIR, exist_ok=True)
 
@@ -36,116 +48,229 @@ if not os.path.exists(config_file):
     print(f"❌ ERROR: FeatureStore config not found at {config_file}")
     sys.exit(1)
 
-# -----------------------------
-# 1️⃣ Connect to Feast Feature Store
-# -----------------------------
-store = FeatureStore(repo_path=FEATURE_REPO_PATH)
+with pipeline_metrics.start("train") as metrics:
 
-# -----------------------------
-# 2️⃣ Load target (AQI) from CSV
-# -----------------------------
-target_df = pd.read_csv(DATA_PATH)
-if "time" not in target_df.columns:
-    raise KeyError("'time' column not found in the CSV file. Please check your dataset.")
+    # -----------------------------
+    # 1️⃣ Connect to Feast Feature Store
+    # -----------------------------
+    store = FeatureStore(repo_path=FEATURE_REPO_PATH) if FEATURE_SOURCE == "feast" else None
 
-target_df["event_timestamp"] = pd.to_datetime(target_df["time"])
-target_df["id"] = range(1, len(target_df) + 1)
-target_df = target_df[["event_timestamp", "id", "AQI"]]
+    # -----------------------------
+    # 2️⃣ Load target (AQI) from CSV
+    # -----------------------------
+    # Only the two columns needed, typed (raises KeyError if either is missing)
+    target_df = load_features(DATA_PATH, columns=["time", TARGET])
+    metrics.read(DATA_PATH, rows=len(target_df))
 
-# -----------------------------
-# 3️⃣ Create entity dataframe for Feast
-# -----------------------------
-entity_df = target_df[["event_timestamp", "id"]]
+    target_df["event_timestamp"] = target_df["time"]
+    target_df["id"] = entity_ids(target_df["time"])
+    target_df = target_df[["event_timestamp", "id", TARGET]]
+    # Hours whose AQI was computed from filled readings are not targets (ids stay
+    # the ones the feature store uses)
+    target_df = target_df[target_observed(DATA_PATH)].reset_index(drop=True)
 
-# -----------------------------
-# 4️⃣ Define feature list
-# -----------------------------
-feature_list = [
-    "pm10", "pm2_5", "carbon_monoxide", "nitrogen_dioxide", "sulphur_dioxide",
-    "ozone", "temperature_2m", "relative_humidity_2m", "wind_speed_10m",
-    "pressure_msl", "precipitation", "cloudcover", "month", "log_pm10",
-    "log_pm2_5", "log_carbon_monoxide", "log_nitrogen_dioxide", "log_sulphur_dioxide",
-    "log_wind_speed_10m", "log_cloudcover", "hour", "day",
-    "aqi_change_rate", "aqi_rolling_mean_3hr", "aqi_rolling_mean_6hr",
-    "pm2_5_rolling_mean_3hr", "pm10_rolling_mean_3hr", "temp_wind", "humidity_pressure",
-    "day_of_week"
-]
-feature_list = [f"aqi_features:{f}" for f in feature_list]
+    # -----------------------------
+    # 3️⃣ Create entity dataframe for Feast (only rows not already in the design matrix cache)
+    # -----------------------------
+    entity_df = target_df[["event_timestamp", "id"]]
+    cache_signature = (tuple(FEATURES), TARGET, tuple(feature_transform.FeatureTransformer().feature_names_out_))
+    cached, transformer = train_engine.load_design_cache(cache_signature)
+    new_entity_df, cached = train_engine.split_new_entities(entity_df, cached)
 
-# -----------------------------
-# 5️⃣ Fetch historical features from Feast
-# -----------------------------
-print("📡 Fetching features from Feast...")
-features_df = store.get_historical_features(
-    entity_df=entity_df,
-    features=feature_list
-).to_df()
+    # Lags, cyclical calendar and weekday encodings (scripts/feature_transform.py).
+    # Fitted when the design matrix is (re)built and kept with it, so every cached
+    # row was encoded by the transformer that ships with the model. Fitted on the
+    # training split only (the test rows are the tail, and only move later as
+    # history grows).
+    history = train_engine.lag_history(target_df, time_column="event_timestamp")
+    if cached is None:
+        transformer = feature_transform.FeatureTransformer().fit(train_engine.training_rows(history))
+    print(f"🗃️ Design matrix cache: {0 if cached is None else len(cached)} cached rows, {len(new_entity_df)} new")
 
-# -----------------------------
-# 6️⃣ Merge features + target
-# -----------------------------
-training_df = pd.merge(features_df, target_df, on=["event_timestamp", "id"], how="inner")
+    # -----------------------------
+    # 4️⃣ Define feature list (shared with app.py via feature_defs.py)
+    # -----------------------------
+    feature_list = feature_refs()
 
-# -----------------------------
-# 7️⃣ Prepare features (X) and target (y)
-# -----------------------------
-X = training_df.drop(columns=["event_timestamp", "id", "AQI"])
-y = training_df["AQI"]
+    # -----------------------------
+    # 5️⃣ Fetch historical features (Feast or local point-in-time join)
+    # -----------------------------
+    if new_entity_df.empty:
+        features_df = None
+    elif FEATURE_SOURCE == "local":
+        print("📡 Joining features locally (point-in-time asof over Parquet)...")
+        features_df = pit_join.get_historical_features(new_entity_df, FEATURES)
+    else:
+        print("📡 Fetching features from Feast...")
+        features_df = store.get_historical_features(
+            entity_df=new_entity_df,
+            features=feature_list
+        ).to_df()
 
-# -----------------------------
-# 8️⃣ Split data
-# -----------------------------
-X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, shuffle=False)
+    # -----------------------------
+    # 6️⃣ Merge features + target, encode, extend the cache
+    # -----------------------------
+    if features_df is not None:
+        # Feast returns tz-aware UTC timestamps; the CSV target side is naive UTC
+        ts = pd.to_datetime(features_df["event_timestamp"])
+        if ts.dt.tz is not None:
+            features_df["event_timestamp"] = ts.dt.tz_convert(None)
+        new_df = pd.merge(features_df, target_df, on=["event_timestamp", "id"], how="inner")
+        new_df = new_df.sort_values("event_timestamp").reset_index(drop=True)
+        keys = new_df[["event_timestamp", "id", TARGET]]
+        encoded = pd.DataFrame(
+            transformer.transform(new_df.rename(columns={"event_timestamp": feature_transform.TIME_KEY}), history),
+            columns=transformer.feature_names_out_,
+        )
+        new_df = pd.concat([keys, encoded], axis=1)
+        training_df = new_df if cached is None else pd.concat([cached, new_df], ignore_index=True)
+        train_engine.save_design_cache(training_df, cache_signature, transformer)
+    else:
+        training_df = cached
 
-# -----------------------------
-# 9️⃣ Encode categorical columns safely
-# -----------------------------
-if "day_of_week" in X_train.columns:
-    X_train = pd.get_dummies(X_train, columns=["day_of_week"])
-    X_test = pd.get_dummies(X_test, columns=["day_of_week"])
-    X_test = X_test.reindex(columns=X_train.columns, fill_value=0)
+    # -----------------------------
+    # 7️⃣ Prepare features (X) and target (y)
+    # -----------------------------
+    X = training_df.drop(columns=["event_timestamp", "id", TARGET])
+    y = training_df[TARGET]
 
-# -----------------------------
-# 🔟 Train Random Forest
-# -----------------------------
-rf_model = RandomForestRegressor(n_estimators=150, random_state=42)
-rf_model.fit(X_train, y_train)
+    # -----------------------------
+    # 8️⃣ Split data
+    # -----------------------------
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=train_engine.TEST_SIZE, shuffle=False)
+    train_timestamps = training_df["event_timestamp"].iloc[:len(X_train)]
 
-# -----------------------------
-# 1️⃣1️⃣ Evaluate model
-# -----------------------------
-y_pred = rf_model.predict(X_test)
-rmse = np.sqrt(mean_squared_error(y_test, y_pred))
-mae = mean_absolute_error(y_test, y_pred)
-r2 = r2_score(y_test, y_pred)
+    # -----------------------------
+    # 9️⃣ Encode categorical columns safely
+    # -----------------------------
+    # Already encoded by the fitted feature transformer when the design matrix was
+    # built, so train and test share the same columns
 
-print(f"✅ Random Forest RMSE: {rmse:.2f}")
-print(f"✅ Random Forest MAE: {mae:.2f}")
-print(f"✅ Random Forest R²: {r2:.3f}")
+    # -----------------------------
+    # 🔟 Train Random Forest (all cores; policy from TRAINING_POLICY)
+    # -----------------------------
+    with train_engine.Timer() as fit_timer:
+        rf_model, applied_policy = train_engine.fit(
+            X_train, y_train,
+            timestamps=train_timestamps,
+            previous=train_engine.load_previous_model(),
+        )
+    peak_rss = train_engine.peak_rss_mb()
+    print(f"⏱️ Fit ({applied_policy}, {rf_model.n_estimators} trees): {fit_timer.seconds:.2f}s | peak RSS {peak_rss:.0f} MB")
 
-# -----------------------------
-# 1️⃣2️⃣ Save model locally
-# -----------------------------
-model_path = os.path.join(MODEL_DIR, "aqi_rf_model.pkl")
-joblib.dump(rf_model, model_path)
-print("✅ Model saved at:", model_path)
+    # -----------------------------
+    # 🔟➕ Enforce serving budget (size, load time, latency, RSS)
+    # -----------------------------
+    def refit_limited(max_depth, n_estimators):
+        # Same rows as the policy above trained on (e.g. the sliding window)
+        limited, _ = train_engine.fit(
+            X_train, y_train,
+            timestamps=train_timestamps,
+            max_depth=max_depth, n_estimators=n_estimators,
+        )
+        return limited
 
-# -----------------------------
-# 1️⃣3️⃣ Log to MLflow
-# -----------------------------
-mlflow.set_experiment("PearlsAirSense")
-experiment = mlflow.get_experiment_by_name("PearlsAirSense")
-print(f"Using experiment: {experiment.experiment_id}")
-with mlflow.start_run(run_name="RandomForest_AQI"):
-    mlflow.sklearn.log_model(
-        sk_model=rf_model,
-        artifact_path="model",
-        input_example=X_train.iloc[:5]
-    )
-    mlflow.log_param("n_estimators", rf_model.n_estimators)
-    mlflow.log_param("random_state", rf_model.random_state)
-    mlflow.log_metric("rmse", rmse)
-    mlflow.log_metric("mae", mae)
-    mlflow.log_metric("r2", r2)
 
-print("🎯 Training completed and logged successfully!")
+    rf_model, budget_stats, pruned = model_budget.enforce(rf_model, X_test, refit=refit_limited)
+    print("📏 Serving cost:", ", ".join(f"{k}={v:.2f}" for k, v in budget_stats.items()))
+    if pruned:
+        print(f"✂️ Pruned to fit budget: {pruned}")
+    train_engine.save_previous_model(rf_model)
+
+    # -----------------------------
+    # 1️⃣1️⃣ Evaluate model
+    # -----------------------------
+    y_pred = rf_model.predict(X_test)
+    rmse = np.sqrt(mean_squared_error(y_test, y_pred))
+    mae = mean_absolute_error(y_test, y_pred)
+    r2 = r2_score(y_test, y_pred)
+
+    print(f"✅ Random Forest RMSE: {rmse:.2f}")
+    print(f"✅ Random Forest MAE: {mae:.2f}")
+    print(f"✅ Random Forest R²: {r2:.3f}")
+
+    # The transformer serving must encode with (app.py, shadow.py, ONNX metadata)
+    rf_model.feature_transformer_ = transformer
+
+    # Held-out residuals per forecast horizon; /forecast turns them into p10/p50/p90
+    test_timestamps = training_df["event_timestamp"].iloc[len(X_train):]
+    rf_model.forecast_residuals_ = intervals.horizon_residuals(test_timestamps, y_test, y_pred)
+    for h, (q10, q50, q90) in rf_model.forecast_residuals_.items():
+        print(f"📐 +{h}h residual p10/p50/p90: {q10:.1f} / {q50:.1f} / {q90:.1f}")
+
+    # Fill medians / IQR quartiles the training rows were cleaned with, frozen with
+    # this model so cleaning with CAPPING_QUANTILES=frozen keeps applying them
+    frozen = quantiles.freeze()
+    if frozen is not None:
+        rf_model.capping_quantiles_ = frozen
+        metrics.read(quantiles.APPLIED_PATH)
+        metrics.wrote(quantiles.FROZEN_PATH)
+        print(f"🧊 Capping quantiles frozen at: {quantiles.FROZEN_PATH}")
+    else:
+        print(f"⚠️ No capping quantiles recorded at {quantiles.APPLIED_PATH} (run data_clean_feature.py); not frozen")
+
+    # -----------------------------
+    # 1️⃣2️⃣ Save model locally
+    # -----------------------------
+    model_path = os.path.join(MODEL_DIR, "aqi_rf_model.pkl")
+    # Write then rename so app.py's model watcher never sees a half-written file
+    joblib.dump(rf_model, model_path + ".tmp")
+    os.replace(model_path + ".tmp", model_path)
+    metrics.wrote(model_path)
+    print("✅ Model saved at:", model_path)
+
+    # -----------------------------
+    # 1️⃣2️⃣➕ Export to ONNX (served by app.py when MODEL_BACKEND=onnx)
+    # -----------------------------
+    onnx_path = os.path.join(MODEL_DIR, "aqi_rf_model.onnx")
+    onnx_max_diff = None
+    try:
+        onnx_max_diff = onnx_backend.export(rf_model, onnx_path, X_check=X_test)
+        print(f"✅ ONNX model saved at: {onnx_path} (max relative |Δ| vs sklearn on test set: {onnx_max_diff:.2e})")
+        metrics.wrote(onnx_path)
+    except ImportError as e:
+        print(f"⚠️ ONNX export skipped ({e.name} not installed)")
+    except onnx_backend.ParityError as e:
+        print(e)
+    if onnx_max_diff is None:
+        # The previous .onnx belongs to the previous model (other trees, maybe
+        # other input columns): remove it so MODEL_BACKEND=onnx serves the pickle
+        if os.path.exists(onnx_path):
+            os.remove(onnx_path)
+            print(f"🗑️ Removed stale ONNX model: {onnx_path}")
+
+    # -----------------------------
+    # 1️⃣3️⃣ Log to MLflow
+    # -----------------------------
+    mlflow.set_experiment("PearlsAirSense")
+    experiment = mlflow.get_experiment_by_name("PearlsAirSense")
+    print(f"Using experiment: {experiment.experiment_id}")
+    with mlflow.start_run(run_name="RandomForest_AQI"):
+        mlflow.sklearn.log_model(
+            sk_model=rf_model,
+            artifact_path="model",
+            input_example=X_train.iloc[:5]
+        )
+        mlflow.log_param("n_estimators", rf_model.n_estimators)
+        mlflow.log_param("random_state", rf_model.random_state)
+        mlflow.log_param("training_policy", applied_policy)
+        mlflow.log_param("n_jobs", rf_model.n_jobs)
+        mlflow.log_metric("fit_seconds", fit_timer.seconds)
+        mlflow.log_metric("peak_rss_mb", peak_rss)
+        mlflow.log_metric("training_rows", len(X_train))
+        mlflow.log_param("budget_pruned", pruned or "none")
+        mlflow.log_metrics(budget_stats)
+        mlflow.log_metric("rmse", rmse)
+        mlflow.log_metric("mae", mae)
+        mlflow.log_metric("r2", r2)
+        for h, (q10, _, q90) in rf_model.forecast_residuals_.items():
+            mlflow.log_metric(f"interval_width_{h}h", q90 - q10)
+        if onnx_max_diff is not None:
+            mlflow.log_metric("onnx_max_rel_diff", onnx_max_diff)
+            mlflow.log_artifact(onnx_path, artifact_path="onnx")
+
+    metrics.finish(
+        training_rows=len(X_train), features_fetched=len(new_entity_df),
+        fit_seconds=round(fit_timer.seconds, 3), rmse=round(float(rmse), 3),
+    )
+    print("🎯 Training completed and logged successfully!")
@@ -0,0 +1,214 @@
+# train_engine.py
+# Training helpers for scripts/train.py: an on-disk cache of the encoded
+# design matrix (so each run only fetches and encodes rows it has not seen),
+# the retrain policies, and fit-time / peak-memory accounting.
+import json
+import logging
+import math
+import os
+import sys
+import time
+
+import joblib
+import pandas as pd
+from sklearn.ensemble import RandomForestRegressor
+
+import pit_join
+from feature_defs import FEATURES, TARGET
+from feature_io import entity_ids, load_features, target_observed
+from feature_transform import LAG_SOURCE, TIME_KEY, FeatureTransformer
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+DATA_PATH = os.path.join(BASE_DIR, "data", "aqi_feature_set_v1.csv")
+CACHE_DIR = os.getenv("TRAINING_CACHE_DIR", os.path.join(BASE_DIR, ".cache", "training"))
+DESIGN_CACHE_PATH = os.path.join(CACHE_DIR, "design_matrix.joblib")
+PREVIOUS_MODEL_PATH = os.path.join(CACHE_DIR, "previous_model.pkl")
+# Written by scripts/tune.py; the best RandomForest config found there is used when present
+TUNED_PARAMS_PATH = os.getenv("TUNED_PARAMS_PATH", os.path.join(BASE_DIR, "models", "tuned_params.json"))
+
+# full           - retrain every tree from scratch on all history (original behaviour)
+# warm_start     - keep the previous forest and add WARM_START_TREES new trees
+# sliding_window - retrain from scratch on the last SLIDING_WINDOW_DAYS only
+POLICY = os.getenv("TRAINING_POLICY", "full")
+N_ESTIMATORS = int(os.getenv("RF_N_ESTIMATORS", 150))
+WARM_START_TREES = int(os.getenv("WARM_START_TREES", 10))
+WARM_START_MAX_TREES = int(os.getenv("WARM_START_MAX_TREES", 300))
+SLIDING_WINDOW_DAYS = int(os.getenv("SLIDING_WINDOW_DAYS", 180))
+N_JOBS = int(os.getenv("TRAINING_N_JOBS", -1))
+TEST_SIZE = 0.2  # held-out tail of train.py's time-ordered split
+
+
+# -----------------------------
+# Encoded design matrix cache
+# -----------------------------
+def load_design_cache(signature, path=DESIGN_CACHE_PATH):
+    # Returns (frame, transformer): the cached frame (event_timestamp, id,
+    # target, encoded features) and the feature transformer it was encoded
+    # with, or (None, None) when missing or built for a different feature list
+    if not os.path.exists(path):
+        return None, None
+    try:
+        cached = joblib.load(path)
+    except Exception as e:
+        logging.warning(f"⚠️ Ignoring unreadable design matrix cache: {e}")
+        return None, None
+    if cached.get("signature") != signature or cached.get("transformer") is None:
+        logging.info("ℹ️ Feature list changed — rebuilding design matrix cache")
+        return None, None
+    return cached["frame"], cached["transformer"]
+
+
+def save_design_cache(frame, signature, transformer, path=DESIGN_CACHE_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    joblib.dump({"signature": signature, "frame": frame, "transformer": transformer}, path)
+
+
+def lag_history(target, time_column="time"):
+    # (time, aqi) frame the transformer's lag features are looked up in
+    return pd.DataFrame({TIME_KEY: target[time_column].to_numpy(), LAG_SOURCE: target[TARGET].to_numpy()})
+
+
+def training_rows(frame, test_size=TEST_SIZE):
+    # The leading rows train_test_split(test_size=, shuffle=False) trains on
+    return frame.iloc[: len(frame) - math.ceil(test_size * len(frame))]
+
+
+def split_new_entities(entity_df, cached):
+    # Rows of entity_df that the cache does not cover yet. The cache is only
+    # reusable if it is a prefix of the current history (same ids, same times).
+    if cached is None or cached.empty:
+        return entity_df, None
+    merged = entity_df.merge(
+        cached[["id", "event_timestamp"]], on=["id", "event_timestamp"], how="left", indicator=True
+    )
+    seen = (merged["_merge"] == "both").to_numpy()
+    if seen.sum() != len(cached) or not seen[: len(cached)].all():
+        logging.info("ℹ️ History was rewritten — rebuilding design matrix cache")
+        return entity_df, None
+    return entity_df[~seen], cached
+
+
+def build_design_matrix(data_path=DATA_PATH):
+    # Encoded features for every row of history via the local point-in-time
+    # join (no Feast round trip), with the target and row timestamps. Missing
+    # lags are left NaN: each fold fills them from its own training rows
+    # (feature_transform.fill_lags / lag_median).
+    target = load_features(data_path, columns=["time", TARGET])
+    entity_df = pd.DataFrame({"event_timestamp": target["time"], "id": entity_ids(target["time"])})
+    # Synthetic targets (filled pm2_5/pm10) are left out, after numbering rows
+    observed = target_observed(data_path)
+    target = target[observed].reset_index(drop=True)
+    entity_df = entity_df[observed].reset_index(drop=True)
+    timestamps = target["time"]
+    features = pit_join.get_historical_features(entity_df, FEATURES)
+    history = lag_history(target)
+    transformer = FeatureTransformer()
+    X = pd.DataFrame(
+        transformer.transform(features.rename(columns={"event_timestamp": TIME_KEY}), history, lag_fill=float("nan")),
+        columns=transformer.feature_names_out_,
+    )
+    return X, target[TARGET], timestamps
+
+
+# -----------------------------
+# Retrain policies
+# -----------------------------
+def tuned_params(path=TUNED_PARAMS_PATH):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        summary = json.load(f)
+    best = summary.get("best_by_family", {}).get("random_forest")
+    return dict(best["params"]) if best else {}
+
+
+def new_model(**overrides):
+    params = {"n_estimators": N_ESTIMATORS, "n_jobs": N_JOBS, **tuned_params(), **overrides}
+    return RandomForestRegressor(random_state=42, **params)
+
+
+def reference_model(df, **overrides):
+    # A forest trained the way train.py trains it, for benchmarks without a
+    # models/aqi_rf_model.pkl: transformer fitted on the training split's AQI,
+    # new_model() on its matrix, transformer attached for model_input().
+    # df: lowercase feature frame with time and aqi (feature_io.load_features)
+    df = df.dropna(subset=FEATURES + [LAG_SOURCE]).reset_index(drop=True)
+    history = df[[TIME_KEY, LAG_SOURCE]]
+    transformer = FeatureTransformer().fit(training_rows(history))
+    X = pd.DataFrame(transformer.transform(df, history), columns=transformer.feature_names_out_)
+    model = new_model(**overrides).fit(X, df[LAG_SOURCE])
+    model.feature_transformer_ = transformer
+    return model
+
+
+def load_previous_model(path=PREVIOUS_MODEL_PATH):
+    if not os.path.exists(path):
+        return None
+    try:
+        return joblib.load(path)
+    except Exception as e:
+        logging.warning(f"⚠️ Ignoring unreadable previous model: {e}")
+        return None
+
+
+def save_previous_model(model, path=PREVIOUS_MODEL_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    joblib.dump(model, path)
+
+
+def fit(X_train, y_train, timestamps=None, policy=POLICY, previous=None, **overrides):
+    # Returns (model, policy actually applied). overrides (max_depth=,
+    # n_estimators=) go to new_model(); a forest fitted with other limits is
+    # not grown further, so they turn warm_start into a full retrain.
+    if policy == "warm_start":
+        compatible = (
+            not overrides
+            and previous is not None
+            and list(getattr(previous, "feature_names_in_", [])) == list(X_train.columns)
+            and previous.n_estimators + WARM_START_TREES <= WARM_START_MAX_TREES
+        )
+        if compatible:
+            previous.set_params(
+                warm_start=True, n_jobs=N_JOBS,
+                n_estimators=previous.n_estimators + WARM_START_TREES,
+            )
+            previous.fit(X_train, y_train)
+            return previous, "warm_start"
+        logging.info("ℹ️ No compatible previous forest (or tree cap reached) — full retrain")
+        policy = "full"
+
+    if policy == "sliding_window" and timestamps is not None:
+        cutoff = pd.to_datetime(timestamps).max() - pd.Timedelta(days=SLIDING_WINDOW_DAYS)
+        recent = (pd.to_datetime(timestamps) >= cutoff).to_numpy()
+        model = new_model(**overrides)
+        model.fit(X_train[recent], y_train[recent])
+        return model, "sliding_window"
+
+    model = new_model(**overrides)
+    model.fit(X_train, y_train)
+    return model, "full"
+
+
+# -----------------------------
+# Resource accounting
+# -----------------------------
+def peak_rss_mb():
+    if resource is None:
+        return float("nan")
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+class Timer:
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.seconds = time.perf_counter() - self.start
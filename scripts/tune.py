@@ -0,0 +1,262 @@
+# tune.py
+# Hyperparameter search for the AQI model: time-series cross-validation with
+# successive halving over RandomForest / XGBoost / LightGBM-style configs,
+# trials run in a process pool, every trial logged to MLflow.
+#
+# Candidates are ranked on a joint objective so the shipped model is both
+# accurate and cheap to serve:
+#   objective = cv_rmse + LATENCY_WEIGHT * single_row_predict_ms + SIZE_WEIGHT * model_mb
+#
+# Usage: python scripts/tune.py
+import hashlib
+import json
+import logging
+import os
+import pickle
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import mlflow
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import HistGradientBoostingRegressor, RandomForestRegressor
+from sklearn.metrics import mean_squared_error
+from sklearn.model_selection import ParameterSampler, TimeSeriesSplit
+
+import train_engine
+from feature_transform import fill_lags, lag_median
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(message)s")
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+FOLD_CACHE_DIR = os.path.join(BASE_DIR, ".cache", "tuning")
+TUNED_PARAMS_PATH = os.path.join(BASE_DIR, "models", "tuned_params.json")
+
+N_SPLITS = int(os.getenv("TUNE_CV_SPLITS", 4))
+N_CANDIDATES = int(os.getenv("TUNE_CANDIDATES", 27))
+ETA = int(os.getenv("TUNE_ETA", 3))  # keep the best 1/ETA per rung
+MIN_BUDGET = float(os.getenv("TUNE_MIN_BUDGET", 1 / 9))  # fraction of each fold's training rows
+WORKERS = int(os.getenv("TUNE_WORKERS", os.cpu_count() or 1))
+LATENCY_WEIGHT = float(os.getenv("TUNE_LATENCY_WEIGHT", 1.0))  # AQI points per ms
+SIZE_WEIGHT = float(os.getenv("TUNE_SIZE_WEIGHT", 0.5))  # AQI points per MB
+SEED = 42
+
+
+# -----------------------------
+# Search space
+# -----------------------------
+def _optional(module):
+    try:
+        return __import__(module)
+    except ImportError:
+        return None
+
+
+SEARCH_SPACE = {
+    "random_forest": {
+        "n_estimators": [50, 100, 150, 300],
+        "max_depth": [8, 12, 16, 24, None],
+        "min_samples_leaf": [1, 2, 5, 10],
+        "max_features": [0.3, 0.5, 1.0],
+    },
+    "hist_gradient_boosting": {
+        "max_iter": [100, 200, 400],
+        "learning_rate": [0.03, 0.05, 0.1],
+        "max_leaf_nodes": [15, 31, 63],
+        "min_samples_leaf": [10, 20, 50],
+    },
+}
+if _optional("xgboost"):
+    SEARCH_SPACE["xgboost"] = {
+        "n_estimators": [100, 200, 400],
+        "max_depth": [4, 6, 8],
+        "learning_rate": [0.03, 0.05, 0.1],
+        "subsample": [0.7, 0.85, 1.0],
+    }
+if _optional("lightgbm"):
+    SEARCH_SPACE["lightgbm"] = {
+        "n_estimators": [100, 200, 400],
+        "num_leaves": [15, 31, 63],
+        "learning_rate": [0.03, 0.05, 0.1],
+        "min_child_samples": [10, 20, 50],
+    }
+
+
+def make_model(family, params):
+    if family == "random_forest":
+        return RandomForestRegressor(random_state=SEED, n_jobs=1, **params)
+    if family == "hist_gradient_boosting":
+        return HistGradientBoostingRegressor(random_state=SEED, **params)
+    if family == "xgboost":
+        import xgboost as xgb
+
+        return xgb.XGBRegressor(random_state=SEED, n_jobs=1, **params)
+    if family == "lightgbm":
+        import lightgbm as lgb
+
+        return lgb.LGBMRegressor(random_state=SEED, n_jobs=1, verbose=-1, **params)
+    raise ValueError(f"Unknown model family '{family}'")
+
+
+def sample_candidates(n=N_CANDIDATES):
+    families = sorted(SEARCH_SPACE)
+    per_family = max(1, n // len(families))
+    candidates = []
+    for family in families:
+        for params in ParameterSampler(SEARCH_SPACE[family], per_family, random_state=SEED):
+            candidates.append({"family": family, "params": params})
+    return candidates
+
+
+# -----------------------------
+# Fold matrices (cached as .npy, memory-mapped by workers)
+# -----------------------------
+def prepare_folds(cache_dir=FOLD_CACHE_DIR):
+    X, y, _ = train_engine.build_design_matrix()
+    key = hashlib.sha256(
+        pd.util.hash_pandas_object(pd.concat([X, y], axis=1), index=False).values.tobytes()
+    ).hexdigest()[:16]
+    path = os.path.join(cache_dir, key)
+    if not os.path.exists(os.path.join(path, "folds.json")):
+        os.makedirs(path, exist_ok=True)
+        np.save(os.path.join(path, "X.npy"), X.to_numpy(dtype=np.float32))
+        np.save(os.path.join(path, "y.npy"), y.to_numpy(dtype=np.float64))
+        folds = [
+            [train_idx.tolist(), val_idx.tolist()]
+            for train_idx, val_idx in TimeSeriesSplit(n_splits=N_SPLITS).split(X)
+        ]
+        with open(os.path.join(path, "folds.json"), "w") as f:
+            json.dump({"columns": list(X.columns), "folds": folds}, f)
+        logging.info(f"🗃️ Cached {N_SPLITS} fold matrices at {path}")
+    else:
+        logging.info(f"🗃️ Reusing cached fold matrices at {path}")
+    return path
+
+
+# -----------------------------
+# Trial (runs in a worker process)
+# -----------------------------
+def run_trial(fold_path, candidate, budget):
+    X = np.load(os.path.join(fold_path, "X.npy"), mmap_mode="r")
+    y = np.load(os.path.join(fold_path, "y.npy"), mmap_mode="r")
+    with open(os.path.join(fold_path, "folds.json")) as f:
+        folds = json.load(f)["folds"]
+
+    rmses, fit_seconds = [], 0.0
+    model = None
+    for train_idx, val_idx in folds:
+        # Budget = most recent fraction of the fold's training window
+        train_idx = train_idx[-max(1, int(len(train_idx) * budget)):]
+        # Missing lags take the median AQI of the fold's training rows
+        fill = lag_median(y[train_idx])
+        model = make_model(candidate["family"], candidate["params"])
+        start = time.perf_counter()
+        model.fit(fill_lags(X[train_idx], fill), y[train_idx])
+        fit_seconds += time.perf_counter() - start
+        pred = model.predict(fill_lags(X[val_idx], fill))
+        rmses.append(float(np.sqrt(mean_squared_error(y[val_idx], pred))))
+
+    # Serving cost of the last fold's model: single-row latency and pickled size
+    row = fill_lags(np.asarray(X[-1:]), fill)
+    model.predict(row)
+    timings = []
+    for _ in range(20):
+        start = time.perf_counter()
+        model.predict(row)
+        timings.append(time.perf_counter() - start)
+    latency_ms = float(np.median(timings) * 1000)
+    size_mb = len(pickle.dumps(model)) / 1e6
+
+    cv_rmse = float(np.mean(rmses))
+    return {
+        "cv_rmse": cv_rmse,
+        "latency_ms": latency_ms,
+        "size_mb": size_mb,
+        "fit_seconds": fit_seconds,
+        "objective": cv_rmse + LATENCY_WEIGHT * latency_ms + SIZE_WEIGHT * size_mb,
+    }
+
+
+# -----------------------------
+# Successive halving
+# -----------------------------
+def budgets(min_budget=MIN_BUDGET, eta=ETA):
+    rungs = [1.0]
+    while rungs[-1] / eta >= min_budget - 1e-9:
+        rungs.append(rungs[-1] / eta)
+    return rungs[::-1]
+
+
+def successive_halving(fold_path, candidates, workers=WORKERS, on_result=None):
+    survivors = candidates
+    results = []
+    for rung, budget in enumerate(budgets()):
+        logging.info(f"🪜 Rung {rung}: {len(survivors)} candidate(s) at budget {budget:.2f}")
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(run_trial, fold_path, c, budget) for c in survivors]
+            scored = []
+            for candidate, future in zip(survivors, futures):
+                metrics = future.result()
+                record = {"rung": rung, "budget": budget, **candidate, **metrics}
+                results.append(record)
+                scored.append(record)
+                if on_result:
+                    on_result(record)
+        scored.sort(key=lambda r: r["objective"])
+        keep = max(1, len(scored) // ETA)
+        survivors = [{"family": r["family"], "params": r["params"]} for r in scored[:keep]]
+        if len(scored) == 1:
+            break
+    return results
+
+
+def log_trial(record):
+    with mlflow.start_run(run_name=f"{record['family']}_r{record['rung']}", nested=True):
+        mlflow.log_param("family", record["family"])
+        mlflow.log_params({k: str(v) for k, v in record["params"].items()})
+        mlflow.log_param("rung", record["rung"])
+        mlflow.log_param("budget", round(record["budget"], 3))
+        for metric in ("cv_rmse", "latency_ms", "size_mb", "fit_seconds", "objective"):
+            mlflow.log_metric(metric, record[metric])
+
+
+def summarise(results):
+    # Only full-budget trials are comparable across candidates
+    final = [r for r in results if r["budget"] == 1.0] or results
+    final.sort(key=lambda r: r["objective"])
+    best_by_family = {}
+    for r in sorted(results, key=lambda r: (-r["budget"], r["objective"])):
+        best_by_family.setdefault(r["family"], r)
+    return {
+        "best": final[0],
+        "best_by_family": best_by_family,
+        "weights": {"latency_ms": LATENCY_WEIGHT, "size_mb": SIZE_WEIGHT},
+    }
+
+
+if __name__ == "__main__":
+    if os.getenv("GITHUB_ACTIONS"):
+        mlflow.set_tracking_uri("file:./mlruns")
+    else:
+        mlflow.set_tracking_uri("http://127.0.0.1:5000")
+    mlflow.set_experiment("PearlsAirSense")
+
+    fold_path = prepare_folds()
+    candidates = sample_candidates()
+    logging.info(f"🔎 {len(candidates)} candidates across {', '.join(sorted(SEARCH_SPACE))}")
+
+    with mlflow.start_run(run_name="Tune_AQI"):
+        results = successive_halving(fold_path, candidates, on_result=log_trial)
+        summary = summarise(results)
+        best = summary["best"]
+        mlflow.log_param("best_family", best["family"])
+        mlflow.log_metric("best_objective", best["objective"])
+        mlflow.log_metric("best_cv_rmse", best["cv_rmse"])
+
+    os.makedirs(os.path.dirname(TUNED_PARAMS_PATH), exist_ok=True)
+    with open(TUNED_PARAMS_PATH, "w") as f:
+        json.dump(summary, f, indent=2, default=str)
+
+    print(f"✅ Best: {best['family']} {best['params']}")
+    print(f"   cv_rmse={best['cv_rmse']:.2f} latency={best['latency_ms']:.2f}ms size={best['size_mb']:.2f}MB")
+    print("✅ Tuned parameters saved at:", TUNED_PARAMS_PATH)
@@ -0,0 +1,321 @@
+# windows.py
+# Rolling features from one declarative spec. Each feature is a Window over a
+# source column, and a FeatureSet of them computes the features two ways:
+#
+#   batch(df)   - vectorized over a frame, or over the next chunk of one
+#   update(row) - one new row, O(1) per feature (amortized)
+#
+# Both paths advance the same state, so a frame can be batched, then extended
+# chunk by chunk or row by row, and every value is identical to batching it
+# whole: the same float operations run in the same order either way.
+#
+# Windows count rows (hours on the hourly feature set), skip NaN readings and
+# need one reading (pandas .rolling(size, min_periods=1)):
+#
+#   mean / sum - windows up to DIRECT_MAX rows are summed oldest to newest.
+#                Longer ones come from per-block prefix and suffix sums (van
+#                Herk / Gil-Werman): one lookup and one addition per row.
+#   max / min  - monotonic deque per row; block prefix/suffix maxima in batch
+#   diff       - change from the previous row
+#   ewm        - exponentially weighted mean, pandas'
+#                ewm(alpha, adjust=False, ignore_na=True).mean() seeded with
+#                the running mean (one pandas call per row when streaming)
+#
+# `fill` replaces NaN results (e.g. the first row's diff).
+#
+#   features = windows.FeatureSet(windows.FEATURES)
+#   df = df.assign(**features.batch(df))      # history
+#   values = features.update(new_row)         # then live, one row at a time
+#
+# save()/load() keep the state between runs, so a run that appends hours to
+# the feature set only computes the new rows (data_clean_feature.py).
+import os
+import pickle
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+DIRECT_MAX = 8
+
+
+class Window:
+    def __init__(self, name, source, kind, size=1, alpha=None, span=None, fill=np.nan):
+        if kind not in _KINDS:
+            raise ValueError(f"❌ Unknown window kind {kind!r} (one of {', '.join(_KINDS)})")
+        self.name = name
+        self.source = source
+        self.kind = kind
+        self.size = int(size)
+        self.alpha = alpha if span is None else 2.0 / (span + 1.0)
+        self.fill = fill
+
+    def __repr__(self):
+        return f"Window({self.name!r}, {self.source!r}, {self.kind!r}, size={self.size})"
+
+
+# -----------------------------
+# Per-kind state
+# -----------------------------
+def _suffix(blocks, op):
+    # Running `op` from the right within each row of a (blocks x size) array
+    return op.accumulate(blocks[:, ::-1], axis=1)[:, ::-1]
+
+
+class _DirectSum:
+    # Short windows: the last size-1 readings, summed oldest to newest
+    def __init__(self, window):
+        self.size = window.size
+        self.mean = window.kind == "mean"
+        self.tail = deque([np.nan] * (self.size - 1), maxlen=self.size - 1)
+
+    def _result(self, total, count):
+        with np.errstate(invalid="ignore"):
+            out = total / np.maximum(count, 1) if self.mean else total
+        return np.where(count > 0, out, np.nan)
+
+    def batch(self, values):
+        n = len(values)
+        x = np.concatenate([np.asarray(self.tail, dtype=float), values])
+        ok = ~np.isnan(x)
+        z = np.where(ok, x, 0.0)
+        total, count = np.zeros(n), np.zeros(n)
+        for k in range(self.size):
+            total += z[k: k + n]
+            count += ok[k: k + n]
+        self.tail.extend(values[-(self.size - 1):] if self.size > 1 else ())
+        return self._result(total, count)
+
+    def update(self, value):
+        total, count = 0.0, 0
+        for v in (*self.tail, value):
+            if v == v:
+                total += v
+                count += 1
+        self.tail.append(value)
+        if not count:
+            return np.nan
+        return total / count if self.mean else total
+
+
+class _BlockedSum:
+    # Long windows. Rows are grouped into blocks of `size`, aligned on the
+    # first row ever seen. A window ending at row t starts at a = t-size+1:
+    # it is the block prefix up to t plus the suffix of a's block from a on
+    # (just the prefix when a starts a block).
+    def __init__(self, window):
+        self.size = window.size
+        self.mean = window.kind == "mean"
+        self.rows = 0  # rows seen
+        self.block = []  # readings of the current, unfinished block
+        self.prefix = (0.0, 0)  # its running sum and count
+        self.suffix = (np.zeros(self.size), np.zeros(self.size, dtype=np.int64))  # previous block
+
+    def _result(self, total, count):
+        with np.errstate(invalid="ignore", divide="ignore"):
+            out = total / count if self.mean else total
+        return np.where(count > 0, out, np.nan)
+
+    def batch(self, values):
+        w, start = self.size, len(self.block)
+        x = np.concatenate([np.asarray(self.block, dtype=float), values])
+        m = len(x)
+        blocks = -(-m // w)
+        x = np.concatenate([x, np.full(blocks * w - m, np.nan)])
+        seen = ~np.isnan(x)
+        ok = seen.reshape(blocks, w).astype(np.int64)
+        z = np.where(seen, x, 0.0).reshape(blocks, w)
+        prefix = np.add.accumulate(z, axis=1).ravel()
+        prefix_n = np.add.accumulate(ok, axis=1).ravel()
+        suffix = np.concatenate([self.suffix[0], _suffix(z, np.add).ravel()])
+        suffix_n = np.concatenate([self.suffix[1], _suffix(ok, np.add).ravel()])
+
+        # suffix is offset by the previous block: window start t-size+1 sits at t+1
+        total = suffix[start + 1: m + 1] + prefix[start:m]
+        count = suffix_n[start + 1: m + 1] + prefix_n[start:m]
+        whole = np.arange(w - 1, m, w)  # windows that are exactly one block
+        total[whole - start] = prefix[whole]
+        count[whole - start] = prefix_n[whole]
+
+        # Keep the unfinished block and the suffixes of the last finished one
+        done = m // w
+        if done:
+            self.suffix = (suffix[done * w: (done + 1) * w], suffix_n[done * w: (done + 1) * w])
+        self.block = list(x[done * w: m])
+        self.prefix = (prefix[m - 1], prefix_n[m - 1]) if self.block else (0.0, 0)
+        self.rows += len(values)
+        return self._result(total, count)
+
+    def update(self, value):
+        seen = value == value
+        total, count = self.prefix
+        total, count = total + (value if seen else 0.0), count + seen
+        self.block.append(value)
+        at = self.rows % self.size
+        self.rows += 1
+        if at == self.size - 1:
+            # Block complete: its suffixes serve the next block's windows
+            x = np.asarray(self.block, dtype=float)[None, :]
+            ok = (~np.isnan(x)).astype(np.int64)
+            self.suffix = (_suffix(np.where(ok > 0, x, 0.0), np.add)[0], _suffix(ok, np.add)[0])
+            self.block, self.prefix = [], (0.0, 0)
+        else:
+            self.prefix = (total, count)
+            total, count = self.suffix[0][at + 1] + total, self.suffix[1][at + 1] + count
+        if not count:
+            return np.nan
+        return total / count if self.mean else total
+
+
+class _Extreme:
+    # Rolling max (min on negated values)
+    def __init__(self, window):
+        self.size = window.size
+        self.sign = 1.0 if window.kind == "max" else -1.0
+        self.tail = deque([np.nan] * (self.size - 1), maxlen=self.size - 1)
+        self.rows = 0
+        self.queue = deque()  # (row, value), values decreasing
+
+    def batch(self, values):
+        w, n = self.size, len(values)
+        x = np.concatenate([np.asarray(self.tail, dtype=float), values]) * self.sign
+        m = len(x)
+        blocks = -(-m // w)
+        x = np.concatenate([x, np.full(blocks * w - m, np.nan)])
+        z = np.where(np.isnan(x), -np.inf, x).reshape(blocks, w)
+        prefix = np.maximum.accumulate(z, axis=1).ravel()
+        suffix = _suffix(z, np.maximum).ravel()
+        out = np.maximum(suffix[:n], prefix[w - 1: w - 1 + n])
+        out = np.where(np.isinf(out) & (out < 0), np.nan, out) * self.sign
+
+        self.tail.extend(values[-(w - 1):] if w > 1 else ())
+        self.rows += n
+        # Rebuild the queue from the tail for row-by-row updates
+        self.queue.clear()
+        for at, v in enumerate(self.tail, start=self.rows - len(self.tail)):
+            self._push(at, v)
+        return out
+
+    def _push(self, at, value):
+        value = value * self.sign
+        if value == value:
+            while self.queue and self.queue[-1][1] <= value:
+                self.queue.pop()
+            self.queue.append((at, value))
+        while self.queue and self.queue[0][0] <= at - self.size:
+            self.queue.popleft()
+
+    def update(self, value):
+        self._push(self.rows, value)
+        self.tail.append(value)
+        self.rows += 1
+        return self.queue[0][1] * self.sign if self.queue else np.nan
+
+
+class _Diff:
+    def __init__(self, window):
+        self.last = np.nan
+
+    def batch(self, values):
+        out = values - np.concatenate([[self.last], values[:-1]])
+        if len(values):
+            self.last = values[-1]
+        return out
+
+    def update(self, value):
+        out, self.last = value - self.last, value
+        return out
+
+
+class _Ewm:
+    def __init__(self, window):
+        if window.alpha is None:
+            raise ValueError(f"❌ {window.name}: ewm needs alpha or span")
+        self.alpha = float(window.alpha)
+        self.mean = np.nan  # NaN until the first reading
+
+    def batch(self, values):
+        # pandas starts from its first value: seed it with the current mean
+        seeded = self.mean == self.mean
+        x = np.concatenate([[self.mean], values]) if seeded else values
+        out = pd.Series(x).ewm(alpha=self.alpha, adjust=False, ignore_na=True).mean().to_numpy()
+        out = out[1:] if seeded else out
+        if len(out):
+            self.mean = out[-1]
+        return out
+
+    def update(self, value):
+        # pandas' own kernel again (its rounding depends on how it was
+        # compiled, e.g. fused multiply-adds), seeded with the running mean
+        return self.batch(np.array([value]))[0]
+
+
+def _sum_kind(window):
+    return _DirectSum(window) if window.size <= DIRECT_MAX else _BlockedSum(window)
+
+
+_KINDS = {"mean": _sum_kind, "sum": _sum_kind, "max": _Extreme, "min": _Extreme, "diff": _Diff, "ewm": _Ewm}
+
+
+# -----------------------------
+# Feature sets
+# -----------------------------
+class FeatureSet:
+    def __init__(self, specs):
+        self.specs = list(specs)
+        self.state = [_KINDS[spec.kind](spec) for spec in self.specs]
+
+    def batch(self, df):
+        # {feature: array} for the rows of `df`, continuing from earlier calls
+        out = {}
+        for spec, state in zip(self.specs, self.state):
+            values = state.batch(df[spec.source].to_numpy(dtype=float))
+            out[spec.name] = values if np.isnan(spec.fill) else np.where(np.isnan(values), spec.fill, values)
+        return out
+
+    def update(self, row):
+        # {feature: float} for one new row (a dict or Series of readings)
+        out = {}
+        for spec, state in zip(self.specs, self.state):
+            value = row[spec.source]
+            value = state.update(np.nan if pd.isna(value) else float(value))
+            out[spec.name] = spec.fill if value != value and not np.isnan(spec.fill) else value
+        return out
+
+    # -----------------------------
+    # Persistence
+    # -----------------------------
+    def save(self, path, last_time):
+        # last_time: the row the state ends at
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path + ".tmp", "wb") as f:
+            pickle.dump({"specs": _signature(self.specs), "last_time": str(last_time), "features": self}, f)
+        os.replace(path + ".tmp", path)
+
+    @classmethod
+    def load(cls, path, specs, last_time):
+        # The saved set if it has the same windows and ends at last_time, else None
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, "rb") as f:
+                payload = pickle.load(f)
+        except Exception:
+            return None
+        if payload["specs"] != _signature(specs) or payload["last_time"] != str(last_time):
+            return None
+        return payload["features"]
+
+
+def _signature(specs):
+    return [(s.name, s.source, s.kind, s.size, s.alpha, repr(s.fill)) for s in specs]
+
+
+# Features of aqi_feature_set_v1 (data_clean_feature.py)
+FEATURES = [
+    Window("AQI_change_rate", "AQI", "diff", fill=0.0),
+    Window("AQI_rolling_mean_3hr", "AQI", "mean", 3),
+    Window("AQI_rolling_mean_6hr", "AQI", "mean", 6),
+    Window("PM2_5_rolling_mean_3hr", "pm2_5", "mean", 3),
+    Window("PM10_rolling_mean_3hr", "pm10", "mean", 3),
+]